@@ -0,0 +1,69 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the per-call cost of dispatching a command as the number of options
+on the command grows, comparing the cached parser against rebuilding the
+parser on every call (the behavior prior to parser caching).
+
+Usage: python benchmarks/bench_command_dispatch.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from okaara.cli import Command
+from okaara.prompt import Prompt, Recorder
+
+
+def noop(**kwargs):
+    pass
+
+
+def build_command(option_count):
+    command = Command('bench', 'benchmark command', noop)
+    for i in range(0, option_count):
+        command.create_option('--option-%d' % i, 'option %d' % i, required=False)
+    return command
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    prompt = Prompt(output=Recorder(), enable_color=False)
+    args = ['--option-0', 'value']
+
+    print('%-8s %15s %15s' % ('options', 'cached (us)', 'rebuilt (us)'))
+    for option_count in (1, 10, 50, 100, 250):
+        command = build_command(option_count)
+
+        def cached():
+            command.execute(prompt, args)
+
+        def rebuilt():
+            command.invalidate_parser()
+            command.execute(prompt, args)
+
+        cached_us = timeit.timeit(cached, number=iterations) / iterations * 1000000
+        rebuilt_us = timeit.timeit(rebuilt, number=iterations) / iterations * 1000000
+        print('%-8d %15.1f %15.1f' % (option_count, cached_us, rebuilt_us))
+
+
+if __name__ == '__main__':
+    main()
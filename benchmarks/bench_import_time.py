@@ -0,0 +1,55 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the time to import each public okaara module in a new interpreter,
+using python -X importtime (Python 3.7 or newer). The median of the runs is
+reported; the first run, which may also compile the modules, is discarded.
+
+Usage: python benchmarks/bench_import_time.py [runs]
+"""
+
+import os
+import subprocess
+import sys
+
+ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+MODULES = ('okaara.cli', 'okaara.prompt', 'okaara.shell', 'okaara.progress', 'okaara.table')
+
+
+def import_time(module):
+    output = subprocess.check_output([sys.executable, '-X', 'importtime', '-W', 'ignore',
+                                      '-c', 'import %s' % module],
+                                     stderr=subprocess.STDOUT, cwd=ROOT_DIR)
+    for line in output.decode('utf-8').splitlines():
+        if line.startswith('import time:') and line.split('|')[2].strip() == module:
+            return int(line.split('|')[1])
+
+
+def main():
+    runs = int(sys.argv[1]) if len(sys.argv) > 1 else 11
+
+    print('%-18s %15s' % ('module', 'import (us)'))
+    for module in MODULES:
+        import_time(module)
+        times = sorted([import_time(module) for i in range(0, runs)])
+        print('%-18s %15d' % (module, times[len(times) // 2]))
+
+
+if __name__ == '__main__':
+    main()
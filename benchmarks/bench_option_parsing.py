@@ -0,0 +1,95 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures the cost of parsing a command's arguments with the native
+CommandParser against an equivalent optparse parser (the default prior to
+CommandParser), as the number of options on the command grows. Both parsers
+are built once; only parsing is timed.
+
+Usage: python benchmarks/bench_option_parsing.py [iterations]
+"""
+
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from okaara.cli import CommandParser, Flag, NoCatchErrorParser, Option, Values
+
+
+def build_options(option_count):
+    options = []
+    for i in range(0, option_count):
+        if i % 5 == 0:
+            options.append(Flag('--flag-%d' % i, 'flag %d' % i))
+        else:
+            options.append(Option('--option-%d' % i, 'option %d' % i, required=False,
+                                  allow_multiple=(i % 5 == 1)))
+    return options
+
+
+def build_optparse(options):
+    parser = NoCatchErrorParser()
+    for o in options:
+        if isinstance(o, Flag):
+            action = 'store_true'
+        elif o.allow_multiple:
+            action = 'append'
+        else:
+            action = 'store'
+        parser.add_option(o.name, dest=o.name, action=action)
+    return parser
+
+
+def build_args(options):
+    # Use a tenth of the options, mixing both value forms
+    args = []
+    for i, o in enumerate(options[::10]):
+        if isinstance(o, Flag):
+            args.append(o.name)
+        elif i % 2 == 0:
+            args += [o.name, 'value']
+        else:
+            args.append('%s=value' % o.name)
+    return args
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    print('%-8s %15s %15s' % ('options', 'native (us)', 'optparse (us)'))
+    for option_count in (10, 100, 250, 500):
+        options = build_options(option_count)
+        args = build_args(options)
+        native = CommandParser(options)
+        reference = build_optparse(options)
+
+        def parse_native():
+            native.parse_args(args, values=dict([(o.name, o.default) for o in options]))
+
+        def parse_optparse():
+            reference.parse_args(list(args), values=Values(dict([(o.name, o.default) for o in options])))
+
+        native_us = timeit.timeit(parse_native, number=iterations) / iterations * 1000000
+        optparse_us = timeit.timeit(parse_optparse, number=iterations) / iterations * 1000000
+        print('%-8d %15.1f %15.1f' % (option_count, native_us, optparse_us))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Replays a scripted session through a Prompt: each line of input is read with
+a question written before it and the answer echoed after. Input is given to
+Script as a list, a generator and a file, and output is recorded with each
+Recorder mode. The previous Script, which pops the first item of a list for
+each line and so grows quadratically, is skipped above a size where it takes
+too long to be useful.
+
+Usage: python benchmarks/bench_replay.py [number of lines]
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from okaara.prompt import Prompt, Recorder, Script, OUTPUT_PLAIN
+
+# The previous Script is not run on more lines than this
+LEGACY_MAX_LINES = 100000
+
+
+class LegacyScript(object):
+
+    def __init__(self, lines):
+        self.lines = lines
+
+    def readline(self, size=None):
+        return self.lines.pop(0)
+
+
+def replay(script, recorder, count):
+    prompt = Prompt(input=script, output=recorder, output_format=OUTPUT_PLAIN)
+    start = time.time()
+    for i in range(count):
+        answer = prompt.read('Name: ')
+        prompt.write('Hello %s' % answer)
+    return time.time() - start
+
+
+def input_lines(count):
+    return ['user %d\n' % i for i in range(count)]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    fd, filename = tempfile.mkstemp(prefix='okaara-replay-')
+    f = os.fdopen(fd, 'w')
+    f.writelines(input_lines(count))
+    f.close()
+
+    try:
+        print('%d lines' % count)
+        print('')
+        print('%-40s %10s' % ('input', 'seconds'))
+
+        print('%-40s %10.2f' % ('list', replay(Script(input_lines(count)), Recorder(), count)))
+        print('%-40s %10.2f' % ('generator', replay(Script(iter(input_lines(count))), Recorder(), count)))
+        print('%-40s %10.2f' % ('file', replay(Script.from_file(filename), Recorder(), count)))
+
+        legacy_count = min(count, LEGACY_MAX_LINES)
+        print('%-40s %10.2f' % ('previous list (%d lines)' % legacy_count,
+                                replay(LegacyScript(input_lines(legacy_count)), Recorder(), legacy_count)))
+
+        print('')
+        print('%-40s %10s %10s' % ('output', 'seconds', 'entries'))
+
+        recorders = [
+            ('one entry per write', Recorder()),
+            ('joined lines', Recorder(join_lines=True)),
+            ('last 1000 lines', Recorder(max_lines=1000, join_lines=True)),
+            ('spill past 1 MB', Recorder(spill_size=1024 * 1024, join_lines=True)),
+        ]
+        for name, recorder in recorders:
+            seconds = replay(Script.from_file(filename), recorder, count)
+            print('%-40s %10.2f %10d' % (name, seconds, len(recorder.lines)))
+            recorder.close()
+    finally:
+        os.remove(filename)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/python
+#
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Measures Prompt.wrap on inputs from a few kilobytes up to several megabytes
+against the previous wrapping algorithm, which copies the remaining text for
+each line and so grows quadratically. The previous algorithm is skipped above
+a size where it takes too long to be useful. The last row shows repeated
+wrapping of the same description, which is served from the wrap cache.
+
+Usage: python benchmarks/bench_wrap.py [max megabytes]
+"""
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from okaara import _text
+
+WIDTH = 80
+INDENT = 4
+
+# The previous algorithm is not run on inputs larger than this
+LEGACY_MAX_SIZE = 256 * 1024
+
+
+def legacy_wrap(content, wrap_width, remaining_line_indent):
+    def _rightmost_space_index(str):
+        for i in range(len(str) - 1, -1, -1):
+            if str[i] == ' ' : return i
+        return None
+
+    lines = []
+    first_pass = True
+
+    while True:
+        if len(content) == 0:
+            break
+
+        if not first_pass:
+            content = content.lstrip()
+            content = (' ' * remaining_line_indent) + content
+        else:
+            first_pass = False
+
+        end_index = wrap_width
+        chunk = content[:end_index]
+
+        if end_index >= len(content):
+            lines.append(chunk)
+            break
+
+        if end_index < len(content) and content[end_index] == ' ':
+            lines.append(chunk)
+            content = content[end_index:]
+            continue
+
+        last_space_index = _rightmost_space_index(chunk)
+        if last_space_index is not None:
+            if remaining_line_indent is not None and last_space_index > remaining_line_indent:
+                end_index = last_space_index
+                chunk = content[:end_index]
+
+        lines.append(chunk)
+        content = content[end_index:]
+
+    return '\n'.join(lines)
+
+
+def build_text(size):
+    random.seed(size)
+    words = []
+    length = 0
+    while length < size:
+        word = 'x' * random.randint(1, 12)
+        words.append(word)
+        length += len(word) + 1
+    return ' '.join(words)
+
+
+def timed(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time() - start
+
+
+def main():
+    max_megabytes = float(sys.argv[1]) if len(sys.argv) > 1 else 4
+
+    print('%-12s %15s %15s' % ('size (KB)', 'linear (ms)', 'previous (ms)'))
+
+    size = 4 * 1024
+    while size <= max_megabytes * 1024 * 1024:
+        text = build_text(size)
+
+        linear_ms = timed(_text.wrap, text, WIDTH, INDENT) * 1000
+        if size <= LEGACY_MAX_SIZE:
+            legacy = '%15.1f' % (timed(legacy_wrap, text, WIDTH, INDENT) * 1000)
+        else:
+            legacy = '%15s' % '-'
+
+        print('%-12d %15.1f %s' % (size // 1024, linear_ms, legacy))
+        size *= 4
+
+    description = build_text(300)
+    _text.clear_wrap_cache()
+    iterations = 10000
+    uncached_ms = timed(lambda: [_text._wrap(description, WIDTH, INDENT) for i in range(iterations)]) * 1000
+    cached_ms = timed(lambda: [_text.wrap(description, WIDTH, INDENT) for i in range(iterations)]) * 1000
+    print('')
+    print('%d wraps of a %d character description: %.1f ms uncached, %.1f ms cached' %
+          (iterations, len(description), uncached_ms, cached_ms))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,160 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+asyncio support for okaara.cli. This uses async/await syntax, so it is kept
+separate from the cli module and only imported when an asynchronous entry
+point (Cli.run_async, Command.execute_async) or a coroutine command method
+is used.
+"""
+
+import asyncio
+import os
+
+from okaara import timing
+from okaara.cli import _CURRENT_CONTEXT, _CURRENT_PROMPT, Command, CommandUsage, OptionValidationFailed
+
+
+async def execute_command(command, prompt, args):
+    """
+    Implementation of Command.execute_async.
+    """
+    try:
+        method, arg_list, kwarg_dict = command.prepare_call(prompt, args)
+    except OptionValidationFailed:
+        return os.EX_DATAERR
+
+    return await _invoke(prompt, method, arg_list, kwarg_dict)
+
+
+async def execute_cached(result_cache, command, path, prompt, args):
+    """
+    Coroutine version of ResultCache.execute.
+    """
+    run = result_cache._start(command, path, prompt, args)
+    if run.served:
+        return run.exit_code
+
+    try:
+        exit_code = await _invoke(run.prompt, run.method, run.arg_list, run.kwarg_dict)
+    finally:
+        run.end()
+
+    return run.finish(exit_code)
+
+
+async def run_cli(cli, args, context=None):
+    """
+    Implementation of Cli.run_async; see Cli.run for the flow this mirrors.
+    """
+    prompt = cli.prompt
+    if context is not None and context.prompt is not None:
+        prompt = context.prompt
+
+    token = _CURRENT_CONTEXT.set(context)
+    try:
+        if cli.timing_sink is None:
+            return await _run_cli(cli, args, prompt)
+
+        exit_code = None
+        previous_timer = timing.start()
+        try:
+            exit_code = await _run_cli(cli, args, prompt)
+            return exit_code
+        finally:
+            timer = timing.stop(previous_timer)
+            cli.timing_sink.record(timer.entry(args, exit_code))
+    finally:
+        _CURRENT_CONTEXT.reset(token)
+        prompt.flush()
+
+
+def run_awaitable(awaitable):
+    """
+    Runs the given awaitable to completion on a new event loop and returns
+    its result. Used when a coroutine command is run through the synchronous
+    Cli.run/Command.execute.
+
+    :raise RuntimeError: if called from within a running event loop, which
+           can't run a second loop on the same thread
+    """
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        pass
+    else:
+        if hasattr(awaitable, 'close'):
+            # Otherwise it is reported as never awaited
+            awaitable.close()
+        raise RuntimeError('Coroutine command methods cannot be run through Cli.run or Command.execute '
+                           'from within a running event loop; use Cli.run_async or '
+                           'Command.execute_async instead')
+
+    async def wrapper():
+        return await awaitable
+
+    return asyncio.run(wrapper())
+
+# -- private ------------------------------------------------------------------
+
+async def _invoke(prompt, method, arg_list, kwarg_dict):
+    """
+    Coroutine version of Command.invoke.
+    """
+    # Each task has its own copy of the context, so concurrent commands on
+    # the same loop see their own prompt
+    token = _CURRENT_PROMPT.set(prompt)
+    try:
+        result = method(*arg_list, **kwarg_dict)
+        if hasattr(result, '__await__'):
+            result = await result
+    except OptionValidationFailed:
+        # Raised by a streamed option value as the method consumes it
+        return os.EX_DATAERR
+    finally:
+        _CURRENT_PROMPT.reset(token)
+        timing.mark(timing.PHASE_METHOD)
+
+    return result
+
+
+async def _run_cli(cli, args, prompt):
+    command_or_section, remaining_args = cli._find_closest_match(cli.root_section, args)
+    timing.mark(timing.PHASE_RESOLVE)
+
+    if not isinstance(command_or_section, Command):
+        (command_or_section or cli.root_section).print_section(prompt)
+        timing.mark(timing.PHASE_USAGE)
+        return os.EX_USAGE
+
+    try:
+        if cli.result_cache is not None and command_or_section.cacheable:
+            path = args[:len(args) - len(remaining_args)]
+            exit_code = await execute_cached(cli.result_cache, command_or_section, path, prompt,
+                                             remaining_args)
+        else:
+            exit_code = await command_or_section.execute_async(prompt, remaining_args)
+    except CommandUsage as e:
+        command_or_section.print_command_usage(
+            prompt, missing_required=e.missing_options,
+            unexpected=e.unexpected_options)
+        timing.mark(timing.PHASE_USAGE)
+        return os.EX_USAGE
+
+    # Default handling; if no code specified, assume ok
+    if exit_code is None:
+        exit_code = os.EX_OK
+
+    return exit_code
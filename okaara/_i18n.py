@@ -0,0 +1,51 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Translation of okaara's user-facing messages, shared by all of its modules.
+The message catalog is looked up the first time a message is translated
+rather than when okaara is imported.
+"""
+
+import sys
+
+# Translation function of the loaded catalog; None until first use
+_translate = None
+
+
+def _(message):
+    """
+    Returns the translation of the given message in the okaara domain.
+
+    :type  message: str
+    :rtype: str
+    """
+    global _translate
+    if _translate is None:
+        import gettext
+        t = gettext.translation('okaara', fallback=True)
+        if sys.version_info[0] < 3:
+            _translate = t.ugettext
+        else:
+            _translate = t.gettext
+    return _translate(message)
+
+
+def N_(message):
+    """
+    Marks a message for translation without translating it, for messages
+    defined at import time; the message is translated with _ when used.
+    """
+    return message
@@ -0,0 +1,64 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+File handling shared by okaara's modules.
+"""
+
+import os
+
+
+def file_lines(filename):
+    """
+    Opens the given file, returning a generator over its lines that closes
+    the file once it is exhausted or discarded. The file is opened by this
+    call, so an error opening it is raised here rather than on the first read.
+
+    :raise IOError: if the file cannot be opened
+    """
+    f = open(filename, 'r')
+
+    def lines():
+        try:
+            for line in f:
+                yield line
+        finally:
+            f.close()
+
+    return lines()
+
+
+def write_atomically(filename, data, prefix):
+    """
+    Replaces the given file with the given data. The data is written to a
+    temporary file in the same directory, named with the given prefix, and
+    moved into place so a concurrent reader never sees a partial file.
+
+    :raise IOError: if the file cannot be written
+    """
+    import tempfile
+
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, temp_filename = tempfile.mkstemp(dir=directory, prefix=prefix)
+    try:
+        f = os.fdopen(fd, 'w')
+        try:
+            f.write(data)
+        finally:
+            f.close()
+        os.rename(temp_filename, filename)
+    except Exception:
+        os.remove(temp_filename)
+        raise
@@ -0,0 +1,71 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+State kept for the run or command currently executing, such as its prompt.
+Where contextvars is available (Python 3.7 and newer) each asyncio task sees
+its own values, even when many tasks share a thread; otherwise values are kept
+per thread.
+"""
+
+import threading
+
+try:
+    from contextvars import ContextVar
+except ImportError:
+    ContextVar = None
+
+
+def context_local(name):
+    """
+    Returns a variable holding a value for the current execution; None until
+    it is set. Values are changed and restored as with a ContextVar::
+
+        token = variable.set(value)
+        try:
+            ...
+        finally:
+            variable.reset(token)
+
+    This must be called at module level rather than once per execution.
+
+    :param name: name of the variable, for debugging
+    :type  name: str
+    """
+    if ContextVar is not None:
+        return ContextVar(name, default=None)
+    return _ThreadLocal(name)
+
+
+class _ThreadLocal(object):
+    """
+    Stand-in for ContextVar that keeps its value per thread. The token
+    returned by set is the previous value.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self._local = threading.local()
+
+    def get(self):
+        return getattr(self._local, 'value', None)
+
+    def set(self, value):
+        previous = self.get()
+        self._local.value = value
+        return previous
+
+    def reset(self, token):
+        self._local.value = token
@@ -0,0 +1,67 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+optparse based parser for commands that need optparse itself. This is kept
+separate from okaara.cli so optparse is only imported when it is used; it is
+available as okaara.cli.NoCatchErrorParser.
+"""
+
+from optparse import OptionParser, BadOptionError
+
+from okaara.cli import CommandUsage
+
+
+class NoCatchErrorParser(OptionParser):
+    """
+    OptionParser's default behavior for handling errors is to print the output
+    and exit. I'd rather go through the rest of the CLI's output methods, so
+    change this behavior to throw my exception instead.
+
+    Commands no longer use this by default (see CommandParser); it remains
+    available as a custom parser for commands that need optparse itself.
+    """
+    def exit(self, status=0, msg=None):
+        raise CommandUsage()
+
+    def print_help(self, file=None):
+        # The CLI will take care of formatting the options for a --help call,
+        # so do nothing here.
+        pass
+
+    def parse_args(self, args=None, values=None):
+        """
+        Copied directly from optparse with the change that an exception on
+        _process_args isn't passed to error but rather converted into a
+        CommandUsage. Bad optparse, passing a string version of the exception
+        to error instead of the programmatically accessible data and letting
+        error() do with it as it wishes.
+        """
+        rargs = self._get_args(args)
+        if values is None:
+            values = self.get_default_values()
+
+        self.rargs = rargs
+        self.largs = largs = []
+        self.values = values
+
+        try:
+            self._process_args(largs, rargs, values)
+        except BadOptionError as e:
+            # Raise with the data, not a string version of the exception
+            raise CommandUsage(unexpected_options=[e.opt_str])
+
+        args = largs + rargs
+        return self.check_values(values, args)
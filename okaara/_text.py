@@ -0,0 +1,331 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Text layout used by the prompt, tables and CLI usage when rendering output.
+
+Widths are measured in terminal columns rather than characters: terminal
+escape sequences (such as colors) take no space, East Asian wide characters
+take two columns and combining marks and other zero-width characters take
+none. Plain ASCII text, by far the most common case, is measured with len.
+"""
+
+import collections
+import threading
+
+# -- constants ----------------------------------------------------------------
+
+# Types of text values, such as import paths given in place of functions
+try:
+    STRING_TYPES = (basestring,)
+except NameError:
+    STRING_TYPES = (str,)
+
+# Number of wrapped texts kept; usage and help output re-wrap the same
+# descriptions on every render
+WRAP_CACHE_SIZE = 512
+
+# Texts longer than this are wrapped on every call rather than kept in the cache
+WRAP_CACHE_MAX_LENGTH = 8192
+
+# Number of measured strings kept by display_width; plain ASCII strings are
+# measured directly and never cached
+WIDTH_CACHE_SIZE = 4096
+
+_ESCAPE = '\033'
+
+# Terminal escape sequences: control sequences (colors, cursor movement),
+# operating system commands (titles, links) and two character escapes
+_ESCAPE_PATTERN = r'\033\[[0-?]*[ -/]*[@-~]|\033\][^\007\033]*(?:\007|\033\\)|\033[@-Z\\-_]'
+
+# Compiled on first use so importing this module does not import re
+_escape_regex = None
+
+_wrap_cache = collections.OrderedDict()
+_wrap_cache_lock = threading.Lock()
+
+_width_cache = {}
+_char_widths = {}
+
+# -- display width ------------------------------------------------------------
+
+if hasattr(str, 'isascii'):
+    def _is_plain(text):
+        return text.isascii() and _ESCAPE not in text
+else:
+    def _is_plain(text):
+        try:
+            text.encode('ascii')
+        except (UnicodeDecodeError, UnicodeEncodeError):
+            return False
+        return _ESCAPE not in text
+
+
+def display_width(text):
+    """
+    Returns the number of terminal columns the given text occupies when
+    written. Results for text other than plain ASCII are cached.
+
+    :type  text: str
+    :rtype: int
+    """
+    if _is_plain(text):
+        return len(text)
+
+    width = _width_cache.get(text)
+    if width is None:
+        width = 0
+        for unit, unit_width in _units(text):
+            width += unit_width
+
+        # Cleared outright rather than tracking use; the cache only saves the
+        # measuring of text that is written repeatedly
+        if len(_width_cache) >= WIDTH_CACHE_SIZE:
+            _width_cache.clear()
+        _width_cache[text] = width
+
+    return width
+
+
+def truncate(text, width):
+    """
+    Returns the longest start of the given text that fits in the given number
+    of columns. Escape sequences are never split and those following the
+    cut-off are kept, so colors are still reset.
+
+    :type  text: str
+    :type  width: int
+    :rtype: str
+    """
+    if _is_plain(text):
+        return text[:width]
+
+    pieces = []
+    used = 0
+    for unit, unit_width in _units(text):
+        if unit_width == 0:
+            if unit.startswith(_ESCAPE) or used <= width:
+                pieces.append(unit)
+        elif used + unit_width <= width:
+            pieces.append(unit)
+            used += unit_width
+        else:
+            # Nothing else fits, but later escape sequences are still kept
+            used = width + 1
+    return ''.join(pieces)
+
+
+def _char_width(c):
+    width = _char_widths.get(c)
+    if width is None:
+        if c < u'\u0080':
+            # Counted as with len, including control characters
+            width = 1
+        else:
+            import unicodedata
+
+            if unicodedata.category(c) in ('Mn', 'Me', 'Cf'):
+                width = 0
+            elif unicodedata.east_asian_width(c) in ('W', 'F'):
+                width = 2
+            else:
+                width = 1
+        _char_widths[c] = width
+    return width
+
+
+def _units(text):
+    """
+    Splits text into a list of (unit, width) tuples, where a unit is either
+    a single character or a whole escape sequence.
+    """
+    global _escape_regex
+
+    if _ESCAPE not in text:
+        return [(c, _char_width(c)) for c in text]
+
+    if _escape_regex is None:
+        import re
+        _escape_regex = re.compile(_ESCAPE_PATTERN)
+
+    units = []
+    position = 0
+    for match in _escape_regex.finditer(text):
+        units.extend([(c, _char_width(c)) for c in text[position:match.start()]])
+        units.append((match.group(0), 0))
+        position = match.end()
+    units.extend([(c, _char_width(c)) for c in text[position:]])
+    return units
+
+# -- wrapping -----------------------------------------------------------------
+
+def wrap(text, width, indent=0):
+    """
+    Breaks the given text into lines of at most width columns, joined by new
+    line characters. Lines are broken at the last space that fits, or
+    mid-word if there is none. Whitespace at the start of each generated line
+    is replaced by indent spaces; the first line is left as is.
+
+    Recent results are cached, keyed by the text, width and indent.
+
+    :param text: text to wrap
+    :type  text: str
+
+    :param width: maximum number of columns per line
+    :type  width: int
+
+    :param indent: number of spaces to indent each line after the first
+    :type  indent: int
+
+    :return: wrapped text
+    :rtype:  str
+    """
+    if len(text) > WRAP_CACHE_MAX_LENGTH:
+        if _is_plain(text):
+            return _wrap(text, width, indent)
+        return _wrap_units(text, width, indent)
+
+    key = (text, width, indent)
+
+    _wrap_cache_lock.acquire()
+    try:
+        wrapped = _wrap_cache.pop(key, None)
+        if wrapped is not None:
+            # Reinserted to mark it as the most recently used
+            _wrap_cache[key] = wrapped
+            return wrapped
+    finally:
+        _wrap_cache_lock.release()
+
+    if _is_plain(text):
+        wrapped = _wrap(text, width, indent)
+    else:
+        wrapped = _wrap_units(text, width, indent)
+
+    _wrap_cache_lock.acquire()
+    try:
+        _wrap_cache[key] = wrapped
+        while len(_wrap_cache) > WRAP_CACHE_SIZE:
+            _wrap_cache.popitem(last=False)
+    finally:
+        _wrap_cache_lock.release()
+
+    return wrapped
+
+
+def clear_wrap_cache():
+    """
+    Discards every cached wrap result.
+    """
+    _wrap_cache_lock.acquire()
+    try:
+        _wrap_cache.clear()
+    finally:
+        _wrap_cache_lock.release()
+
+
+def _wrap(text, width, indent):
+    """
+    Does the work for wrap for plain ASCII text, where every character is a
+    column. The text is walked once by index; each line is sliced out exactly
+    once and only the characters that can end up on the line are searched
+    for a break.
+    """
+    indent = indent or 0
+    prefix = ''
+    length = len(text)
+    lines = []
+    position = 0
+
+    while position < length:
+        if len(lines) > 0:
+            while position < length and text[position].isspace():
+                position += 1
+            prefix = ' ' * indent
+
+        # An indent as wide as the line still takes at least one character
+        # per line so the wrap always finishes
+        available = max(width - len(prefix), 1)
+        end = position + available
+
+        # Last line
+        if end >= length:
+            lines.append(prefix + text[position:])
+            break
+
+        # Break on the space following a full line; it is stripped from the
+        # start of the next line
+        if text[end] != ' ':
+            # Otherwise back up to the last space, unless that would leave the
+            # line no longer than the indent
+            space_index = text.rfind(' ', position, end)
+            if space_index != -1 and len(prefix) + space_index - position > indent:
+                end = space_index
+
+        lines.append(prefix + text[position:end])
+        position = end
+
+    return '\n'.join(lines)
+
+
+def _wrap_units(text, width, indent):
+    """
+    Does the work for wrap for text containing escape sequences or non-ASCII
+    characters. This follows _wrap, walking units of the text measured in
+    columns instead of characters. Zero width units stay with the text before
+    them, and a character wider than the line is put on a line of its own.
+    """
+    indent = indent or 0
+    prefix = ''
+    units = _units(text)
+    count = len(units)
+    lines = []
+    position = 0
+
+    while position < count:
+        if len(lines) > 0:
+            while position < count and units[position][0].isspace():
+                position += 1
+            prefix = ' ' * indent
+
+        available = max(width - len(prefix), 1)
+        end = position
+        used = 0
+        while end < count and used + units[end][1] <= available:
+            used += units[end][1]
+            end += 1
+
+        # Last line
+        if end == count:
+            lines.append(prefix + ''.join([u[0] for u in units[position:]]))
+            break
+
+        if end == position:
+            end += 1
+        elif units[end][0] != ' ':
+            # Back up to the last space, unless that would leave the line no
+            # longer than the indent
+            offset = used
+            for i in range(end - 1, position - 1, -1):
+                offset -= units[i][1]
+                if units[i][0] == ' ':
+                    if len(prefix) + offset > indent:
+                        end = i
+                    break
+
+        lines.append(prefix + ''.join([u[0] for u in units[position:end]]))
+        position = end
+
+    return '\n'.join(lines)
@@ -0,0 +1,469 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Serves repeated runs of idempotent commands from a cache of their earlier
+results. Commands opt in by setting cacheable to true, and the cache is given
+to the CLI::
+
+    command = section.create_command('status', 'Shows the status', status)
+    command.cacheable = True
+
+    cli = Cli(result_cache=ResultCache(ttl=10, directory='/var/cache/my-cli'))
+
+The cache is keyed by the path to the command and its arguments after
+parsing (so after any parse_func is applied), along with the prompt's output
+settings, including the width output is wrapped to. A hit writes the output
+captured from the original run to the prompt's output stream and returns its
+exit code without calling (or loading) the command's method. Only successful
+runs are cached. The output captured is what the command writes through the
+prompt the run uses, whether the command reaches it through
+okaara.cli.current_prompt or holds its own reference to it (for instance,
+cli.prompt). Runs given values for an option with stream_values set are never
+cached.
+
+Entries are kept in memory up to a maximum count, evicting the least recently
+used first. If a directory is given, entries are also written there, one
+file per entry, so they are shared between processes; expired files are
+removed when they are next read or by prune.
+"""
+
+import collections
+import copy
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+
+from okaara import _io, _local
+from okaara.cli import OptionValidationFailed
+from okaara.prompt import OUTPUT_PLAIN, WIDTH_TERMINAL, Recorder
+
+# -- constants ----------------------------------------------------------------
+
+LOG = logging.getLogger(__name__)
+
+# Incremented whenever the format of the files in the cache directory changes
+CACHE_VERSION = 1
+
+# Prefix for entry files; files in the directory without it are left alone
+_FILE_PREFIX = 'okaara-result-'
+
+# Recorder for the output of the cacheable run executing in this thread (or
+# asyncio task)
+_RECORDER = _local.context_local('okaara_result_recorder')
+
+# Guards installing and removing _CaptureStream on shared prompts
+_capture_lock = threading.Lock()
+
+# -- classes ------------------------------------------------------------------
+
+class CachedResult(object):
+    """
+    Exit code and output of a single command run.
+    """
+
+    def __init__(self, exit_code, output, created):
+        self.exit_code = exit_code
+        self.output = output
+        self.created = created
+
+
+class ResultCache(object):
+    """
+    Cache of command results; see the module documentation for usage.
+    """
+
+    def __init__(self, ttl=60, max_entries=256, directory=None):
+        """
+        :param ttl: seconds a result may be reused for
+        :type  ttl: int or float
+
+        :param max_entries: number of results kept in memory
+        :type  max_entries: int
+
+        :param directory: if specified, results are also stored in this
+               directory, which must already exist
+        :type  directory: str
+        """
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.directory = directory
+
+        self._entries = collections.OrderedDict()
+
+        # Guards the entries when the CLI is run from several threads
+        self._lock = threading.Lock()
+
+    def execute(self, command, path, prompt, args):
+        """
+        Runs the given command as Command.execute does, serving the result
+        from the cache if a current one exists and storing it otherwise.
+
+        :param command: command to run
+        :type  command: okaara.cli.Command
+
+        :param path: section and command names used to reach the command
+        :type  path: list of str
+
+        :param prompt: prompt to run the command with
+        :type  prompt: okaara.prompt.Prompt
+
+        :param args: arguments to the command
+        :type  args: list of str
+
+        :return: exit code of the command
+        """
+        run = self._start(command, path, prompt, args)
+        if run.served:
+            return run.exit_code
+
+        try:
+            exit_code = command.invoke(run.prompt, run.method, run.arg_list, run.kwarg_dict)
+        finally:
+            run.end()
+
+        return run.finish(exit_code)
+
+    def key(self, path, arg_list, kwarg_dict, prompt):
+        """
+        Returns the cache key for a command run. Values that cannot be
+        represented in JSON are included by their repr.
+
+        :rtype: str
+        """
+        document = {
+            'path': list(path),
+            'args': list(arg_list),
+            'kwargs': kwarg_dict,
+            'output_format': getattr(prompt, 'output_format', None),
+            'color': getattr(prompt, 'enable_color', None),
+            'wrap_width': _wrap_width(prompt),
+        }
+        data = json.dumps(document, sort_keys=True, default=repr)
+        return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """
+        Returns the current result for the given key, if there is one.
+
+        :rtype: CachedResult or None
+        """
+        self._lock.acquire()
+        try:
+            result = self._entries.pop(key, None)
+        finally:
+            self._lock.release()
+
+        if result is None and self.directory is not None:
+            result = self._read(key)
+
+        if result is None:
+            return None
+
+        if self._expired(result):
+            self._remove_file(key)
+            return None
+
+        # Reinserted to mark it as the most recently used
+        self._remember(key, result)
+        return result
+
+    def put(self, key, result):
+        """
+        Stores a result under the given key.
+
+        :type  key: str
+        :type  result: CachedResult
+        """
+        self._lock.acquire()
+        try:
+            self._entries.pop(key, None)
+        finally:
+            self._lock.release()
+        self._remember(key, result)
+
+        if self.directory is not None:
+            try:
+                self._write(key, result)
+            except (IOError, OSError):
+                LOG.exception('Could not write cached result to [%s]' % self.directory)
+
+    def clear(self):
+        """
+        Removes every result, including those in the directory.
+        """
+        self._lock.acquire()
+        try:
+            self._entries.clear()
+        finally:
+            self._lock.release()
+
+        for key in self._file_keys():
+            self._remove_file(key)
+
+    def prune(self):
+        """
+        Removes expired results, including those in the directory.
+        """
+        self._lock.acquire()
+        try:
+            for key, result in list(self._entries.items()):
+                if self._expired(result):
+                    del self._entries[key]
+        finally:
+            self._lock.release()
+
+        for key in self._file_keys():
+            result = self._read(key)
+            if result is None or self._expired(result):
+                self._remove_file(key)
+
+    def _start(self, command, path, prompt, args):
+        """
+        Does everything for execute up to invoking the command's method:
+        validating the arguments and serving the result if it is cached, or
+        otherwise loading the method and preparing to capture its output.
+        Shared with the asyncio implementation of Cli.run_async.
+
+        :rtype: _CachedRun
+        """
+        try:
+            arg_list, kwarg_dict = command.prepare_arguments(prompt, args)
+        except OptionValidationFailed:
+            return _CachedRun(exit_code=os.EX_DATAERR)
+
+        # Streamed values are only read as the method runs, so they can't be
+        # part of the key
+        if _has_streamed_values(command, kwarg_dict):
+            return _CachedRun(prompt=prompt, method=command.resolve_method(), arg_list=arg_list,
+                              kwarg_dict=kwarg_dict)
+
+        key = self.key(path, arg_list, kwarg_dict, prompt)
+
+        result = self.get(key)
+        if result is not None:
+            prompt.flush()
+            prompt.output.write(result.output)
+            return _CachedRun(exit_code=result.exit_code)
+
+        # Writes to the prompt's stream are recorded for whichever run is
+        # executing in the writing thread or task, so concurrent runs sharing
+        # the prompt don't capture each other's output. The command is given
+        # a copy of the prompt with its own buffer for the same reason.
+        method = command.resolve_method()
+        prompt.flush()
+        recorder = Recorder()
+        token = _RECORDER.set(recorder)
+        _start_capture(prompt)
+        return _CachedRun(prompt=_run_prompt(prompt), method=method, arg_list=arg_list,
+                          kwarg_dict=kwarg_dict, cache=self, key=key, recorder=recorder,
+                          shared_prompt=prompt, token=token)
+
+    def _remember(self, key, result):
+        self._lock.acquire()
+        try:
+            self._entries[key] = result
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        finally:
+            self._lock.release()
+
+    def _expired(self, result):
+        return time.time() - result.created > self.ttl
+
+    def _filename(self, key):
+        return os.path.join(self.directory, _FILE_PREFIX + key)
+
+    def _file_keys(self):
+        if self.directory is None:
+            return []
+        return [f[len(_FILE_PREFIX):] for f in os.listdir(self.directory) if f.startswith(_FILE_PREFIX)]
+
+    def _read(self, key):
+        try:
+            f = open(self._filename(key), 'r')
+            try:
+                document = json.load(f)
+            finally:
+                f.close()
+        except (IOError, OSError, ValueError):
+            return None
+
+        if document.get('version') != CACHE_VERSION:
+            return None
+
+        return CachedResult(document['exit_code'], document['output'], document['created'])
+
+    def _write(self, key, result):
+        document = {
+            'version': CACHE_VERSION,
+            'exit_code': result.exit_code,
+            'output': result.output,
+            'created': result.created,
+        }
+
+        _io.write_atomically(self._filename(key), json.dumps(document), '.okaara-result-')
+
+    def _remove_file(self, key):
+        if self.directory is None:
+            return
+        try:
+            os.remove(self._filename(key))
+        except OSError:
+            pass
+
+# -- private ------------------------------------------------------------------
+
+class _CachedRun(object):
+    """
+    Run of a cacheable command in progress. If served is true, the run is
+    complete with the given exit code. Otherwise, the method is invoked with
+    the prompt and arguments, end is called once it returns or raises, and its
+    exit code is passed to finish.
+    """
+
+    def __init__(self, exit_code=None, prompt=None, method=None, arg_list=None, kwarg_dict=None,
+                 cache=None, key=None, recorder=None, shared_prompt=None, token=None):
+        self.exit_code = exit_code
+        self.prompt = prompt
+        self.method = method
+        self.arg_list = arg_list
+        self.kwarg_dict = kwarg_dict
+        self.cache = cache
+        self.key = key
+        self.recorder = recorder
+        self.shared_prompt = shared_prompt
+        self.token = token
+
+    @property
+    def served(self):
+        return self.method is None
+
+    def end(self):
+        """
+        Writes out the run's buffered output and stops capturing it.
+        """
+        self.prompt.flush()
+        if self.key is None:
+            return
+
+        try:
+            self.shared_prompt.flush()
+        finally:
+            _stop_capture(self.shared_prompt)
+            _RECORDER.reset(self.token)
+
+    def finish(self, exit_code):
+        """
+        Stores the result of the run if it succeeded and can be cached.
+
+        :return: the given exit code
+        """
+        if self.key is not None and (exit_code is None or exit_code == os.EX_OK):
+            result = CachedResult(exit_code, self.recorder.getvalue(), time.time())
+            self.cache.put(self.key, result)
+        return exit_code
+
+
+def _has_streamed_values(command, kwarg_dict):
+    for o in command.all_options():
+        if o.allow_multiple and o.stream_values and kwarg_dict.get(o.keyword) is not None:
+            return True
+    return False
+
+
+def _wrap_width(prompt):
+    """
+    Returns the width the prompt wraps output to, resolving WIDTH_TERMINAL
+    to the current terminal width.
+    """
+    if getattr(prompt, 'output_format', None) == OUTPUT_PLAIN:
+        # Plain output isn't wrapped to the prompt's width
+        return None
+
+    wrap_width = getattr(prompt, 'wrap_width', None)
+    if wrap_width is WIDTH_TERMINAL:
+        wrap_width = prompt.current_terminal_size()[0]
+    return wrap_width
+
+
+def _start_capture(prompt):
+    """
+    Routes the prompt's output through a _CaptureStream until the matching
+    call to _stop_capture.
+    """
+    _capture_lock.acquire()
+    try:
+        if not isinstance(prompt.output, _CaptureStream):
+            prompt.output = _CaptureStream(prompt.output)
+        prompt.output.runs += 1
+    finally:
+        _capture_lock.release()
+
+
+def _stop_capture(prompt):
+    """
+    Restores the prompt's stream once no run is capturing from it.
+    """
+    _capture_lock.acquire()
+    try:
+        stream = prompt.output
+        stream.runs -= 1
+        if stream.runs == 0:
+            prompt.output = stream.stream
+    finally:
+        _capture_lock.release()
+
+
+def _run_prompt(prompt):
+    """
+    Returns a copy of the prompt for a single run. The copy shares the
+    prompt's settings, stream and recorded tags but has its own output buffer.
+    """
+    run_prompt = copy.copy(prompt)
+    if hasattr(run_prompt, '_buffer'):
+        run_prompt._buffer = []
+        run_prompt._buffered = 0
+    return run_prompt
+
+
+class _CaptureStream(object):
+    """
+    Output stream that writes to a stream and to the recorder of the cacheable
+    run executing in the writing thread or task, if there is one.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+
+        # Number of runs capturing from this stream
+        self.runs = 0
+
+    def write(self, text):
+        self.stream.write(text)
+        recorder = _RECORDER.get()
+        if recorder is not None:
+            recorder.write(text)
+
+    def flush(self):
+        if hasattr(self.stream, 'flush'):
+            self.stream.flush()
+
+    def __getattr__(self, name):
+        # Anything else, such as isatty, is answered by the wrapped stream
+        return getattr(self.stream, name)
@@ -16,19 +16,54 @@ from __future__ import absolute_import
 from builtins import str
 from builtins import object
 
-import gettext
-from optparse import OptionParser, Values, BadOptionError
 import os
 import sys
+import threading
 
-from .prompt import Prompt
+from abc import ABCMeta
+
+from ._i18n import _, N_
+from .prompt import (Prompt, Recorder, WIDTH_TERMINAL, OUTPUT_JSON, RECORD_ERROR, RECORD_SECTION,
+                     RECORD_USAGE)
+from . import _io, _local, _text, timing
 from functools import reduce
 
-t = gettext.translation('okaara', fallback=True)
-if sys.version_info[0] < 3:
-    _ = t.ugettext
-else:
-    _ = t.gettext
+# Loaded on first access (see __getattr__) so importing this module does not
+# import optparse
+_OPTPARSE_NAMES = ('NoCatchErrorParser', 'OptionParser', 'Values', 'BadOptionError')
+
+# Prompt of the command and context of the run currently executing; kept per
+# asyncio task as well as per thread
+_CURRENT_PROMPT = _local.context_local('okaara_prompt')
+_CURRENT_CONTEXT = _local.context_local('okaara_context')
+
+# Guards the one-time loading of deferred sections and command methods when
+# a CLI is run from several threads; reentrant as builders may call back into
+# their section
+_LOAD_LOCK = threading.RLock()
+
+# Placeholder builder for a section whose builder is running
+_BUILDING = object()
+
+# Root of the _*Base classes below. They hold the structure classes' behavior
+# with their attributes in slots, and the public classes derive from them
+# adding only a per-instance dict for applications' own attributes. The
+# frozen nodes (see okaara.frozen) derive from the bases instead so large
+# frozen CLIs have no per-node dict; they are registered as virtual
+# subclasses of the public classes so isinstance checks still hold.
+_Node = ABCMeta('_Node', (object,), {'__slots__': ()})
+
+
+def __getattr__(name):
+    if name in _OPTPARSE_NAMES:
+        if name == 'NoCatchErrorParser':
+            from ._optparse import NoCatchErrorParser as value
+        else:
+            import optparse
+            value = getattr(optparse, name)
+        globals()[name] = value
+        return value
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
 
 # -- exceptions ---------------------------------------------------------------
 
@@ -66,61 +101,347 @@ class OptionValidationFailed(Exception):
     """
     pass
 
+# -- utilities ----------------------------------------------------------------
+
+def current_prompt():
+    """
+    Returns the prompt passed to the command currently executing on this
+    thread (or in this asyncio task). Command methods that write output
+    through this prompt, rather than one they hold a reference to, have their
+    output captured per execution by Command.execute_many and Cli.run_many.
+
+    :return: prompt for the executing command; None if no command is executing
+    :rtype:  Prompt or None
+    """
+    return _CURRENT_PROMPT.get()
+
+
+def current_context():
+    """
+    Returns the context passed to the Cli.run (or Cli.run_async) call in
+    progress on this thread (or in this asyncio task), which commands may use
+    to read the caller's environment.
+
+    :return: context for the current run; None if no run is in progress or
+             it was not given a context
+    :rtype:  RunContext or None
+    """
+    return _CURRENT_CONTEXT.get()
+
+
+def import_callable(path):
+    """
+    Imports and returns the object referenced by the given import path. The
+    path may be in either of the following formats:
+
+    * package.module:function - everything after the colon is looked up as a
+      (possibly dotted) attribute of the module
+    * package.module.function - the last segment is the attribute in the module
+
+    :param path: import path to the object
+    :type  path: str
+
+    :return: object referenced by the path
+    :raise ImportError: if the module cannot be imported or does not contain
+           the referenced attribute
+    """
+    import importlib
+
+    if ':' in path:
+        module_name, attribute_path = path.split(':', 1)
+    else:
+        module_name, attribute_path = path.rsplit('.', 1)
+
+    found = importlib.import_module(module_name)
+    try:
+        for attribute in attribute_path.split('.'):
+            found = getattr(found, attribute)
+    except AttributeError:
+        raise ImportError(_('Cannot find [%(a)s] in module [%(m)s]') % {'a': attribute_path, 'm': module_name})
+
+    return found
+
+def _program_name():
+    """
+    Returns the name the CLI was invoked as for display in usage text, taken
+    from the current run's context if it specifies one.
+    """
+    context = current_context()
+    if context is not None and context.program_name is not None:
+        return os.path.basename(context.program_name)
+    return os.path.basename(sys.argv[0])
+
+
+def _structured_output(prompt):
+    """
+    Indicates if the given prompt is writing JSON records instead of text.
+    """
+    return getattr(prompt, 'output_format', None) == OUTPUT_JSON
+
+
+def _execute_task(command, args, prompt_kwargs):
+    """
+    Runs a single execution for Command.execute_many, capturing its output.
+    This is module-level so it can be sent to a process pool.
+
+    :rtype: TaskResult
+    """
+    recorder = Recorder()
+    prompt = Prompt(output=recorder, **prompt_kwargs)
+
+    try:
+        exit_code = command.execute(prompt, args)
+        if exit_code is None:
+            exit_code = os.EX_OK
+    except CommandUsage as e:
+        command.print_command_usage(prompt, missing_required=e.missing_options,
+                                    unexpected=e.unexpected_options)
+        exit_code = os.EX_USAGE
+    except Exception as e:
+        prompt.flush()
+        return TaskResult(args, os.EX_SOFTWARE, recorder.getvalue(), exception=e)
+
+    # Output still held by a buffering prompt belongs to the result
+    prompt.flush()
+    return TaskResult(args, exit_code, recorder.getvalue())
+
 # -- classes ------------------------------------------------------------------
 
-class NoCatchErrorParser(OptionParser):
+class CommandParser(object):
     """
-    OptionParser's default behavior for handling errors is to print the output
-    and exit. I'd rather go through the rest of the CLI's output methods, so
-    change this behavior to throw my exception instead.
+    Default parser for a command's options. The arguments are processed in a
+    single pass using a lookup table of every option's name and aliases,
+    following the same rules as optparse:
+
+    * --name value, --name=value, -n value and -nvalue set an option's value
+    * single character flags may be combined (-abc) and may be followed by
+      one option taking a value (-abn value)
+    * long names may be abbreviated to any unambiguous prefix
+    * -h and --help, unless used by the command, request the command's usage
+    * arguments that are not options are returned in order; everything after
+      a -- argument is treated as such
+
+    Instances hold no state from a parse, so a single instance may be used
+    from multiple threads.
     """
-    def exit(self, status=0, msg=None):
-        raise CommandUsage()
 
-    def print_help(self, file=None):
-        # The CLI will take care of formatting the options for a --help call,
-        # so do nothing here.
-        pass
+    def __init__(self, options):
+        """
+        :param options: every option the command accepts
+        :type  options: list of Option
+        """
+        self.options = list(options)
+
+        # Maps each trigger to its option; None indicates a help request
+        self.triggers = {'-h': None, '--help': None}
+        for o in self.options:
+            self.triggers[o.name] = o
+            for alias in o.aliases or []:
+                self.triggers[alias] = o
+
+        self.long_triggers = sorted([t for t in self.triggers if t.startswith('--')])
 
-    def parse_args(self, args=None, values=None):
+    def parse_args(self, args, values=None):
         """
-        Copied directly from optparse with the change that an exception on
-        _process_args isn't passed to error but rather converted into a
-        CommandUsage. Bad optparse, passing a string version of the exception
-        to error instead of the programmatically accessible data and letting
-        error() do with it as it wishes.
+        Parses the given arguments.
+
+        :param args: arguments to the command
+        :type  args: list of str
+
+        :param values: starting value for each option keyed by option name,
+               typically the defaults; updated in place and returned. If
+               unspecified, each option's default is used.
+        :type  values: dict
+
+        :return: tuple of the non-option arguments and the value of each option
+                 keyed by option name
+        :rtype:  (list, dict)
+
+        :raise CommandUsage: if an option is unknown, is missing its value or
+               is given a value it does not take, or if help was requested
         """
-        rargs = self._get_args(args)
         if values is None:
-            values = self.get_default_values()
+            values = dict([(o.name, o.default) for o in self.options])
+
+        positional = []
+        index = 0
+        count = len(args)
+
+        while index < count:
+            arg = args[index]
+            index += 1
+
+            if arg == '--':
+                positional.extend(args[index:])
+                break
+
+            if arg[:2] == '--':
+                value = None
+                if '=' in arg:
+                    arg, value = arg.split('=', 1)
+
+                option = self._find_long(arg)
+                if isinstance(option, Flag):
+                    if value is not None:
+                        raise CommandUsage()
+                elif value is None:
+                    if index == count:
+                        raise CommandUsage()
+                    value = args[index]
+                    index += 1
+
+                self._store(values, option, value)
+
+            elif arg[:1] == '-' and arg != '-':
+                # One or more single character options
+                position = 1
+                while position < len(arg):
+                    trigger = '-' + arg[position]
+                    position += 1
+
+                    option = self._find_short(trigger)
+                    if isinstance(option, Flag):
+                        self._store(values, option, None)
+                        continue
+
+                    # The value is the rest of this argument or the next one
+                    if position < len(arg):
+                        value = arg[position:]
+                    elif index < count:
+                        value = args[index]
+                        index += 1
+                    else:
+                        raise CommandUsage()
 
-        self.rargs = rargs
-        self.largs = largs = []
-        self.values = values
+                    self._store(values, option, value)
+                    break
 
-        try:
-            self._process_args(largs, rargs, values)
-        except BadOptionError as e:
-            # Raise with the data, not a string version of the exception
-            raise CommandUsage(unexpected_options=[e.opt_str])
+            else:
+                positional.append(arg)
+
+        return positional, values
+
+    def _find_long(self, trigger):
+        if trigger in self.triggers:
+            option = self.triggers[trigger]
+        else:
+            matches = [t for t in self.long_triggers if t.startswith(trigger)]
+            if len(matches) != 1:
+                raise CommandUsage(unexpected_options=[trigger])
+            option = self.triggers[matches[0]]
+
+        if option is None:
+            raise CommandUsage()
+        return option
+
+    def _find_short(self, trigger):
+        if trigger not in self.triggers:
+            raise CommandUsage(unexpected_options=[trigger])
+
+        option = self.triggers[trigger]
+        if option is None:
+            raise CommandUsage()
+        return option
 
-        args = largs + rargs
-        return self.check_values(values, args)
+    def _store(self, values, option, value):
+        if isinstance(option, Flag):
+            values[option.name] = True
+        elif option.allow_multiple:
+            current = values.get(option.name)
+            if current is None:
+                values[option.name] = [value]
+            elif current is option.default:
+                # Never modify the option's default list itself
+                values[option.name] = list(current) + [value]
+            else:
+                current.append(value)
+        else:
+            values[option.name] = value
 
 
-class Option(object):
+class RunContext(object):
     """
-    Represents an input to a command, either optional or required.
+    Per-call state for Cli.run. Giving each call its own context lets a
+    single CLI serve concurrent runs from different threads without their
+    output or usage text crossing over.
     """
+
+    def __init__(self, prompt=None, program_name=None, environ=None, cwd=None):
+        """
+        :param prompt: prompt used for the run's output; defaults to the
+               CLI's prompt
+        :type  prompt: Prompt
+
+        :param program_name: name the CLI was invoked as (typically argv[0]),
+               shown in usage text; defaults to sys.argv[0]
+        :type  program_name: str
+
+        :param environ: environment variables of the caller; defaults to
+               os.environ
+        :type  environ: dict
+
+        :param cwd: working directory of the caller, against which relative
+               @filename option values are read; defaults to the process's
+        :type  cwd: str
+        """
+        self.prompt = prompt
+        self.program_name = program_name
+        if environ is None:
+            environ = os.environ
+        self.environ = environ
+        self.cwd = cwd
+
+
+class TaskResult(object):
+    """
+    Outcome of running a command for one set of arguments through
+    Command.execute_many or Cli.run_many.
+    """
+
+    def __init__(self, args, exit_code, output, exception=None):
+        """
+        :param args: arguments the command was run with
+        :type  args: list
+
+        :param exit_code: exit code of the command; EX_SOFTWARE if it raised
+               an exception
+        :type  exit_code: int
+
+        :param output: everything written to the prompt given to the command
+        :type  output: str
+
+        :param exception: exception raised by the command, if any
+        :type  exception: Exception or None
+        """
+        self.args = args
+        self.exit_code = exit_code
+        self.output = output
+        self.exception = exception
+
+    def __str__(self):
+        return 'TaskResult [%s] exit code [%s]' % (' '.join(self.args), self.exit_code)
+
+
+class _OptionBase(_Node):
+    """
+    Implementation of Option; see _Node.
+    """
+
+    __slots__ = ('name', 'description', 'required', 'allow_multiple', 'stream_values', 'default',
+                 'validate_func', 'parse_func', 'choices', 'aliases')
+
     def __init__(self, name, description, required=True, allow_multiple=False,
-                 aliases=None, default=None, validate_func=None, parse_func=None):
+                 aliases=None, default=None, validate_func=None, parse_func=None, choices=None,
+                 stream_values=False):
         self.name = name
         self.description = description
         self.required = required
         self.allow_multiple = allow_multiple
+        self.stream_values = stream_values
         self.default = default
         self.validate_func = validate_func
         self.parse_func = parse_func
+        self.choices = choices
 
         if aliases is not None and not isinstance(aliases, (list, tuple)):
             aliases = [aliases]
@@ -139,23 +460,66 @@ class Option(object):
         """
         return self.name.lstrip('-')
 
+    def resolve_validate_func(self):
+        """
+        Returns the validation function, importing it first if it was
+        specified as an import path.
+
+        :rtype: callable or None
+        """
+        if isinstance(self.validate_func, _text.STRING_TYPES):
+            self.validate_func = import_callable(self.validate_func)
+        return self.validate_func
+
+    def resolve_parse_func(self):
+        """
+        Returns the parse function, importing it first if it was specified as
+        an import path.
 
-class Flag(Option):
+        :rtype: callable or None
+        """
+        if isinstance(self.parse_func, _text.STRING_TYPES):
+            self.parse_func = import_callable(self.parse_func)
+        return self.parse_func
+
+
+class Option(_OptionBase):
+    """
+    Represents an input to a command, either optional or required.
+
+    Like a command's method, the validate_func and parse_func may be given as
+    import paths; they are imported the first time they are applied.
+    """
+    pass
+
+
+class _FlagBase(_OptionBase):
+    """
+    Implementation of Flag; see _Node.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, name, description, aliases=None):
+        _OptionBase.__init__(self, name, description, required=False, allow_multiple=False,
+                             aliases=aliases)
+
+
+class Flag(_FlagBase, Option):
     """
     Specific form of an option that does not take a value; it is meant to be
     either included in the command or excluded.
     """
-    def __init__(self, name, description, aliases=None):
-        Option.__init__(self, name, description, required=False, allow_multiple=False, aliases=aliases)
+    pass
 
 
-class OptionGroup(object):
+class _OptionGroupBase(_Node):
     """
-    Used purely for usage display purposes, options and flags added to a group
-    will be rendered in their own section. Their behavior is still the same
-    (i.e. they must still be unique across the command).
+    Implementation of OptionGroup; see _Node.
     """
 
+    __slots__ = ('name', 'description', 'options')
+
     def __init__(self, name, description=None):
         self.name = name
         self.description = description
@@ -175,35 +539,57 @@ class OptionGroup(object):
         self.options.append(option)
 
 
-class Command(object):
+class OptionGroup(_OptionGroupBase):
     """
-    Represents something that should be executed by the CLI. These nodes will be
-    leaves in the CLI tree. Each command is tied to a single python method and
-    will invoke that method with whatever arguments follow it.
+    Used purely for usage display purposes, options and flags added to a group
+    will be rendered in their own section. Their behavior is still the same
+    (i.e. they must still be unique across the command).
+    """
+    pass
+
+
+class _CommandBase(_Node):
+    """
+    Implementation of Command; see _Node.
     """
 
     # When printing the usage for a command, the description for any options
-    # is prefixed with one of these two values depending on its required value
-    REQUIRED_OPTION_PREFIX = _('(required) ')
+    # is prefixed with one of these two values depending on its required value;
+    # they are translated when displayed
+    REQUIRED_OPTION_PREFIX = N_('(required) ')
     OPTIONAL_OPTION_PREFIX = ''
 
-    def __init__(self, name, description, method, usage_description=None, parser=None):
+    __slots__ = ('name', 'description', 'method', 'method_loader', 'usage_description', 'parser',
+                 'cacheable', 'options', 'option_groups', '_compiled_parser', '_compiled_parser_key')
+
+    def __init__(self, name, description, method, usage_description=None, parser=None,
+                 method_loader=None):
         self.name = name
         self.description = description
         self.method = method
+        self.method_loader = method_loader
         self.usage_description = usage_description
         self.parser = parser
 
+        # If true and the CLI has a result cache, results of running this
+        # command are reused for identical arguments; see okaara.cache
+        self.cacheable = False
+
         self.options = []
         self.option_groups = []
 
+        # Parser built from the options on first use and reused on subsequent
+        # executions; see compiled_parser for when it is rebuilt
+        self._compiled_parser = None
+        self._compiled_parser_key = None
+
     def __str__(self):
         return 'Command [%s]' % self.name
 
     def execute(self, prompt, args):
         """
-        Executes this command, passing the remaining arguments into optparse to
-        process.
+        Executes this command, passing the remaining arguments into the
+        command's parser to process.
 
         :param prompt: for any output the framework needs to display
         :type  prompt: Prompt
@@ -213,18 +599,151 @@ class Command(object):
                      arguments to the command's execution itself
         :type  args: list of strings
         """
-
-        # Parse the command arguments into a dictionary
         try:
-            arg_list, kwarg_dict = self.parse_arguments(prompt, args)
+            method, arg_list, kwarg_dict = self.prepare_call(prompt, args)
         except OptionValidationFailed:
             return os.EX_DATAERR
 
+        return self.invoke(prompt, method, arg_list, kwarg_dict)
+
+    def invoke(self, prompt, method, arg_list, kwarg_dict):
+        """
+        Calls the command's method with arguments as returned from
+        prepare_call, making the prompt available through current_prompt.
+
+        :return: result of the method; os.EX_DATAERR if a streamed option
+                 value failed validation while the method consumed it
+
+        :raise RuntimeError: if the method is a coroutine function and this
+               is called from within a running event loop
+        """
+        token = _CURRENT_PROMPT.set(prompt)
+        try:
+            result = method(*arg_list, **kwarg_dict)
+
+            # Coroutine methods are run to completion on their own event loop;
+            # use execute_async to run them on an existing loop instead
+            if hasattr(result, '__await__'):
+                from okaara import _aio
+                result = _aio.run_awaitable(result)
+        except OptionValidationFailed:
+            result = os.EX_DATAERR
+        finally:
+            _CURRENT_PROMPT.reset(token)
+            timing.mark(timing.PHASE_METHOD)
+
+        return result
+
+    def execute_async(self, prompt, args):
+        """
+        Coroutine version of execute for use within a running asyncio event
+        loop. The arguments are parsed and validated exactly as in execute; if
+        the command's method is a coroutine function, it is awaited, otherwise
+        it is called directly. Requires Python 3.7 or newer.
+
+        :return: coroutine that returns the command's result
+        """
+        from okaara import _aio
+        return _aio.execute_command(self, prompt, args)
+
+    def execute_many(self, arg_vectors, max_workers=4, use_processes=False, prompt_kwargs=None):
+        """
+        Executes this command once for each set of arguments, spreading the
+        executions across a pool of threads (or processes). Each execution is
+        given its own Prompt writing to a Recorder, so output from concurrent
+        executions is captured separately rather than interleaved. Usage
+        errors are rendered into that output as they are for a single run.
+
+        Results are yielded in the order of the argument sets. The argument
+        sets may be any iterable, including a generator; only a bounded number
+        are submitted ahead of the result being consumed.
+
+        Only output written to the prompt passed to the command is captured.
+        When use_processes is true, the command (including its method, so
+        use a module-level function or import path) must be picklable.
+
+        :param arg_vectors: iterable of argument lists, each as would be passed
+               to execute
+        :type  arg_vectors: iterable
+
+        :param max_workers: number of concurrent executions
+        :type  max_workers: int
+
+        :param use_processes: if true, a process pool is used instead of threads
+        :type  use_processes: bool
+
+        :param prompt_kwargs: arguments used to create each execution's Prompt
+        :type  prompt_kwargs: dict
+
+        :return: iterator of TaskResult, one per argument set in input order
+        :rtype:  iterator
+        """
+        import collections
+        from concurrent import futures
+
+        prompt_kwargs = prompt_kwargs or {}
+
+        if use_processes:
+            executor = futures.ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+
+        try:
+            pending = collections.deque()
+            for args in arg_vectors:
+                pending.append(executor.submit(_execute_task, self, list(args), prompt_kwargs))
+
+                # Keep the workers busy without reading the whole input ahead
+                if len(pending) >= max_workers * 2:
+                    yield pending.popleft().result()
+
+            while len(pending) > 0:
+                yield pending.popleft().result()
+        finally:
+            executor.shutdown(wait=True)
+
+    def prepare_call(self, prompt, args):
+        """
+        Parses and validates the arguments to this command, returning
+        everything needed to invoke its method. See prepare_arguments.
+
+        :return: tuple of the method to invoke, the positional arguments and
+                 the keyword arguments to invoke it with
+        :rtype:  (callable, list, dict)
+        """
+        arg_list, kwarg_dict = self.prepare_arguments(prompt, args)
+        return self.resolve_method(), arg_list, kwarg_dict
+
+    def prepare_arguments(self, prompt, args):
+        """
+        Parses and validates the arguments to this command without loading
+        its method.
+
+        :param prompt: for any output the framework needs to display
+        :type  prompt: Prompt
+
+        :param args: arguments to the command's execution
+        :type  args: list of strings
+
+        :return: tuple of the positional arguments and the keyword arguments
+                 to invoke the method with
+        :rtype:  (list, dict)
+
+        :raise OptionValidationFailed: if an option failed validation; the
+               reason has already been displayed
+        :raise CommandUsage: if required options are missing or unknown
+               options were specified
+        """
+
+        # Parse the command arguments into a dictionary
+        arg_list, kwarg_dict = self.parse_arguments(prompt, args)
+
         # Make sure all of the required arguments have been specified
         missing_required = [o for o in self.all_options()
                             if o.required and (o.name not in kwarg_dict or
                                                kwarg_dict[o.name] is None)]
         if len(missing_required) > 0:
+            timing.mark(timing.PHASE_VALIDATE)
             raise CommandUsage(missing_options=missing_required)
 
         # Flag entries that are not specified are parsed as None, but I'd rather
@@ -237,7 +756,32 @@ class Command(object):
         # Clean up option names
         clean_kwargs = dict([(k.lstrip('-'), v) for k, v in kwarg_dict.items()])
 
-        return self.method(*arg_list, **clean_kwargs)
+        timing.mark(timing.PHASE_VALIDATE)
+
+        return arg_list, clean_kwargs
+
+    def resolve_method(self):
+        """
+        Returns the method to invoke when this command is executed, loading it
+        first if it was specified as an import path or through a loader. The
+        loaded method replaces the import path/loader so it is only loaded once.
+
+        :return: method that will be invoked when this command is run
+        :rtype:  callable
+        """
+        if self.method_loader is not None:
+            _LOAD_LOCK.acquire()
+            try:
+                # Another thread may have loaded it while this one waited
+                if self.method_loader is not None:
+                    self.method = self.method_loader()
+                    self.method_loader = None
+            finally:
+                _LOAD_LOCK.release()
+        elif isinstance(self.method, _text.STRING_TYPES):
+            self.method = import_callable(self.method)
+
+        return self.method
 
     def add_option(self, option):
         """
@@ -249,6 +793,7 @@ class Command(object):
         :type  option: Option
         """
         self.options.append(option)
+        self.invalidate_parser()
 
     def add_flag(self, flag):
         """
@@ -270,9 +815,11 @@ class Command(object):
         :type  option_group: OptionGroup
         """
         self.option_groups.append(option_group)
+        self.invalidate_parser()
 
     def create_option(self, name, description, aliases=None, required=True, allow_multiple=False,
-                      default=None, validate_func=None, parse_func=None):
+                      default=None, validate_func=None, parse_func=None, choices=None,
+                      stream_values=False):
         """
         Creates a new option for this command. An option is an argument to the
         command line call that accepts a value.
@@ -337,11 +884,24 @@ class Command(object):
                user-specified value and its return will replace that value
         :type  parse_func: callable
 
+        :param choices: if specified, the only values the user may enter for
+               this option; these are also offered by shell completion
+        :type  choices: list of str
+
+        :param stream_values: only applies if allow_multiple is true; if
+               true, the option's value is an iterator rather than a list and
+               values of the form @filename or - are expanded to the lines of
+               that file or of the prompt's input as the command consumes them.
+               The choices, validate_func and parse_func are applied to each
+               value in turn rather than to the list as a whole.
+        :type  stream_values: bool
+
         :return: instance representing the option
         :rtype:  Option
         """
         option = Option(name, description, required=required, allow_multiple=allow_multiple, aliases=aliases,
-                        default=default, validate_func=validate_func, parse_func=parse_func)
+                        default=default, validate_func=validate_func, parse_func=parse_func,
+                        choices=choices, stream_values=stream_values)
         self.add_option(option)
         return option
 
@@ -407,58 +967,171 @@ class Command(object):
         # If a specific parser is specified, don't bother creating our own based
         # on added options. This is a bypass in case the user doesn't want to
         # use the provided abstraction.
-        parser = self.parser
-
-        if parser is None:
-            parser = NoCatchErrorParser()
+        if self.parser is not None:
+            timing.mark(timing.PHASE_PARSER)
+            options, remaining_args = self.parser.parse_args(input_args)
+            values = options.__dict__
+        else:
+            parser = self.compiled_parser()
+            timing.mark(timing.PHASE_PARSER)
+
+            # Defaults are read at parse time rather than baked into the cached
+            # parser so changes to an option's default are still honored
+            defaults = dict([(o.name, o.default) for o in self.all_options()])
+            remaining_args, values = parser.parse_args(input_args, values=defaults)
+
+        timing.mark(timing.PHASE_PARSE)
+
+        # Streamed options are checked value by value as the method consumes
+        # them, so they are replaced with their iterator and skipped below
+        checked_options = []
+        for o in self.all_options():
+            if o.allow_multiple and o.stream_values:
+                if values.get(o.name) is not None:
+                    values[o.name] = self._stream_values(prompt, o, values[o.name])
+            else:
+                checked_options.append(o)
 
-            for o in self.all_options():
-                if isinstance(o, Flag):
-                    action = 'store_true'
-                else:
-                    if o.allow_multiple:
-                        action = 'append'
-                    else:
-                        action = 'store'
+        # Reject values outside of the enumerated choices for any options that define them
+        choice_options = [o for o in checked_options if o.choices is not None]
 
-                name_list = [o.name]
-                if o.aliases is not None:
-                    name_list += o.aliases
+        for co in choice_options:
+            value = values[co.name]
+            if value is None:
+                continue
 
-                parser.add_option(dest=o.name, help=o.description, action=action, default=o.default, *name_list)
+            if co.allow_multiple:
+                entered = value
+            else:
+                entered = [value]
 
-        options, remaining_args = parser.parse_args(input_args)
+            if len([v for v in entered if v not in co.choices]) > 0:
+                e = ValueError(_('value must be one of: %s') % ', '.join(co.choices))
+                self.print_validation_error(prompt, co, e)
+                raise OptionValidationFailed()
 
         # Apply the validation function for any options that define it
-        validate_options = [o for o in self.all_options() if isinstance(o, Option) and o.validate_func is not None]
+        validate_options = [o for o in checked_options if o.validate_func is not None]
 
         for vo in validate_options:
             try:
-                value = options.__dict__[vo.name]
+                value = values[vo.name]
                 if value is not None:
-                    vo.validate_func(value)
+                    vo.resolve_validate_func()(value)
             except (ValueError, TypeError) as e:
                 # Only catch the expected validation error types; bubble up others
                 self.print_validation_error(prompt, vo, e)
                 raise OptionValidationFailed()
 
         # Apply the parsing function for any options that define it
-        parse_options = [o for o in self.all_options() if isinstance(o, Option) and o.parse_func is not None]
+        parse_options = [o for o in checked_options if o.parse_func is not None]
 
         for po in parse_options:
             # Do the same exception handling as for validate to let users
             # combine validate and parse into a single call
             try:
-                old_value = options.__dict__[po.name]
+                old_value = values[po.name]
                 if old_value is not None:
-                    new_value = po.parse_func(old_value)
-                    options.__dict__[po.name] = new_value
+                    new_value = po.resolve_parse_func()(old_value)
+                    values[po.name] = new_value
             except (ValueError, TypeError) as e:
                 # Only catch the expected validation error types; bubble up others
                 self.print_validation_error(prompt, po, e)
                 raise OptionValidationFailed()
 
-        return remaining_args, options.__dict__
+        return remaining_args, values
+
+    def _stream_values(self, prompt, option, raw_values):
+        """
+        Generator over the values of a streamed option. Each raw value of the
+        form @filename is replaced by the lines of that file and a value of -
+        by the lines read from the prompt's input; surrounding whitespace is
+        stripped from those lines and blank lines are skipped. Files are only
+        opened once the generator reaches them.
+
+        :raise OptionValidationFailed: if a value fails the option's choices,
+               validate_func or parse_func, or a file cannot be read; the reason
+               has already been displayed
+        """
+        for raw_value in raw_values:
+            if raw_value == '-':
+                lines = iter(prompt.input.readline, '')
+            elif isinstance(raw_value, _text.STRING_TYPES) and raw_value.startswith('@') and len(raw_value) > 1:
+                filename = raw_value[1:]
+                context = current_context()
+                if context is not None and context.cwd is not None:
+                    filename = os.path.join(context.cwd, filename)
+                try:
+                    lines = _io.file_lines(filename)
+                except IOError as e:
+                    self.print_validation_error(prompt, option, e)
+                    raise OptionValidationFailed()
+            else:
+                yield self._check_value(prompt, option, raw_value)
+                continue
+
+            for line in lines:
+                line = line.strip()
+                if line:
+                    yield self._check_value(prompt, option, line)
+
+    def _check_value(self, prompt, option, value):
+        """
+        Applies an option's choices, validate_func and parse_func to a single
+        value, returning the value to pass to the command's method.
+        """
+        try:
+            if option.choices is not None and value not in option.choices:
+                raise ValueError(_('value must be one of: %s') % ', '.join(option.choices))
+            if option.validate_func is not None:
+                option.resolve_validate_func()(value)
+            if option.parse_func is not None:
+                value = option.resolve_parse_func()(value)
+        except (ValueError, TypeError) as e:
+            self.print_validation_error(prompt, option, e)
+            raise OptionValidationFailed()
+        return value
+
+    def compiled_parser(self):
+        """
+        Returns the parser used to process this command's arguments when no
+        explicit parser was specified. The parser is built once and reused
+        across executions; it is rebuilt if options or option groups have been
+        added since it was last built.
+
+        :return: parser for the command's options
+        :rtype:  CommandParser
+        """
+        # Options may be added to a group after the group is added to the
+        # command, so the option counts are checked in addition to the explicit
+        # invalidation in the add_* calls
+        key = (len(self.options), tuple([len(g.options) for g in self.option_groups]))
+
+        parser = self._compiled_parser
+        if parser is None or self._compiled_parser_key != key:
+            parser = self._build_parser()
+            self._compiled_parser = parser
+            self._compiled_parser_key = key
+
+        return parser
+
+    def invalidate_parser(self):
+        """
+        Discards the cached parser, forcing it to be rebuilt on the next
+        execution. This is called automatically when options are added through
+        the command; it only needs to be called explicitly if an existing
+        option's name or aliases are changed after the command has executed.
+        """
+        self._compiled_parser = None
+        self._compiled_parser_key = None
+
+    def _build_parser(self):
+        """
+        Creates a new parser configured for all of the options in the command.
+
+        :rtype: CommandParser
+        """
+        return CommandParser(self.all_options())
 
     def print_validation_error(self, prompt, option, exception):
         """
@@ -472,6 +1145,11 @@ class Command(object):
         :param exception: exception that was raised from the validation function
         :type  exception: Exception
         """
+        if _structured_output(prompt):
+            message = exception.args and str(exception.args[0]) or None
+            prompt.write_record({'option': option.name, 'message': message}, record_type=RECORD_ERROR)
+            return
+
         prompt.write(_('Validation failed for argument [%s]:') % option.name)
         try:
             prompt.write('  %s' % exception.args[0])
@@ -503,6 +1181,10 @@ class Command(object):
         :param step: number of spaces to increment the indent the command's options
         :type  step: int
         """
+        if _structured_output(prompt):
+            prompt.write_record(self.usage_record(missing_required=missing_required, unexpected=unexpected),
+                                record_type=RECORD_USAGE)
+            return
 
         prompt.write(_('%sCommand: %s') % (' ' * indent, self.name))
         prompt.write(_('%sDescription: %s') % (' ' * indent, self.description))
@@ -524,9 +1206,14 @@ class Command(object):
 
                 # Prefix the description accordingly
                 if o.required:
-                    description = self.__class__.REQUIRED_OPTION_PREFIX + o.description
+                    prefix = self.__class__.REQUIRED_OPTION_PREFIX
                 else:
-                    description = self.__class__.OPTIONAL_OPTION_PREFIX + o.description
+                    prefix = self.__class__.OPTIONAL_OPTION_PREFIX
+
+                # The empty string would translate to the catalog's header
+                if prefix:
+                    prefix = _(prefix)
+                description = prefix + o.description
 
                 # Generate template
                 template = '%s' + '%-' + str(max_width) + 's - %s'
@@ -571,22 +1258,111 @@ class Command(object):
             for u in unexpected:
                 prompt.write('%s%s' % (' ' * (indent + step), u))
 
+    def usage_record(self, missing_required=None, unexpected=None):
+        """
+        Describes the command's usage for the JSON output format; see
+        print_command_usage for the parameters.
+
+        :rtype: dict
+        """
+        def option_record(o):
+            return {
+                'name': o.name,
+                'aliases': list(o.aliases or []),
+                'description': o.description,
+                'required': o.required,
+                'flag': isinstance(o, Flag),
+                'allow_multiple': o.allow_multiple,
+                'choices': o.choices,
+            }
+
+        return {
+            'command': self.name,
+            'description': self.description,
+            'usage': self.usage_description,
+            'options': [option_record(o) for o in self.options],
+            'option_groups': [{'name': g.name, 'description': g.description,
+                               'options': [option_record(o) for o in g.options]}
+                              for g in self.option_groups],
+            'missing_required': [o.name for o in missing_required or []],
+            'unexpected': list(unexpected or []),
+        }
+
+
+class Command(_CommandBase):
+    """
+    Represents something that should be executed by the CLI. These nodes will be
+    leaves in the CLI tree. Each command is tied to a single python method and
+    will invoke that method with whatever arguments follow it.
 
-class Section(object):
+    The method does not have to be loaded when the command is created. It may
+    be given as an import path string (see import_callable for the format) or
+    a method_loader may be specified that returns the method when called. In
+    either case the method is only loaded when the command is executed, so
+    displaying usage and the CLI map does not import command implementations.
     """
-    Represents a division of commands in the CLI. Sections may contain other
-    sections, which creates a string of arguments used to get to a command
-    (think namespaces).
+    pass
+
+
+class _SectionBase(_Node):
+    """
+    Implementation of Section; see _Node.
     """
-    def __init__(self, name, description):
+
+    __slots__ = ('name', 'description', 'builder', 'subsections', 'commands', '_children')
+
+    def __init__(self, name, description, builder=None):
         self.name = name
         self.description = description
+        self.builder = builder
         self.subsections = {}
         self.commands = {}
 
+        # Single lookup of both subsections and commands by name; since names
+        # must be unique across both, this lets a command line be resolved
+        # with one lookup per argument
+        self._children = {}
+
     def __str__(self):
         return 'Section [%s]' % self.name
 
+    def build(self):
+        """
+        Runs the builder for this section if one was specified and has not yet
+        been run. This call has no effect on sections without a builder.
+
+        If the builder raises an exception, anything it added is removed and
+        it is run again the next time the section is needed.
+        """
+        if self.builder is None:
+            return
+
+        _LOAD_LOCK.acquire()
+        try:
+            builder = self.builder
+            if builder is None or builder is _BUILDING:
+                # Built by another thread while this one waited, or this is a
+                # call back into the section from its own builder
+                return
+
+            # Other threads wait on the lock rather than seeing a partially
+            # built section
+            self.builder = _BUILDING
+            subsections = dict(self.subsections)
+            commands = dict(self.commands)
+            children = dict(self._children)
+            try:
+                builder(self)
+            except:
+                self.subsections = subsections
+                self.commands = commands
+                self._children = children
+                self.builder = builder
+                raise
+            self.builder = None
+        finally:
+            _LOAD_LOCK.release()
+
     def add_subsection(self, section):
         """
         Adds another node to the CLI tree. Users will be able to specify the
@@ -598,6 +1374,7 @@ class Section(object):
         """
         self.verify_new_structure(section.name)
         self.subsections[section.name] = section
+        self._children[section.name] = section
 
     def add_command(self, command):
         """
@@ -611,8 +1388,10 @@ class Section(object):
         """
         self.verify_new_structure(command.name)
         self.commands[command.name] = command
+        self._children[command.name] = command
 
-    def create_command(self, name, description, method, usage_description=None, parser=None):
+    def create_command(self, name, description, method, usage_description=None, parser=None,
+                       method_loader=None):
         """
         Creates a new command in this section. The given name must be
         unique across all commands and subsections within this section.
@@ -629,8 +1408,10 @@ class Section(object):
                running this command; displayed to users in the usage output
         :type  description: str
 
-        :param method: method that will be invoked when this command is run
-        :type  method: function
+        :param method: method that will be invoked when this command is run;
+               may also be an import path to the method, in which case it is
+               not imported until the command is run
+        :type  method: function or str
 
         :param usage_description: optional extra text that is only displayed
                when viewing the full usage of this command
@@ -641,14 +1422,20 @@ class Section(object):
                be handled; the results will be sent to the command's method
         :type  parser: OptionParser
 
+        :param method_loader: if specified, called with no arguments the first
+               time the command is run to load the method to invoke; method is
+               ignored and may be None in this case
+        :type  method_loader: callable
+
         :return: instance representing the newly added command
         :rtype:  Command
         """
-        command = Command(name, description, method, usage_description=usage_description, parser=parser)
+        command = Command(name, description, method, usage_description=usage_description, parser=parser,
+                          method_loader=method_loader)
         self.add_command(command)
         return command
 
-    def create_subsection(self, name, description):
+    def create_subsection(self, name, description, builder=None):
         """
         Creates a new subsection in this section. The given name must be unique
         across all commands and subsections within this section. The section
@@ -664,10 +1451,14 @@ class Section(object):
                subsection
         :type  description: str
 
+        :param builder: if specified, called with the new section the first
+               time its contents are needed to populate it
+        :type  builder: callable
+
         :return: instance representing the newly added section
         :rtype:  Section
         """
-        subsection = Section(name, description)
+        subsection = Section(name, description, builder=builder)
         self.add_subsection(subsection)
         return subsection
 
@@ -681,6 +1472,7 @@ class Section(object):
         :return: section object for the matching subsection if it exists; None otherwise
         :rtype:  Section
         """
+        self.build()
         if name in self.subsections:
             return self.subsections[name]
         else:
@@ -696,6 +1488,7 @@ class Section(object):
         :return: command object for the matching command if it exists; None otherwise
         :rtype:  Command
         """
+        self.build()
         if name in self.commands:
             return self.commands[name]
         else:
@@ -712,7 +1505,11 @@ class Section(object):
         :return: subsection instance if one was removed; None if it didn't exist
         :rtype:  Section
         """
-        return self.subsections.pop(name, None)
+        self.build()
+        subsection = self.subsections.pop(name, None)
+        if subsection is not None:
+            del self._children[name]
+        return subsection
 
     def remove_command(self, name):
         """
@@ -725,7 +1522,29 @@ class Section(object):
         :return: command instance if one was removed; None if it didn't exist
         :rtype:  Command
         """
-        return self.commands.pop(name, None)
+        self.build()
+        command = self.commands.pop(name, None)
+        if command is not None:
+            del self._children[name]
+        return command
+
+    def sorted_subsections(self):
+        """
+        Returns the subsections of this section in the order they are displayed.
+
+        :rtype: list of Section
+        """
+        self.build()
+        return sorted(self.subsections.values(), key=lambda x: x.name)
+
+    def sorted_commands(self):
+        """
+        Returns the commands in this section in the order they are displayed.
+
+        :rtype: list of Command
+        """
+        self.build()
+        return sorted(self.commands.values(), key=lambda x: x.name)
 
     def print_section(self, prompt, indent=0, step=2):
         """
@@ -742,8 +1561,22 @@ class Section(object):
                      into a section
         :type  step: int
         """
-        launch_script = os.path.basename(sys.argv[0])
-        prompt.write(_('Usage: %s [SUB_SECTION, ..] COMMAND') % launch_script)
+        self.build()
+
+        if _structured_output(prompt):
+            def entries(children):
+                return [{'name': c.name, 'description': c.description} for c in children]
+
+            record = {
+                'section': self.name,
+                'description': self.description,
+                'sections': entries(self.sorted_subsections()),
+                'commands': entries(self.sorted_commands()),
+            }
+            prompt.write_record(record, record_type=RECORD_SECTION)
+            return
+
+        prompt.write(_('Usage: %s [SUB_SECTION, ..] COMMAND') % _program_name())
 
         if self.description:
             prompt.write(_('Description: %s') % self.description)
@@ -755,7 +1588,7 @@ class Section(object):
             template = '%s' + '%-' + str(max_width) + 's - %s'
 
             prompt.write(_('Available Sections:'))
-            for subsection in sorted(self.subsections.values(), key=lambda x: x.name):
+            for subsection in self.sorted_subsections():
                 wrapped_description = prompt.wrap(subsection.description, remaining_line_indent=(indent + step + max_width + 3))
                 prompt.write(template % (' ' * (indent + step), subsection.name, wrapped_description), skip_wrap=True)
 
@@ -767,7 +1600,7 @@ class Section(object):
             template = '%s' + '%-' + str(max_width) + 's - %s'
 
             prompt.write(_('Available Commands:'))
-            for command in sorted(self.commands.values(), key=lambda x: x.name):
+            for command in self.sorted_commands():
                 wrapped_description = prompt.wrap(command.description, remaining_line_indent=(indent + step + max_width + 3))
                 prompt.write(template % (' ' * (indent + step), command.name, wrapped_description), skip_wrap=True)
 
@@ -781,14 +1614,50 @@ class Section(object):
 
         :raise InvalidStructure: if there is an entity with the given name
         """
-        # Make sure there isn't already a subsection with the same name
-        if name in self.subsections:
-            raise InvalidStructure()
+        # The builder may add an entity with the same name
+        self.build()
 
-        # Make sure there isn't already a command with the same name
-        if name in self.commands:
+        # Make sure there isn't already a subsection or command with the same name
+        if self._find_child(name) is not None:
             raise InvalidStructure()
 
+    def _find_child(self, name):
+        """
+        Returns the subsection or command with the given name, or None if
+        there is neither. The name index is checked first; children added
+        straight into the subsections or commands dictionaries aren't in it,
+        so those are checked as well.
+        """
+        found = self._children.get(name)
+        if found is None:
+            found = self.commands.get(name)
+        if found is None:
+            found = self.subsections.get(name)
+        return found
+
+
+class Section(_SectionBase):
+    """
+    Represents a division of commands in the CLI. Sections may contain other
+    sections, which creates a string of arguments used to get to a command
+    (think namespaces).
+
+    The subsections and commands in a section should be modified through the
+    add_* and remove_* calls rather than by changing the dictionaries directly,
+    as those calls also maintain the lookup used to resolve a command line
+    to its command. Children added directly to the dictionaries are still
+    found, but those removed directly are only forgotten by remove_*.
+
+    Populating a section may be deferred by specifying a builder. The builder
+    is called with the section as its only argument the first time the CLI
+    needs the section's contents (resolving a command line through it or
+    displaying it), at which point it should add the section's commands and
+    subsections. Adding, removing or finding a child also runs the builder
+    first. Code that reads the subsections or commands dictionaries directly
+    should call build first.
+    """
+    pass
+
 
 class Cli(object):
     """
@@ -798,8 +1667,22 @@ class Cli(object):
     create the desired CLI hierarchy.
     """
 
-    def __init__(self, prompt=None):
+    def __init__(self, prompt=None, timing_sink=None, result_cache=None):
+        """
+        :param prompt: prompt used for all output; a default Prompt is
+               created if one is not specified
+        :type  prompt: Prompt
+
+        :param timing_sink: if specified, each call to run is timed and the
+               timings passed to this sink; see okaara.timing
+
+        :param result_cache: if specified, runs of commands marked cacheable
+               are served from this cache when possible
+        :type  result_cache: okaara.cache.ResultCache
+        """
         self.prompt = prompt or Prompt()
+        self.timing_sink = timing_sink
+        self.result_cache = result_cache
 
         # Hidden, "special" Section that represents the base of the command structure;
         # this simplifies calls into the recursive methods
@@ -828,7 +1711,7 @@ class Cli(object):
         """
         self.root_section.add_command(command)
 
-    def create_section(self, name, description):
+    def create_section(self, name, description, builder=None):
         """
         Creates a new subsection at the root of the CLI. The given name must be
         unique across all commands and subsections within this section. The
@@ -844,22 +1727,27 @@ class Cli(object):
                subsection
         :type  description: str
 
+        :param builder: if specified, called with the new section the first
+               time its contents are needed to populate it
+        :type  builder: callable
+
         :return: instance representing the newly added section
         :rtype:  Section
         """
-        subsection = Section(name, description)
+        subsection = Section(name, description, builder=builder)
         self.add_section(subsection)
         return subsection
 
-    def create_subsection(self, name, description):
+    def create_subsection(self, name, description, builder=None):
         """
         Syntactic sugar method that functions identical to create_section.
 
         :rtype: Section
         """
-        return self.create_section(name, description)
+        return self.create_section(name, description, builder=builder)
 
-    def create_command(self, name, description, method, usage_description=None, parser=None):
+    def create_command(self, name, description, method, usage_description=None, parser=None,
+                       method_loader=None):
         """
         Creates a new command in this section. The given name must be
         unique across all commands and subsections within this section.
@@ -876,8 +1764,10 @@ class Cli(object):
                running this command; displayed to users in the usage output
         :type  description: str
 
-        :param method: method that will be invoked when this command is run
-        :type  method: function
+        :param method: method that will be invoked when this command is run;
+               may also be an import path to the method, in which case it is
+               not imported until the command is run
+        :type  method: function or str
 
         :param usage_description: optional extra text that is only displayed
                when viewing the full usage of this command
@@ -888,10 +1778,16 @@ class Cli(object):
                be handled; the results will be sent to the command's method
         :type  parser: OptionParser
 
+        :param method_loader: if specified, called with no arguments the first
+               time the command is run to load the method to invoke; method is
+               ignored and may be None in this case
+        :type  method_loader: callable
+
         :return: instance representing the newly added command
         :rtype:  Command
         """
-        command = Command(name, description, method, usage_description=usage_description, parser=parser)
+        command = Command(name, description, method, usage_description=usage_description, parser=parser,
+                          method_loader=method_loader)
         self.add_command(command)
         return command
 
@@ -954,31 +1850,87 @@ class Cli(object):
         """
         return self.root_section.remove_command(name)
 
-    def run(self, args):
+    def freeze(self):
+        """
+        Replaces the structure of this CLI with an immutable, more compact copy
+        (see okaara.frozen). This should be called once the CLI is fully
+        assembled, for instance in long running processes that keep a large
+        CLI in memory. Afterwards, attempts to add or remove sections,
+        commands or options raise InvalidStructure and setting an attribute
+        of a frozen node raises AttributeError. Any sections with a builder
+        are built by this call.
+        """
+        from okaara import frozen
+        self.root_section = frozen.freeze_section(self.root_section)
+
+    def run(self, args, context=None):
         """
         Driver for the CLI. The specified arguments will be parsed to determine
         which command to execute, as well as any arguments to that command's
         execution. After assembling the CLI using the add_* calls, this method
         should be run to do the actual work.
 
+        Once assembled, the CLI may be run from several threads at once. Each
+        call should then be given its own context (or at least its own
+        prompt) so the output of concurrent runs is kept apart.
+
+        The prompt is flushed before returning, so buffered output is written
+        even if the command did not flush it.
+
         :param args: defines the command being invoked and any arguments to it
         :type  args: list
 
+        :param context: prompt, program name and environment for this call;
+               if unspecified, output goes to the CLI's prompt
+        :type  context: RunContext
+
         :return: exit code as indicated by the command that is executed,
                  suitable for using as the executable exit code
         :rtype:  int
         """
+        prompt = self.prompt
+        if context is not None and context.prompt is not None:
+            prompt = context.prompt
+
+        token = _CURRENT_CONTEXT.set(context)
+        try:
+            if self.timing_sink is None:
+                return self._run(args, prompt)
+
+            exit_code = None
+            previous_timer = timing.start()
+            try:
+                exit_code = self._run(args, prompt)
+                return exit_code
+            finally:
+                timer = timing.stop(previous_timer)
+                self.timing_sink.record(timer.entry(args, exit_code))
+        finally:
+            _CURRENT_CONTEXT.reset(token)
+
+            # Anything a buffering prompt is still holding belongs to this run
+            prompt.flush()
+
+    def _run(self, args, prompt):
         command_or_section, remaining_args = self._find_closest_match(self.root_section, args)
+        timing.mark(timing.PHASE_RESOLVE)
 
         if command_or_section is None:
-            self.root_section.print_section(self.prompt)
+            self.root_section.print_section(prompt)
+            timing.mark(timing.PHASE_USAGE)
             return os.EX_USAGE
         elif isinstance(command_or_section, Section):
-            command_or_section.print_section(self.prompt)
+            command_or_section.print_section(prompt)
+            timing.mark(timing.PHASE_USAGE)
             return os.EX_USAGE
         else:
             try:
-                exit_code = command_or_section.execute(self.prompt, remaining_args)
+                if self.result_cache is not None and command_or_section.cacheable:
+                    path = args[:len(args) - len(remaining_args)]
+                    exit_code = self.result_cache.execute(command_or_section, path, prompt,
+                                                          remaining_args)
+                else:
+                    exit_code = command_or_section.execute(prompt, remaining_args)
 
                 # Default handling; if no code specified, assume ok
                 if exit_code is None:
@@ -987,11 +1939,181 @@ class Cli(object):
                 return exit_code
             except CommandUsage as e:
                 command_or_section.print_command_usage(
-                    self.prompt, missing_required=e.missing_options,
+                    prompt, missing_required=e.missing_options,
                     unexpected=e.unexpected_options)
+                timing.mark(timing.PHASE_USAGE)
                 return os.EX_USAGE
 
-    def print_cli_map(self, indent=-2, step=2, show_options=False, section_color=None, command_color=None):
+    def run_many(self, command_path, arg_vectors, max_workers=4, use_processes=False):
+        """
+        Runs the command identified by the given path once for each set of
+        arguments, using a pool of threads (or processes). The command is
+        resolved once; see Command.execute_many for how the executions are
+        run and their output captured. Each execution's prompt uses the same
+        color, wrap and output format settings as this CLI's prompt.
+
+        :param command_path: section and command names leading to the command,
+               for instance ['repo', 'sync']
+        :type  command_path: list of str
+
+        :param arg_vectors: iterable of argument lists to pass to the command
+        :type  arg_vectors: iterable
+
+        :param max_workers: number of concurrent executions
+        :type  max_workers: int
+
+        :param use_processes: if true, a process pool is used instead of threads
+        :type  use_processes: bool
+
+        :return: one result per argument set, in input order
+        :rtype:  list of TaskResult
+
+        :raise ValueError: if the path does not identify a command
+        """
+        command, remaining_args = self._find_closest_match(self.root_section, list(command_path))
+        if not isinstance(command, Command) or len(remaining_args) > 0:
+            raise ValueError(_('[%s] does not identify a command') % ' '.join(command_path))
+
+        prompt_kwargs = {
+            'normal_color': self.prompt.normal_color,
+            'enable_color': self.prompt.enable_color,
+            'wrap_width': self.prompt.wrap_width,
+            'output_format': self.prompt.output_format,
+        }
+
+        # The terminal width marker doesn't survive being sent to another process
+        if use_processes and self.prompt.wrap_width is WIDTH_TERMINAL:
+            prompt_kwargs['wrap_width'] = None
+
+        return list(command.execute_many(arg_vectors, max_workers=max_workers,
+                                         use_processes=use_processes, prompt_kwargs=prompt_kwargs))
+
+    def run_async(self, args, context=None):
+        """
+        Coroutine version of run for use within a running asyncio event loop.
+        Commands whose methods are coroutine functions are awaited on that
+        loop; the command resolution, validation and usage handling, the
+        context, timing and result cache are the same as for run. Requires
+        Python 3.7 or newer.
+
+        :param args: defines the command being invoked and any arguments to it
+        :type  args: list
+
+        :param context: prompt, program name and environment for this call;
+               see run
+        :type  context: RunContext
+
+        :return: coroutine that returns the exit code of the command
+        """
+        from okaara import _aio
+        return _aio.run_cli(self, args, context=context)
+
+    def run_batch(self, stream, stop_on_error=False, context=None):
+        """
+        Runs each command line read from the given stream (for instance, an
+        open file or sys.stdin) as if it were passed to run, all within this
+        process. Each line is split into arguments using shell quoting rules.
+        Blank lines and lines starting with # are skipped.
+
+        A line that cannot be split (such as one with an unclosed quote) is
+        reported to the prompt and given the EX_USAGE exit code. A line whose
+        command exits with SystemExit is given that exit code, and one that
+        raises any other exception is reported to the prompt and given the
+        EX_SOFTWARE exit code; either way the remaining lines are still run
+        unless stop_on_error is set.
+
+        :param stream: iterable of command lines
+        :type  stream: file
+
+        :param stop_on_error: if true, no further lines are run after the
+               first line that exits with a code other than EX_OK
+        :type  stop_on_error: bool
+
+        :param context: passed to run for each line
+        :type  context: RunContext
+
+        :return: list of tuples of line number (starting at 1) and the exit
+                 code for each line that was run
+        :rtype:  list of (int, int)
+        """
+        import shlex
+
+        prompt = self.prompt
+        if context is not None and context.prompt is not None:
+            prompt = context.prompt
+
+        results = []
+
+        line_number = 0
+        for line in stream:
+            line_number += 1
+
+            line = line.strip()
+            if line == '' or line.startswith('#'):
+                continue
+
+            try:
+                args = shlex.split(line)
+            except ValueError as e:
+                prompt.write(_('Line %(n)s could not be parsed: %(e)s') % {'n': line_number, 'e': e})
+                exit_code = os.EX_USAGE
+            else:
+                exit_code = self._run_batch_line(prompt, line_number, args, context)
+
+            results.append((line_number, exit_code))
+
+            if stop_on_error and exit_code != os.EX_OK:
+                break
+
+        return results
+
+    def _run_batch_line(self, prompt, line_number, args, context):
+        try:
+            return self.run(args, context=context)
+        except SystemExit as e:
+            if e.code is None:
+                return os.EX_OK
+            if isinstance(e.code, int):
+                return e.code
+            return os.EX_SOFTWARE
+        except Exception as e:
+            prompt.write(_('Line %(n)s failed: %(e)s') % {'n': line_number, 'e': e})
+            return os.EX_SOFTWARE
+
+    def complete(self, words):
+        """
+        Returns the shell completion candidates for a partial command line:
+        section and command names, option names and aliases, or the choices
+        for an option's value depending on the position. No command methods
+        are loaded to calculate this. See okaara.completion for answering
+        completions from a saved index without assembling the CLI.
+
+        :param words: command line after the program name; the last entry is
+               the word being completed and may be an empty string
+        :type  words: list of str
+
+        :return: sorted list of candidates
+        :rtype:  list of str
+        """
+        from okaara import completion
+
+        if len(words) == 0:
+            words = ['']
+
+        prefix = words[-1]
+        found, remaining_args = self._find_closest_match(self.root_section, words[:-1])
+
+        if isinstance(found, Command):
+            return completion.complete_options(completion.command_entry(found), remaining_args, prefix)
+
+        if len(remaining_args) > 0:
+            return []
+
+        found.build()
+        return completion.complete_names(list(found.subsections) + list(found.commands), prefix)
+
+    def print_cli_map(self, indent=-2, step=2, show_options=False, section_color=None, command_color=None,
+                      prompt=None):
         """
         Prints the structure of the CLI in a tree-like structure to indicate
         section ownership.
@@ -1014,52 +2136,66 @@ class Cli(object):
         :param command_color: if specified, command names will be highlighted
                               with this color
         :type  command_color: str
+
+        :param prompt: prompt to write the map to; defaults to the prompt of
+               the command being run (see current_prompt), then the prompt
+               of the current run's context, then the CLI's prompt
+        :type  prompt: Prompt
         """
-        self._recursive_print_cli_map(self.root_section, indent=indent, step=step, show_options=show_options,
-                                      section_color=section_color, command_color=command_color)
+        if prompt is None:
+            prompt = current_prompt()
+        if prompt is None:
+            context = current_context()
+            if context is not None:
+                prompt = context.prompt
+        if prompt is None:
+            prompt = self.prompt
+
+        self._recursive_print_cli_map(prompt, self.root_section, indent=indent, step=step,
+                                      show_options=show_options, section_color=section_color,
+                                      command_color=command_color)
 
-    def _recursive_print_cli_map(self, base_section, indent=-2, step=2, show_options=False,
+    def _recursive_print_cli_map(self, prompt, base_section, indent=-2, step=2, show_options=False,
                                  section_color=None, command_color=None):
         """
         Prints the contents of a section and all of its children (subsections
         and commands).
         """
+        base_section.build()
+
         # Need a way to not print the root section of the CLI, which doesn't
         # represent an actual user section, so a ghetto check is to make sure
         # the name isn't blank
         if base_section.name != '':
-            wrapped_description = self.prompt.wrap(base_section.description, remaining_line_indent=(len(base_section.name) + 2 + indent))
-            highlighted_name = self.prompt.color(base_section.name, section_color)
-            self.prompt.write('%s%s: %s' % (' ' * indent, highlighted_name, wrapped_description), skip_wrap=True)
+            wrapped_description = prompt.wrap(base_section.description, remaining_line_indent=(_text.display_width(base_section.name) + 2 + indent))
+            highlighted_name = prompt.color(base_section.name, section_color)
+            prompt.write('%s%s: %s' % (' ' * indent, highlighted_name, wrapped_description), skip_wrap=True)
 
         if len(base_section.commands) > 0:
-            max_width = reduce(lambda x, y: max(x, len(y)), base_section.commands, 0) + 1 # +1 for the : later
-
-            if section_color is not None:
-                max_width += len(section_color)
-                max_width += len(self.prompt.normal_color)
-
-            template = '%s%-' + str(max_width) + 's %s'
+            # Padded by display width so the descriptions line up whether or
+            # not the names are colored
+            max_width = reduce(lambda x, y: max(x, _text.display_width(y)), base_section.commands, 0)
 
-            for command in sorted(base_section.commands.values()):
-                highlighted_name = self.prompt.color(command.name, command_color)
-                self.prompt.write(template % (' ' * (indent + step), highlighted_name + ':', command.description))
+            for command in base_section.sorted_commands():
+                highlighted_name = prompt.color(command.name, command_color)
+                padding = ' ' * (max_width - _text.display_width(command.name))
+                prompt.write('%s%s:%s %s' % (' ' * (indent + step), highlighted_name, padding, command.description))
 
                 if show_options and len(command.options) > 0:
                     for o in command.options:
-                        highlighted_name = self.prompt.color(o.name, command_color)
-                        self.prompt.write('%s%s: %s' % (' ' * (indent + (step * 2)), highlighted_name, o.description))
+                        highlighted_name = prompt.color(o.name, command_color)
+                        prompt.write('%s%s: %s' % (' ' * (indent + (step * 2)), highlighted_name, o.description))
 
         if len(base_section.subsections) > 0:
-            for subsection in sorted(base_section.subsections.values()):
-                self._recursive_print_cli_map(subsection, indent=(indent + step), step=step,
+            for subsection in base_section.sorted_subsections():
+                self._recursive_print_cli_map(prompt, subsection, indent=(indent + step), step=step,
                                               section_color=section_color, command_color=command_color)
 
         # Only put a blank line between highest level sections. This may not be
         # perfect for deep nesting of sections, but I think in most cases this
         # makes sense
         if indent <= 0:
-            self.prompt.write('')
+            prompt.write('')
 
     def _find_closest_match(self, base_section, args):
         """
@@ -1095,32 +2231,35 @@ class Cli(object):
         :rtype:  Command, list or Section, list
         """
 
-        # If we've recursed so much that we ran out of arguments, we haven't
-        # found a command yet, so we return the deepest section we found
-        if len(args) is 0:
-            return base_section, args[1:]
+        # Walk down the tree one argument at a time rather than recursing, which
+        # avoids a stack frame and a copy of the remaining arguments per level
+        section = base_section
+        index = 0
+        arg_count = len(args)
 
-        find_me = args[0]
+        while index < arg_count:
+            section.build()
+            found = section._find_child(args[index])
 
-        # See if the argument represents a command and return that
-        command = base_section.find_command(find_me)
-        if command is not None:
-            return command, args[1:]
+            # If we didn't find a matching command or subsection, return where
+            # we are as the closest match (including the bad one in the args)
+            if found is None:
+                return section, args[index:]
 
-        # Find the subsection
-        subsection = base_section.find_subsection(find_me)
-        if subsection is not None:
+            # If the argument represents a command, we're done
+            if isinstance(found, Command):
+                return found, args[index + 1:]
 
-            # Don't recurse if we're at a section and the next argument is an option
-            if len(args) > 1 and args[1].startswith('-'):
-                return subsection, args[1:]
+            # Don't descend if we're at a section and the next argument is an option
+            if index + 1 < arg_count and args[index + 1].startswith('-'):
+                return found, args[index + 1:]
 
-            found_in_subsection, sub_args = self._find_closest_match(subsection, args[1:])
-            return found_in_subsection, sub_args
+            section = found
+            index += 1
 
-        # If we got this far, we didn't find a matching command or subsection,
-        # so return where we are as the closest match
-        return base_section, args # even include the bad one in the args
+        # If we ran out of arguments, we haven't found a command yet, so we
+        # return the deepest section we found
+        return section, []
 
 # -- arg parsers --------------------------------------------------------------
 
@@ -1172,15 +2311,18 @@ class UnknownArgsParser(object):
         The keys will be the name of the argument with any leading hyphens removed.
         The value will be one of three possibilties:
 
-        * The string representation of the value immediately following it (common case)
+        * The string representation of the value immediately following it (common
+          case) or following an equals sign in the same argument (--name=value)
         * The boolean True if no value or another argument definition follows it
         * A list of strings if the argument is specified more than once
 
         The argument/value pairs are returned as a dictionary. In the event an empty
         list of arguments is supplied, an empty dictionary is returned.
 
-        @param args: tuple of arguments passed to the command
-        @type  args: tuple
+        The arguments are read once, in order, so any iterable may be given.
+
+        @param args: arguments passed to the command
+        @type  args: iterable
 
         @return: dictionary of argument name to value(s); see above for details
         @rtype:  dict
@@ -1193,17 +2335,42 @@ class UnknownArgsParser(object):
             else:
                 return None
 
+        def add_value(name, value):
+            # If the argument already has a value, convert the value to a list and
+            # add in the new one (preserving order).
+            if name in parsed:
+                if isinstance(parsed[name], list):
+                    parsed[name].append(value)
+                else:
+                    parsed[name] = [parsed[name], value]
+            else:
+                parsed[name] = value
+
         parsed = {}
-        required_names = [r[0] for r in self.required_options]
+        missing_required = set([r[0] for r in self.required_options])
+
+        # Name of the previous argument if it may be waiting for a value; whether
+        # it is a flag isn't known until the next item is read
+        pending = None
 
-        index = 0 # this won't necessarily step by 1 each time, so don't use something like enumerate
-        while index < len(args):
-            item = args[index]
+        for item in args:
+            if pending is not None:
+                if not item.startswith('-'):
+                    add_value(pending, item)
+                    pending = None
+                    continue
+
+                # If the next value is another argument, the previous is a flag.
+                parsed[pending] = True
+                pending = None
+
+            value = None
+            if item.startswith('-') and '=' in item:
+                item, value = item.split('=', 1)
 
             # The required names use the option name directly (with the hyphens)
             # so do the check here
-            if item in required_names:
-                required_names.remove(item)
+            missing_required.discard(item)
 
             name = arg_name(item)
 
@@ -1211,45 +2378,28 @@ class UnknownArgsParser(object):
                 self.usage()
                 self.abort(exception_class=self.Unparsable)
 
-            # If we're at the end there is nothing after it, it's also a flag.
-            if (index + 1) == len(args):
-                parsed[name] = True
-                index += 1
-                continue
-
-            # If the next value is another argument, the current is a flag.
-            if args[index + 1].startswith('-'):
-                parsed[name] = True
-                index += 1
-                continue
-
-            # If we're here, the next in the list is the value for the argument.
-            value = args[index + 1]
-
-            # If the argument already has a value, convert the value to a list and
-            # add in the new one (preserving order).
-            if name in parsed:
-                if not isinstance(parsed[name], list):
-                    parsed[name] = [parsed[name]]
-                parsed[name].append(value)
+            if value is not None:
+                add_value(name, value)
             else:
-                parsed[name] = value
+                pending = name
 
-            index += 2 # to take into account the value we read
+        # If we're at the end there is nothing after it, it's also a flag.
+        if pending is not None:
+            parsed[pending] = True
 
-        # If all of the required options haven't been removed yet, we're
-        # missing at least one.
-        if len(required_names) > 0:
+        # If all of the required options haven't been seen, we're missing at
+        # least one.
+        if len(missing_required) > 0:
             self.usage()
             self.abort(exception_class=self.MissingRequired)
 
         # The CLI is expecting the return result of OptionParser, which wraps
         # the dict in Values, so we do that here.
+        from optparse import Values
         return Values(parsed), []
 
     def usage(self):
-        launch_script = os.path.basename(sys.argv[0])
-        self.prompt.write(_('Usage: %s %s [OPTION, ..]') % (launch_script, self.path))
+        self.prompt.write(_('Usage: %s %s [OPTION, ..]') % (_program_name(), self.path))
         self.prompt.write('')
 
         m = _('Valid options follow one of the following formats:')
@@ -1308,5 +2458,10 @@ class PassThroughParser(object):
         return args, {}
 
     def usage(self):
-        launch_script = os.path.basename(sys.argv[0])
-        self.prompt.write(_('Usage: %s %s [OPTION, ..]') % (launch_script, self.path))
+        self.prompt.write(_('Usage: %s %s [OPTION, ..]') % (_program_name(), self.path))
+
+
+if sys.version_info < (3, 7):
+    # Modules cannot define __getattr__ before 3.7, so load these up front
+    from optparse import OptionParser, Values, BadOptionError
+    from ._optparse import NoCatchErrorParser
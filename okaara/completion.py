@@ -0,0 +1,257 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Shell tab-completion for CLIs built with okaara.cli.
+
+Cli.complete answers completion requests against a live CLI. For a fast
+response from a shell hook, the CLI structure can instead be written to a
+completion index with save_index (for instance, whenever the CLI is
+installed or its extensions change). Completing from the index only needs
+this module and the index file; the CLI is not assembled and no extensions
+or command modules are imported::
+
+    python -m okaara.completion INDEX_FILE [WORD ...]
+
+The words are everything on the command line after the program name, the
+last one being the (possibly empty) word being completed. Candidates are
+printed one per line. A bash hook looks like::
+
+    _my_cli() {
+        COMPREPLY=( $(python -m okaara.completion /path/to/index "${COMP_WORDS[@]:1:COMP_CWORD}") )
+    }
+    complete -F _my_cli my-cli
+"""
+
+import json
+import sys
+
+# -- constants ----------------------------------------------------------------
+
+# Incremented whenever the index format changes
+INDEX_VERSION = 1
+
+# -- public -------------------------------------------------------------------
+
+def build_index(cli):
+    """
+    Creates the completion index for the given CLI. Any sections with a
+    builder are built so the index covers the full structure.
+
+    :param cli: CLI to index
+    :type  cli: okaara.cli.Cli
+
+    :return: JSON-serializable index
+    :rtype:  dict
+    """
+    return {'version': INDEX_VERSION, 'root': _section_entry(cli.root_section)}
+
+
+def save_index(cli, filename):
+    """
+    Writes the completion index for the given CLI to a file.
+
+    :type  cli: okaara.cli.Cli
+    :type  filename: str
+    """
+    f = open(filename, 'w')
+    try:
+        json.dump(build_index(cli), f, separators=(',', ':'))
+    finally:
+        f.close()
+
+
+def load_index(filename):
+    """
+    Reads an index written by save_index.
+
+    :return: index; None if the file cannot be read or is of another version
+    :rtype:  dict or None
+    """
+    try:
+        f = open(filename, 'r')
+        try:
+            index = json.load(f)
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        return None
+
+    if index.get('version') != INDEX_VERSION:
+        return None
+
+    return index
+
+
+def complete(index, words):
+    """
+    Returns the completion candidates for a partial command line.
+
+    :param index: index created by build_index or read by load_index
+    :type  index: dict
+
+    :param words: command line after the program name; the last entry is the
+           word being completed and may be an empty string
+    :type  words: list of str
+
+    :return: sorted list of candidates
+    :rtype:  list of str
+    """
+    if len(words) == 0:
+        words = ['']
+
+    prefix = words[-1]
+    node = index['root']
+
+    # Mirror Cli._find_closest_match, descending while the words name sections
+    position = 0
+    path = words[:-1]
+    while position < len(path):
+        word = path[position]
+        if word in node['commands']:
+            return complete_options(node['commands'][word], path[position + 1:], prefix)
+        if word not in node['sections'] or (position + 1 < len(path) and path[position + 1].startswith('-')):
+            return []
+        node = node['sections'][word]
+        position += 1
+
+    return complete_names(list(node['sections']) + list(node['commands']), prefix)
+
+
+def complete_names(names, prefix):
+    """
+    Returns the sorted section/command names starting with the given prefix.
+    """
+    if prefix.startswith('-'):
+        return []
+    return sorted([n for n in names if n.startswith(prefix)])
+
+
+def complete_options(command_entry, args, prefix):
+    """
+    Returns candidates for the word being completed after a command.
+
+    :param command_entry: command description as created by command_entry
+    :type  command_entry: dict
+
+    :param args: words between the command and the word being completed
+    :type  args: list of str
+
+    :param prefix: word being completed
+    :type  prefix: str
+
+    :rtype: list of str
+    """
+    by_trigger = {}
+    for option in command_entry['options']:
+        for trigger in option['triggers']:
+            by_trigger[trigger] = option
+
+    # Determine which options are already used and if the previous word is an
+    # option waiting for its value
+    used = set()
+    expecting = None
+    for arg in args:
+        if expecting is not None:
+            expecting = None
+            continue
+
+        option = by_trigger.get(arg.split('=', 1)[0])
+        if option is None:
+            continue
+
+        used.add(id(option))
+        if option['takes_value'] and '=' not in arg:
+            expecting = option
+
+    if expecting is not None:
+        return sorted([c for c in expecting['choices'] or [] if c.startswith(prefix)])
+
+    # Value given in the same word as the option
+    if prefix.startswith('-') and '=' in prefix:
+        trigger, value_prefix = prefix.split('=', 1)
+        option = by_trigger.get(trigger)
+        if option is None or not option['takes_value']:
+            return []
+        return sorted(['%s=%s' % (trigger, c) for c in option['choices'] or []
+                       if c.startswith(value_prefix)])
+
+    if prefix != '' and not prefix.startswith('-'):
+        return []
+
+    candidates = []
+    for option in command_entry['options']:
+        if id(option) in used and not option['multiple']:
+            continue
+        candidates += [t for t in option['triggers'] if t.startswith(prefix)]
+
+    return sorted(candidates)
+
+
+def command_entry(command):
+    """
+    Describes a command's options for completion.
+
+    :type  command: okaara.cli.Command
+    :rtype: dict
+    """
+    from okaara.cli import Flag
+
+    options = []
+    for o in command.all_options():
+        options.append({
+            'triggers': [o.name] + list(o.aliases or []),
+            'takes_value': not isinstance(o, Flag),
+            'multiple': bool(o.allow_multiple),
+            'choices': o.choices,
+        })
+
+    return {'options': options}
+
+
+def main(argv=None):
+    """
+    Prints the candidates for the command line in argv, read as the index
+    filename followed by the words to complete. Returns the exit code.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if len(argv) < 1:
+        sys.stderr.write('Usage: python -m okaara.completion INDEX_FILE [WORD ...]\n')
+        return 2
+
+    index = load_index(argv[0])
+    if index is None:
+        return 1
+
+    for candidate in complete(index, argv[1:]):
+        sys.stdout.write(candidate + '\n')
+
+    return 0
+
+# -- private ------------------------------------------------------------------
+
+def _section_entry(section):
+    section.build()
+
+    return {
+        'sections': dict([(name, _section_entry(s)) for name, s in section.subsections.items()]),
+        'commands': dict([(name, command_entry(c)) for name, c in section.commands.items()]),
+    }
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,462 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Keeps an assembled CLI resident in a server process and runs commands sent
+to it over a local Unix domain socket. This removes interpreter startup and
+CLI assembly from each invocation. The server is started by the program that
+builds the CLI::
+
+    server = CliServer(cli, '/run/user/1000/my-cli.sock')
+    server.serve_forever()
+
+Invocations are then forwarded by a thin client, either from python through
+run_client or from the command line::
+
+    python -m okaara.daemon /run/user/1000/my-cli.sock [ARG ...]
+
+Each command runs with a prompt whose input and output are the client's, so
+prompting the user (including for passwords) works as it does when running
+the CLI directly. The prompt is passed to the run in its context (see
+okaara.cli.current_prompt), and while a command is running, input and output
+through the CLI's own prompt are also forwarded to that command's client.
+The run's context also carries the client's environment, working directory
+and program name. Commands are run one at a time. Anyone able to connect to
+the socket can run commands as the server's user, so it should be created in
+a directory only the intended user can access.
+
+The client side only needs this module; it does not import the rest of
+okaara.
+"""
+
+import json
+import logging
+import os
+import socket
+import struct
+import sys
+
+try:
+    import socketserver
+except ImportError:
+    import SocketServer as socketserver
+
+# -- constants ----------------------------------------------------------------
+
+LOG = logging.getLogger(__name__)
+
+# Each message is a single byte type, a four byte payload length and the UTF-8
+# encoded payload
+_HEADER = struct.Struct('!cI')
+
+# Client to server
+FRAME_ARGS = b'a'       # JSON encoded arguments, environment, working directory and
+                        # program name; sent once to start a command
+FRAME_INPUT = b'i'      # line of input in response to FRAME_READ
+FRAME_EOF = b'e'        # end of input in response to FRAME_READ
+
+# Server to client
+FRAME_OUTPUT = b'o'     # text to write to the client's output
+FRAME_READ = b'r'       # request for the client to send a line of input
+FRAME_READ_PASSWORD = b'p'  # as FRAME_READ without echoing the input; payload is the question
+FRAME_EXIT = b'x'       # exit code of the command; last message for the command
+
+# -- exceptions ---------------------------------------------------------------
+
+class ConnectionClosed(Exception):
+    """
+    Raised when the other end of the socket disconnects mid-conversation.
+    """
+    pass
+
+# -- server -------------------------------------------------------------------
+
+class CliServer(object):
+    """
+    Serves a single CLI instance over a Unix domain socket.
+    """
+
+    def __init__(self, cli, socket_path, prompt_kwargs=None):
+        """
+        :param cli: fully assembled CLI to run commands against
+        :type  cli: okaara.cli.Cli
+
+        :param socket_path: location of the socket to create
+        :type  socket_path: str
+
+        :param prompt_kwargs: extra arguments passed to the Prompt created for
+               each command (for instance, enable_color or wrap_width)
+        :type  prompt_kwargs: dict
+        """
+        from okaara import _local
+
+        self.cli = cli
+        self.socket_path = socket_path
+        self.prompt_kwargs = prompt_kwargs or {}
+
+        # Input and output streams of the client whose command is running in
+        # this thread
+        self._client_streams = _local.context_local('okaara_daemon_client')
+
+        _remove_stale_socket(socket_path)
+
+        server = self
+
+        class Handler(socketserver.BaseRequestHandler):
+            def handle(self):
+                server.handle_connection(self.request)
+
+        self._server = socketserver.UnixStreamServer(socket_path, Handler)
+
+    def serve_forever(self, poll_interval=0.5):
+        """
+        Handles connections until shutdown is called from another thread.
+
+        :param poll_interval: seconds between checks for a shutdown request
+        :type  poll_interval: float
+        """
+        self._server.serve_forever(poll_interval=poll_interval)
+
+    def handle_request(self):
+        """
+        Waits for and handles a single connection.
+        """
+        self._server.handle_request()
+
+    def shutdown(self):
+        """
+        Stops serve_forever; must be called from a different thread.
+        """
+        self._server.shutdown()
+
+    def close(self):
+        """
+        Closes the listening socket and removes the socket file.
+        """
+        self._server.server_close()
+        try:
+            os.remove(self.socket_path)
+        except OSError:
+            pass
+
+        for name in ('input', 'output'):
+            stream = getattr(self.cli.prompt, name)
+            if isinstance(stream, _ClientStream):
+                setattr(self.cli.prompt, name, stream.stream)
+
+    def handle_connection(self, sock):
+        """
+        Runs the command requested over the given connected socket.
+        """
+        connection = _Connection(sock)
+
+        try:
+            frame_type, payload = connection.read_frame()
+        except ConnectionClosed:
+            return
+
+        if frame_type != FRAME_ARGS:
+            LOG.warning('Unexpected message type [%r] at the start of a connection' % frame_type)
+            return
+
+        request = json.loads(payload)
+        if isinstance(request, list):
+            # Clients before the environment was sent only sent the arguments
+            request = {'args': request}
+
+        args = request['args']
+        try:
+            exit_code = self.run(args, _RemoteInput(connection), _RemoteOutput(connection),
+                                 program_name=request.get('program_name'),
+                                 environ=request.get('environ'), cwd=request.get('cwd'))
+        except ConnectionClosed:
+            LOG.info('Client disconnected while running [%s]' % ' '.join(args))
+            return
+
+        try:
+            connection.write_frame(FRAME_EXIT, str(exit_code))
+        except socket.error:
+            LOG.info('Client disconnected before the exit code of [%s] was sent' % ' '.join(args))
+
+    def run(self, args, input, output, program_name=None, environ=None, cwd=None):
+        """
+        Runs the CLI with the given arguments, bound to the given streams.
+
+        :param program_name: name the client was invoked as, shown in usage
+        :type  program_name: str
+
+        :param environ: client's environment variables; defaults to the
+               server's
+        :type  environ: dict
+
+        :param cwd: client's working directory, against which relative
+               @filename values are read
+        :type  cwd: str
+
+        :return: exit code of the command
+        :rtype:  int
+        """
+        from okaara.cli import RunContext
+        from okaara.prompt import Prompt
+
+        prompt = Prompt(input=input, output=output, **self.prompt_kwargs)
+        context = RunContext(prompt=prompt, program_name=program_name, environ=environ, cwd=cwd)
+
+        # Commands holding the CLI's prompt reach the client through it too
+        cli_prompt = self.cli.prompt
+        if not isinstance(cli_prompt.input, _ClientStream):
+            cli_prompt.input = _ClientStream(cli_prompt.input, self._client_streams, 0)
+        if not isinstance(cli_prompt.output, _ClientStream):
+            cli_prompt.output = _ClientStream(cli_prompt.output, self._client_streams, 1)
+
+        token = self._client_streams.set((input, output))
+        try:
+            return self.cli.run(args, context=context)
+        except ConnectionClosed:
+            raise
+        except SystemExit as e:
+            if isinstance(e.code, int):
+                return e.code
+            return os.EX_SOFTWARE
+        except Exception:
+            LOG.exception('Exception running [%s]' % ' '.join(args))
+            return os.EX_SOFTWARE
+        finally:
+            try:
+                # Output the command left buffered in the CLI's prompt is the
+                # client's
+                cli_prompt.flush()
+            except Exception:
+                LOG.exception('Could not write the output of [%s]' % ' '.join(args))
+            self._client_streams.reset(token)
+
+# -- client -------------------------------------------------------------------
+
+def run_client(socket_path, args, input=None, output=None, program_name=None):
+    """
+    Runs a command on the server listening at the given socket, forwarding
+    input and output between the server and the given streams.
+
+    :param socket_path: socket the server is listening on
+    :type  socket_path: str
+
+    :param args: arguments to run, as would be passed to Cli.run
+    :type  args: list of str
+
+    :param input: stream to read input from when the command prompts; defaults
+           to stdin. Passwords are read through getpass when this is a
+           terminal.
+    :param output: stream to write the command's output to; defaults to stdout
+
+    :param program_name: name shown in the command's usage text; defaults to
+           sys.argv[0]
+    :type  program_name: str
+
+    :return: exit code of the command
+    :rtype:  int
+    """
+    input = input or sys.stdin
+    output = output or sys.stdout
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+        connection = _Connection(sock)
+        request = {
+            'args': list(args),
+            'program_name': program_name or sys.argv[0],
+            'environ': dict(os.environ),
+            'cwd': os.getcwd(),
+        }
+        connection.write_frame(FRAME_ARGS, json.dumps(request))
+
+        while True:
+            frame_type, payload = connection.read_frame()
+
+            if frame_type == FRAME_OUTPUT:
+                output.write(payload)
+                if hasattr(output, 'flush'):
+                    output.flush()
+            elif frame_type == FRAME_READ:
+                line = input.readline()
+                if line:
+                    connection.write_frame(FRAME_INPUT, line)
+                else:
+                    connection.write_frame(FRAME_EOF, '')
+            elif frame_type == FRAME_READ_PASSWORD:
+                password = _read_password(payload, input, output)
+                if password is None:
+                    connection.write_frame(FRAME_EOF, '')
+                else:
+                    connection.write_frame(FRAME_INPUT, password)
+            elif frame_type == FRAME_EXIT:
+                return int(payload)
+    finally:
+        sock.close()
+
+
+def main(argv=None):
+    """
+    Command line client; the first argument is the socket and the rest are
+    the arguments to run.
+    """
+    if argv is None:
+        argv = sys.argv[1:]
+
+    if len(argv) < 1:
+        sys.stderr.write('Usage: python -m okaara.daemon SOCKET [ARG ...]\n')
+        return os.EX_USAGE
+
+    try:
+        return run_client(argv[0], argv[1:])
+    except (socket.error, ConnectionClosed) as e:
+        sys.stderr.write('Could not communicate with the server at %s: %s\n' % (argv[0], e))
+        return os.EX_UNAVAILABLE
+
+# -- private ------------------------------------------------------------------
+
+class _Connection(object):
+    """
+    Reads and writes framed messages over a connected socket.
+    """
+
+    def __init__(self, sock):
+        self.sock = sock
+
+    def write_frame(self, frame_type, payload):
+        data = payload.encode('utf-8')
+        self.sock.sendall(_HEADER.pack(frame_type, len(data)) + data)
+
+    def read_frame(self):
+        frame_type, length = _HEADER.unpack(self._read_exactly(_HEADER.size))
+        payload = self._read_exactly(length).decode('utf-8')
+        return frame_type, payload
+
+    def _read_exactly(self, count):
+        chunks = []
+        while count > 0:
+            chunk = self.sock.recv(count)
+            if not chunk:
+                raise ConnectionClosed()
+            chunks.append(chunk)
+            count -= len(chunk)
+        return b''.join(chunks)
+
+
+class _RemoteOutput(object):
+    """
+    Output stream for the server-side prompt that forwards to the client.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def write(self, text):
+        if text:
+            self.connection.write_frame(FRAME_OUTPUT, text)
+
+    def flush(self):
+        pass
+
+
+class _RemoteInput(object):
+    """
+    Input stream for the server-side prompt that requests lines from the client.
+    """
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def readline(self, size=None):
+        self.connection.write_frame(FRAME_READ, '')
+        frame_type, payload = self.connection.read_frame()
+        if frame_type == FRAME_EOF:
+            return ''
+        return payload
+
+    def read_password(self, question):
+        self.connection.write_frame(FRAME_READ_PASSWORD, question)
+        frame_type, payload = self.connection.read_frame()
+        if frame_type == FRAME_EOF:
+            return ''
+        return payload
+
+
+class _ClientStream(object):
+    """
+    Stands in for the input or output stream of the CLI's own prompt,
+    forwarding to the client whose command is running in the current thread
+    and to the original stream otherwise.
+    """
+
+    def __init__(self, stream, client_streams, index):
+        self.stream = stream
+        self.client_streams = client_streams
+
+        # Position of this stream in the client's (input, output) pair
+        self.index = index
+
+    def __getattr__(self, name):
+        client = self.client_streams.get()
+        if client is None:
+            return getattr(self.stream, name)
+        return getattr(client[self.index], name)
+
+
+def _read_password(question, input, output):
+    """
+    Reads a password on the client side, without echoing it when the input is
+    a terminal.
+
+    :return: entered password without the trailing newline; None at the end
+             of the input
+    :rtype:  str or None
+    """
+    isatty = getattr(input, 'isatty', None)
+    if isatty is not None and isatty():
+        import getpass
+        try:
+            return getpass.getpass(question, stream=output)
+        except EOFError:
+            return None
+
+    output.write(question)
+    if hasattr(output, 'flush'):
+        output.flush()
+    line = input.readline()
+    if not line:
+        return None
+    return line.rstrip('\r\n')
+
+
+def _remove_stale_socket(socket_path):
+    """
+    Removes a socket file left behind by a server that is no longer running.
+    A socket with a live server is left in place so binding fails.
+    """
+    if not os.path.exists(socket_path):
+        return
+
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(socket_path)
+    except socket.error:
+        os.remove(socket_path)
+    finally:
+        probe.close()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
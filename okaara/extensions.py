@@ -14,7 +14,8 @@
 # If not, see <http://www.gnu.org/licenses/>.
 from builtins import object
 
-from gettext import gettext as _
+from okaara._i18n import _
+import hashlib
 import logging
 import os
 import sys
@@ -82,6 +83,28 @@ class ExtensionsManager(object):
         if len(error_descriptors) > 0:
             raise LoadFailed(error_descriptors)
 
+    def fingerprint(self):
+        """
+        Returns a value that changes whenever the extensions that would be found
+        by the loaders change. This can be used to determine if something
+        built from the loaded extensions (such as a saved CLI snapshot) is
+        still valid without loading the extensions. Extensions are not
+        imported to calculate it.
+
+        :return: fingerprint of all loaders; None if any loader cannot
+                 calculate one
+        :rtype:  str or None
+        """
+        loader_fingerprints = []
+        for loader in self.extension_loaders:
+            f = loader.fingerprint()
+            if f is None:
+                return None
+            loader_fingerprints.append(f)
+
+        digest = hashlib.sha1('\n'.join(loader_fingerprints).encode('utf-8'))
+        return digest.hexdigest()
+
     def _initialize_extension(self, descriptor):
         descriptor.init_method(*self.init_arg_list, **self.init_kwargs_list)
 
@@ -110,6 +133,16 @@ class BaseExtensionsLoader(object):
     def find_extension_descriptors(self):
         raise NotImplementedError()
 
+    def fingerprint(self):
+        """
+        Returns a string describing the current state of the extensions this
+        loader would find, without loading them. Loaders that cannot determine
+        this return None.
+
+        :rtype: str or None
+        """
+        return None
+
 
 class DirectoryExtensionsLoader(BaseExtensionsLoader):
 
@@ -176,6 +209,28 @@ class DirectoryExtensionsLoader(BaseExtensionsLoader):
         descriptor = ExtensionDescriptor(extension_package_name, init_func, priority)
         return descriptor
 
+    def fingerprint(self):
+        """
+        Describes the extensions directory by the modification times of the
+        directory, each extension package and its init module.
+        """
+        def mtime(path):
+            try:
+                return repr(os.stat(path).st_mtime)
+            except OSError:
+                return '-'
+
+        entries = ['dir:%s:%s' % (self.extensions_dir, mtime(self.extensions_dir))]
+        for name in sorted(os.listdir(self.extensions_dir)):
+            if name.startswith('.'):
+                continue
+
+            package_dir = os.path.join(self.extensions_dir, name)
+            init_filename = os.path.join(package_dir, self.init_module_name + '.py')
+            entries.append('ext:%s:%s:%s' % (name, mtime(package_dir), mtime(init_filename)))
+
+        return '\n'.join(entries)
+
 
 class EntryPointLoader(BaseExtensionsLoader):
 
@@ -193,6 +248,23 @@ class EntryPointLoader(BaseExtensionsLoader):
 
         return descriptors
 
+    def fingerprint(self):
+        """
+        Describes the entry points by name, target and the version of the
+        distribution providing each.
+        """
+        entries = []
+        for entry_point in pkg_resources.iter_entry_points(self.entry_point_name):
+            dist = entry_point.dist
+            if dist is not None:
+                dist_description = '%s-%s' % (dist.project_name, dist.version)
+            else:
+                dist_description = '-'
+            entries.append('ep:%s:%s' % (dist_description, entry_point))
+
+        entries.sort()
+        return '\n'.join(entries)
+
 # -- exceptions ---------------------------------------------------------------
 
 class ExtensionLoaderException(Exception):
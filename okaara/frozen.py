@@ -0,0 +1,290 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Immutable versions of the CLI structure classes, created by Cli.freeze once a
+CLI has been fully assembled. Frozen nodes behave exactly like the classes
+they are created from, but:
+
+* no subsections, commands, options or option groups may be added or removed
+* their attributes cannot be set and each section's subsections and commands
+  are read-only mappings
+* nodes hold their attributes in slots, without a per-node dict
+* names and option triggers are interned so repeated names share storage
+* options and option groups are held in tuples and each section keeps its
+  children pre-sorted for display
+* the command's parser is built once without re-checking the options
+
+Only nodes of the Section, Command, Option, Flag and OptionGroup classes
+themselves are frozen. Instances of subclasses may carry state or behavior
+a frozen copy would lose, so they (and everything below them) are kept as
+they are.
+"""
+
+import sys
+
+from okaara.cli import (Command, Flag, InvalidStructure, Option, OptionGroup, Section, _CommandBase,
+                        _FlagBase, _OptionBase, _OptionGroupBase, _SectionBase)
+
+# -- constants ----------------------------------------------------------------
+
+try:
+    _intern_function = sys.intern
+except AttributeError:
+    _intern_function = intern
+
+try:
+    from types import MappingProxyType as _read_only_mapping
+except ImportError:
+    _read_only_mapping = dict
+
+# -- public -------------------------------------------------------------------
+
+def freeze_section(section):
+    """
+    Returns a frozen copy of the given section and everything in it. Any
+    sections with a builder are built first.
+
+    :type  section: Section
+    :rtype: Section
+    """
+    if type(section) is not Section:
+        return section
+    return FrozenSection(section)
+
+
+def freeze_command(command):
+    """
+    Returns a frozen copy of the given command and its options.
+
+    :type  command: Command
+    :rtype: Command
+    """
+    if type(command) is not Command:
+        return command
+    return FrozenCommand(command)
+
+
+def freeze_option(option):
+    """
+    Returns a frozen copy of the given option or flag.
+
+    :type  option: Option
+    :rtype: Option
+    """
+    if type(option) is Flag:
+        return FrozenFlag(option)
+    if type(option) is Option:
+        return FrozenOption(option)
+    return option
+
+# -- classes ------------------------------------------------------------------
+
+class _ReadOnly(object):
+    """
+    Rejects setting or deleting attributes once the node has been sealed at
+    the end of its constructor. Private attributes and those listed in
+    _loaded_attributes, which are replaced when loaded on first use, may
+    still be set. Subclasses declare the _sealed slot.
+    """
+
+    __slots__ = ()
+
+    _loaded_attributes = ()
+
+    def __setattr__(self, name, value):
+        self._check_attribute(name)
+        object.__setattr__(self, name, value)
+
+    def __delattr__(self, name):
+        self._check_attribute(name)
+        object.__delattr__(self, name)
+
+    def __setstate__(self, state):
+        # Unpickled attributes are restored directly, as setting them after
+        # _sealed would be rejected
+        slot_state = state[1]
+        for name, value in slot_state.items():
+            object.__setattr__(self, name, value)
+
+    def _seal(self):
+        object.__setattr__(self, '_sealed', True)
+
+    def _check_attribute(self, name):
+        sealed = getattr(self, '_sealed', False)
+        if sealed and not name.startswith('_') and name not in self._loaded_attributes:
+            raise AttributeError('%s is frozen; %s cannot be changed' % (self, name))
+
+
+class FrozenOption(_ReadOnly, _OptionBase):
+    """
+    Option copied from an assembled command; the aliases and choices are tuples.
+    """
+
+    __slots__ = ('_sealed',)
+
+    _loaded_attributes = ('validate_func', 'parse_func')
+
+    def __init__(self, option):
+        _OptionBase.__init__(self, _intern(option.name), option.description, required=option.required,
+                        allow_multiple=option.allow_multiple, aliases=_intern_all(option.aliases),
+                        default=option.default, validate_func=option.validate_func,
+                        parse_func=option.parse_func, choices=_tuple_or_none(option.choices),
+                        stream_values=option.stream_values)
+        self._seal()
+
+
+class FrozenFlag(_ReadOnly, _FlagBase):
+    """
+    Flag copied from an assembled command.
+    """
+
+    __slots__ = ('_sealed',)
+
+    def __init__(self, flag):
+        _FlagBase.__init__(self, _intern(flag.name), flag.description, aliases=_intern_all(flag.aliases))
+        self._seal()
+
+
+class FrozenOptionGroup(_ReadOnly, _OptionGroupBase):
+    """
+    Option group whose options cannot be changed.
+    """
+
+    __slots__ = ('_sealed',)
+
+    def __init__(self, group):
+        _OptionGroupBase.__init__(self, group.name, description=group.description)
+        self.options = tuple([freeze_option(o) for o in group.options])
+        self._seal()
+
+    def add_option(self, option):
+        _frozen(self)
+
+
+class FrozenCommand(_ReadOnly, _CommandBase):
+    """
+    Command whose options and option groups cannot be changed.
+    """
+
+    __slots__ = ('_sealed',)
+
+    _loaded_attributes = ('method', 'method_loader')
+
+    def __init__(self, command):
+        _CommandBase.__init__(self, _intern(command.name), command.description, command.method,
+                         usage_description=command.usage_description, parser=command.parser,
+                         method_loader=command.method_loader)
+        self.cacheable = command.cacheable
+        self.options = tuple([freeze_option(o) for o in command.options])
+        self.option_groups = tuple([_freeze_group(g) for g in command.option_groups])
+        self._seal()
+
+    def add_option(self, option):
+        _frozen(self)
+
+    def add_option_group(self, option_group):
+        _frozen(self)
+
+    def compiled_parser(self):
+        # The options cannot change, so there is nothing to check
+        if self._compiled_parser is None:
+            self._compiled_parser = self._build_parser()
+        return self._compiled_parser
+
+
+class FrozenSection(_ReadOnly, _SectionBase):
+    """
+    Section whose subsections and commands cannot be changed.
+    """
+
+    __slots__ = ('_sorted_subsections', '_sorted_commands', '_sealed')
+
+    def __init__(self, section):
+        section.build()
+        _SectionBase.__init__(self, _intern(section.name), section.description)
+
+        self._sorted_subsections = tuple([freeze_section(s) for s in section.sorted_subsections()])
+        self._sorted_commands = tuple([freeze_command(c) for c in section.sorted_commands()])
+
+        for s in self._sorted_subsections:
+            self.subsections[s.name] = s
+            self._children[s.name] = s
+
+        for c in self._sorted_commands:
+            self.commands[c.name] = c
+            self._children[c.name] = c
+
+        self.subsections = _read_only_mapping(self.subsections)
+        self.commands = _read_only_mapping(self.commands)
+        self._children = _read_only_mapping(self._children)
+        self._seal()
+
+    def add_subsection(self, section):
+        _frozen(self)
+
+    def add_command(self, command):
+        _frozen(self)
+
+    def remove_subsection(self, name):
+        _frozen(self)
+
+    def remove_command(self, name):
+        _frozen(self)
+
+    def sorted_subsections(self):
+        return self._sorted_subsections
+
+    def sorted_commands(self):
+        return self._sorted_commands
+
+# The frozen classes derive from the slotted implementations rather than the
+# public classes, so they are registered to keep isinstance checks working
+Option.register(FrozenOption)
+Flag.register(FrozenFlag)
+OptionGroup.register(FrozenOptionGroup)
+Command.register(FrozenCommand)
+Section.register(FrozenSection)
+
+# -- private ------------------------------------------------------------------
+
+def _freeze_group(group):
+    if type(group) is not OptionGroup:
+        return group
+    return FrozenOptionGroup(group)
+
+
+def _frozen(node):
+    raise InvalidStructure('%s is frozen and cannot be changed' % node)
+
+
+def _intern(name):
+    try:
+        return _intern_function(name)
+    except TypeError:
+        # Only native strings can be interned
+        return name
+
+
+def _intern_all(names):
+    if names is None:
+        return None
+    return tuple([_intern(n) for n in names])
+
+
+def _tuple_or_none(values):
+    if values is None:
+        return None
+    return tuple(values)
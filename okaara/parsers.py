@@ -23,7 +23,7 @@ the parse_optional_* methods will translate to None upon parsing.
 """
 
 import csv as csv_module
-from gettext import gettext as _
+from okaara._i18n import _
 
 
 # When parsing a boolean, the value is converted to lower case and checked to see
@@ -20,8 +20,6 @@ and will call the appropriate method in each object to make it display the
 current state.
 """
 from __future__ import division
-from future import standard_library
-standard_library.install_aliases()
 from builtins import object
 
 import math
@@ -144,6 +142,9 @@ class ProgressBar(object):
         # Save the number of lines written for the next iteration
         self.previous_lines_written = 1 + message_line_count
 
+        # Show the new state now even if the prompt is buffering its output
+        self.prompt.flush()
+
     def iterator(self, iterable, message_func=None):
         """
         Wraps an iterator to automatically make the appropriate calls into
@@ -272,6 +273,9 @@ class Spinner(object):
 
         self.previous_lines_written = 1 + message_lines
 
+        # Show the new state now even if the prompt is buffering its output
+        self.prompt.flush()
+
     def iterator(self, iterable):
         """
         Wraps an iterator to automatically render the next step in the spinner
@@ -17,26 +17,15 @@ from builtins import str
 from builtins import object
 
 from functools import reduce
-import copy
-import fcntl
-import getpass
-import gettext
-import logging
 import os
 import struct
 import sys
-import termios
 
-t = gettext.translation('okaara', fallback=True)
-if sys.version_info[0] < 3:
-    _ = t.ugettext
-else:
-    _ = t.gettext
+from okaara import _io, _text
+from okaara._i18n import _
 
 # -- constants ----------------------------------------------------------------
 
-LOG = logging.getLogger(__name__)
-
 # Returned to indicate the user has interrupted the input
 ABORT = object()
 
@@ -44,6 +33,11 @@ ABORT = object()
 # calculated at the time of rendering
 WIDTH_TERMINAL = object()
 
+# Size used when the terminal size can't be determined from the input or
+# output streams or the COLUMNS and LINES environment variables
+DEFAULT_TERMINAL_WIDTH = 80
+DEFAULT_TERMINAL_HEIGHT = 24
+
 COLOR_WHITE = '\033[0m'
 COLOR_BRIGHT_WHITE = '\033[1m'
 
@@ -83,6 +77,37 @@ CLEAR = '\033[2J'
 CLEAR_EOL = '\033[K'
 CLEAR_REMAINDER = '\033[J'
 
+# Output formats; in the JSON format everything written is a JSON record on
+# its own line (see Prompt.write_record)
+OUTPUT_TEXT = 'text'
+OUTPUT_JSON = 'json'
+
+# Text written as is, without coloring, wrapping, centering or terminal
+# control codes; meant for output that isn't read on a terminal
+OUTPUT_PLAIN = 'plain'
+
+# Resolved when the prompt is created: OUTPUT_TEXT if the output stream is a
+# terminal and OUTPUT_PLAIN otherwise. Color is also disabled if the NO_COLOR
+# environment variable is set (see https://no-color.org).
+OUTPUT_AUTO = 'auto'
+
+# Record types written by the prompt and CLI in the JSON output format
+RECORD_DATA = 'data'            # written by commands through write_record
+RECORD_MESSAGE = 'message'      # text passed to write
+RECORD_USAGE = 'usage'          # command usage, including any missing or unexpected options
+RECORD_SECTION = 'section'      # contents of a section
+RECORD_ERROR = 'error'          # option validation failure
+RECORD_HEADER = 'header'        # column headers of a table rendered by okaara.table
+RECORD_ROW = 'row'              # row of a table rendered by okaara.table
+
+# Flush policies for a prompt that buffers its output (see the flush_policy
+# parameter to Prompt). Buffered output is always flushed before reading input.
+FLUSH_NEWLINE = 'newline'       # after each write that ends a line
+FLUSH_SIZE = 'size'             # once the buffered content reaches the buffer size
+FLUSH_EXPLICIT = 'explicit'     # only when flush is called
+
+DEFAULT_BUFFER_SIZE = 65536
+
 TAG_READ = 'read'
 TAG_WRITE = 'write'
 
@@ -96,7 +121,8 @@ class Prompt(object):
     """
 
     def __init__(self, input=sys.stdin, output=sys.stdout, normal_color=COLOR_WHITE,
-                 enable_color=True, wrap_width=None, record_tags=False):
+                 enable_color=True, wrap_width=None, record_tags=False, output_format=OUTPUT_TEXT,
+                 flush_policy=None, buffer_size=DEFAULT_BUFFER_SIZE):
         """
         Creates a new instance that will read and write to the given streams.
 
@@ -122,18 +148,52 @@ class Prompt(object):
         :param record_tags: if true, the prompt will keep track of tags passed
                             to all write calls
         :type  record_tags: bool
+
+        :param output_format: one of the OUTPUT_* variables in this module; in
+                              OUTPUT_JSON, everything written is a JSON record
+                              and no wrapping, centering or coloring is applied
+                              and in OUTPUT_PLAIN, text is written as is
+        :type  output_format: str
+
+        :param flush_policy: if specified, output is collected in a buffer and
+                             written to the output stream in larger pieces, as
+                             determined by this policy; one of the FLUSH_*
+                             variables in this module. By default, each write
+                             is passed straight to the output stream.
+        :type  flush_policy: str or None
+
+        :param buffer_size: number of characters buffered before they are
+                            written under the FLUSH_SIZE policy
+        :type  buffer_size: int
         """
+        if output_format == OUTPUT_AUTO:
+            output_format, enable_color = _detect_output_format(output, enable_color)
+
+        if output_format == OUTPUT_PLAIN:
+            enable_color = False
+
         self.input = input
         self.output = output
         self.normal_color = normal_color
         self.enable_color = enable_color
         self.wrap_width = wrap_width
         self.record_tags = record_tags
+        self.output_format = output_format
+        self.flush_policy = flush_policy
+        self.buffer_size = buffer_size
 
         self.tags = []
 
+        # Pending output and its total length when buffering
+        self._buffer = []
+        self._buffered = 0
+
+        # Terminal size and the resize count it was read at
+        self._terminal_size = None
+        self._terminal_size_resizes = None
+
         # Initialize the screen with the normal color
-        if self.enable_color:
+        if self.enable_color and self.output_format == OUTPUT_TEXT:
             self.write(self.normal_color, new_line=False)
 
     # -- general --------------------------------------------------------------
@@ -150,6 +210,7 @@ class Prompt(object):
         """
         self._record_tag(TAG_READ, tag)
         self.write(prompt, new_line=False)
+        self.flush()
 
         try:
             r = self.input.readline().rstrip() # rstrip removes the trailing \n
@@ -171,10 +232,26 @@ class Prompt(object):
         :param skip_wrap: if true, auto-wrapping won't be applied; defaults to false
         :type  skip_wrap: bool
         """
+        # Fast path for plain output, which is only ever given a new line
+        if self.output_format == OUTPUT_PLAIN:
+            if tag is not None:
+                self._record_tag(TAG_WRITE, tag)
+            if new_line:
+                self._emit(str(content) + '\n')
+            else:
+                self._emit(str(content))
+            return
+
         self._record_tag(TAG_WRITE, tag)
 
         content = str(content)
 
+        if self.output_format == OUTPUT_JSON:
+            # Blank lines only space out text output
+            if content:
+                self._write_json(RECORD_MESSAGE, content)
+            return
+
         if not skip_wrap:
             content = self.wrap(content)
 
@@ -184,7 +261,48 @@ class Prompt(object):
 
         if new_line: content += '\n'
 
-        self.output.write(content)
+        self._emit(content)
+
+    def flush(self):
+        """
+        Writes any buffered output to the output stream and flushes the
+        stream, if it supports it.
+        """
+        if self._buffered > 0:
+            content = ''.join(self._buffer)
+            self._buffer = []
+            self._buffered = 0
+            self.output.write(content)
+
+        if hasattr(self.output, 'flush'):
+            self.output.flush()
+
+    def write_record(self, record, record_type=RECORD_DATA, tag=None):
+        """
+        Writes a structured record. In the JSON output format, the record is
+        written as a single line containing an object with the record type
+        under "type" and the record under "data". Otherwise, a dict is written
+        as one "key: value" line per entry, a list or tuple as one line per
+        item, and anything else as a single line.
+
+        :param record: JSON-serializable value to write
+        :type  record: dict, list or object
+
+        :param record_type: one of the RECORD_* variables in this module;
+               commands should use the default
+        :type  record_type: str
+        """
+        if self.output_format == OUTPUT_JSON:
+            self._record_tag(TAG_WRITE, tag)
+            self._write_json(record_type, record)
+        elif isinstance(record, dict):
+            for key, value in record.items():
+                self.write('%s: %s' % (key, value), tag=tag)
+        elif isinstance(record, (list, tuple)):
+            for item in record:
+                self.write(item, tag=tag)
+        else:
+            self.write(record, tag=tag)
 
     def color(self, text, color):
         """
@@ -230,14 +348,15 @@ class Prompt(object):
 
         if width is None:
             if self.wrap_width is None or self.wrap_width is WIDTH_TERMINAL:
-                width = self.terminal_size()[0]
+                width = self.current_terminal_size()[0]
             else:
                 width = self.wrap_width
 
-        if len(text) >= width:
+        text_width = _text.display_width(text)
+        if text_width >= width:
             return text
         else:
-            spacer = ' ' * ((width - len(text)) // 2)
+            spacer = ' ' * ((width - text_width) // 2)
             return spacer + text
 
     def wrap(self, content, wrap_width=None, remaining_line_indent=0):
@@ -259,8 +378,9 @@ class Prompt(object):
         :rtype:  str
         """
 
-        # If it's not overridden, use the instance-configured wrap width
-        if wrap_width is None:
+        # If it's not overridden, use the instance-configured wrap width;
+        # plain output isn't wrapped to a width of its own
+        if wrap_width is None and self.output_format != OUTPUT_PLAIN:
             wrap_width = self.wrap_width
 
         # If the instance isn't configured with a wrap width, we're done
@@ -270,73 +390,9 @@ class Prompt(object):
         # If the instance is configured to dynamically calculate it based on
         # the terminal width, figure that value out now
         if wrap_width is WIDTH_TERMINAL:
-            wrap_width = self.terminal_size()[0]
-
-        # Actual splitting algorithm
-        def _rightmost_space_index(str):
-            for i in range(len(str) - 1, -1, -1):
-                if str[i] == ' ' : return i
-            return None
-
-        lines = [] # running track of split apart lines; assemble at the end
-        content = copy.copy(content)
-        first_pass = True
-
-        while True:
-            # If there's nothing left, we're done
-            if len(content) is 0:
-                break
-
-            # Strip off any leading whitespace to left justify the new line;
-            # don't strip for the first pass through it in case the user indented.
-            # After stipping off any accidental whitespace, add in the indent
-            # for non-first lines.
-            if not first_pass:
-                content = content.lstrip()
-                content = (' ' * remaining_line_indent) + content
-            else:
-                first_pass = False
-
-            # Ideal situation is the text fills the width
-            end_index = wrap_width
-            chunk = content[:end_index]
+            wrap_width = self.current_terminal_size()[0]
 
-            # If this is the last chunk left, we're done
-            if end_index >= len(content):
-                lines.append(chunk)
-                break
-
-            # If the next character is a space, we've broken at a good point
-            if end_index < len(content) and content[end_index] == ' ':
-                lines.append(chunk)
-                content = content[end_index:]
-                continue
-
-            # This is the ugly case. Backtrack to the right-most space and make
-            # that the new chunk.
-
-            # I'd like to use rpartition here, but for outside reasons I have
-            # to stay 2.4 compliant and that's a 2.5 method. Damn.
-
-            last_space_index = _rightmost_space_index(chunk)
-
-            # If we found a space we can backtrack to and split there, use that
-            # as the chunk. If not, just leave the split as is.
-            if last_space_index is not None:
-
-                # In the case of a remaining line indent, we need to make sure
-                # the right-most space isn't just the indent, otherwise we're
-                # going to loop indefinitely.
-                if remaining_line_indent is not None and last_space_index > remaining_line_indent:
-                    end_index = last_space_index
-                    chunk = content[:end_index]
-
-            lines.append(chunk)
-            content = content[end_index:]
-
-        assembled = '\n'.join(lines)
-
-        return assembled
+        return _text.wrap(content, wrap_width, remaining_line_indent)
 
     def move(self, direction):
         """
@@ -347,7 +403,7 @@ class Prompt(object):
         :param direction: move character to write
         :type  direction: str
         """
-        self.write(direction, new_line=False)
+        self._write_control(direction)
 
     def clear(self, clear_character=CLEAR):
         """
@@ -359,33 +415,64 @@ class Prompt(object):
                the CLEAR_* variables
         :type  clear_character: str
         """
-        self.write(clear_character, new_line=False)
+        self._write_control(clear_character)
 
     def save_position(self):
         """
         Saves the current location of the cursor. The cursor can be moved back
         to this position by using the reset_position call.
         """
-        self.write(POSITION_SAVE, new_line=False)
+        self._write_control(POSITION_SAVE)
 
     def reset_position(self):
         """
         Moves the cursor back to the location of the cursor at the last point
         save_position was called.
         """
-        self.write(POSITION_RESET, new_line=False)
+        self._write_control(POSITION_RESET)
 
     @classmethod
     def terminal_size(cls):
         """
-        Returns the width and height of the terminal.
+        Returns the width and height of the terminal. The size is read from
+        the terminal attached to standard input or, failing that, standard
+        output. If neither is a terminal, the COLUMNS and LINES environment
+        variables are used, then DEFAULT_TERMINAL_WIDTH and
+        DEFAULT_TERMINAL_HEIGHT.
+
+        The size is read on every call; see current_terminal_size for the
+        cached size used by a prompt.
 
         :return: tuple of width and height values
         :rtype:  (int, int)
         """
-        ioctl = fcntl.ioctl(0, termios.TIOCGWINSZ, struct.pack('HHHH', 0, 0, 0, 0))
-        h, w, hp, wp = struct.unpack('HHHH', ioctl)
-        return w, h
+        return _read_terminal_size(sys.stdout)
+
+    def current_terminal_size(self):
+        """
+        Returns the width and height of the terminal as terminal_size does,
+        except that this prompt's output stream is checked in place of
+        standard output and the size is cached.
+
+        The cached size is read again after the terminal is resized, as
+        signalled by SIGWINCH. A handler for the signal is installed on the
+        first call (calling any previously installed handler in turn). If that
+        isn't possible, for instance when first called outside of the main
+        thread, or the application later replaces the handler, the size is
+        read on every call.
+
+        :return: tuple of width and height values
+        :rtype:  (int, int)
+        """
+        resizes = _resize_count()
+        if resizes is not None and resizes == self._terminal_size_resizes:
+            return self._terminal_size
+
+        size = _read_terminal_size(self.output)
+        if resizes is not None:
+            self._terminal_size = size
+            self._terminal_size_resizes = resizes
+        return size
 
     # -- prompts --------------------------------------------------------------
 
@@ -784,12 +871,24 @@ class Prompt(object):
         behavior when called in python 2.4. The degraded behavior is explained
         in-line below.
 
+        An input stream with a read_password method (taking the question and
+        returning the entered text) is asked for the password instead, for
+        input that does not come from this process's terminal.
+
         :param question: displayed to the user when prompting for input
         :type  question: str
 
         :return:    password that the user entered
         :rtype:     basestring
         """
+        import getpass
+
+        self.flush()
+
+        read_password = getattr(self.input, 'read_password', None)
+        if read_password is not None:
+            return read_password(question)
+
         try:
             return getpass.getpass(question, stream=self.output)
         # In python 2.4, getpass.getpass does not have the "stream" parameter
@@ -896,6 +995,38 @@ class Prompt(object):
         parsed = input.split('-')
         return int(parsed[0].strip()) - 1, int(parsed[1].strip()) - 1
 
+    def _write_json(self, record_type, record):
+        import json
+
+        line = json.dumps({'type': record_type, 'data': record}, sort_keys=True)
+        self._emit(line + '\n')
+
+    def _emit(self, content):
+        """
+        Writes fully rendered content to the output stream, or adds it to the
+        buffer if the prompt is buffering.
+        """
+        policy = self.flush_policy
+        if policy is None:
+            self.output.write(content)
+            return
+
+        self._buffer.append(content)
+        self._buffered += len(content)
+
+        if policy == FLUSH_NEWLINE:
+            if content.endswith('\n'):
+                self.flush()
+        elif policy == FLUSH_SIZE:
+            if self._buffered >= self.buffer_size:
+                self.flush()
+
+    def _write_control(self, code):
+        # Terminal control codes have no meaning to a consumer of JSON records
+        # or outside of a terminal
+        if self.output_format == OUTPUT_TEXT:
+            self.write(code, new_line=False)
+
     def _record_tag(self, io, tag):
         """
         Stores the given tag in the prompt if it is configued to track them.
@@ -920,18 +1051,134 @@ class Recorder(object):
     """
     Suitable for passing to the Prompt constructor as the output, an instance
     of this class will store every line written to it in an internal list.
+
+    By default everything written is kept in memory, one entry per write. For
+    long sessions the recorder can keep only the most recent entries
+    (max_lines) or move what it has recorded to a temporary file once it
+    grows past a number of characters (spill_size). With join_lines, the
+    fragments of each line are joined so each entry is a complete line.
     """
 
-    def __init__(self):
-        self.lines = []
+    def __init__(self, max_lines=None, spill_size=None, join_lines=False):
+        """
+        :param max_lines: if specified, only this many of the most recent
+               entries are kept
+        :type  max_lines: int
+
+        :param spill_size: if specified, once more than this many characters
+               are recorded they are moved to a temporary file, along with
+               everything written after
+        :type  spill_size: int
+
+        :param join_lines: if true, each entry in lines is a complete line
+               rather than the text of a single write; text written after the
+               last new line is kept aside until its line is finished
+        :type  join_lines: bool
+        """
+        if max_lines is not None and spill_size is not None:
+            raise ValueError('max_lines and spill_size cannot both be specified')
+
+        self.max_lines = max_lines
+        self.spill_size = spill_size
+        self.join_lines = join_lines
+
+        if max_lines is None:
+            self.lines = []
+        else:
+            import collections
+            self.lines = collections.deque(maxlen=max_lines)
+
+        self._partial = []  # fragments of the unfinished line when joining lines
+        self._size = 0  # characters recorded while waiting to spill
+        self._spill_file = None
+
+    @property
+    def spilled(self):
+        """
+        True once the recorded output has been moved to a temporary file.
+        """
+        return self._spill_file is not None
 
     def write(self, line):
-        self.lines.append(line)
+        if self._spill_file is not None:
+            self._spill_file.write(line)
+            return
+
+        if self.join_lines:
+            self._write_joined(line)
+        else:
+            self.lines.append(line)
+
+        if self.spill_size is not None:
+            self._size += len(line)
+            if self._size > self.spill_size:
+                self._spill()
+
+    def getvalue(self):
+        """
+        Returns everything recorded as a single string, including output moved
+        to the temporary file and any unfinished line. In ring buffer mode
+        this is only the entries that are still kept.
+
+        :rtype: str
+        """
+        recorded = ''.join(self.lines) + ''.join(self._partial)
+
+        if self._spill_file is not None:
+            self._spill_file.flush()
+            self._spill_file.seek(0)
+            try:
+                recorded = self._spill_file.read() + recorded
+            finally:
+                self._spill_file.seek(0, os.SEEK_END)
+
+        return recorded
+
+    def close(self):
+        """
+        Closes and removes the temporary file, if the recorder spilled.
+        """
+        if self._spill_file is not None:
+            self._spill_file.close()
+            self._spill_file = None
+
+    def _write_joined(self, text):
+        if '\n' not in text:
+            if text:
+                self._partial.append(text)
+            return
+
+        pieces = text.split('\n')
+
+        self._partial.append(pieces[0])
+        self.lines.append(''.join(self._partial) + '\n')
+        self.lines.extend([p + '\n' for p in pieces[1:-1]])
+
+        if pieces[-1]:
+            self._partial = [pieces[-1]]
+        else:
+            self._partial = []
+
+    def _spill(self):
+        import tempfile
+
+        # Text mode, so lines is read back as the same type it was written as
+        self._spill_file = tempfile.TemporaryFile(mode='w+', prefix='okaara-recorder-')
+        self._spill_file.write(''.join(self.lines) + ''.join(self._partial))
+
+        self.lines = []
+        self._partial = []
+
 
 class Script(object):
     """
     Suitable for passing to the Prompt constructor as the input, an instance
     of this class will return each line set within on each call to read.
+
+    The lines may be a list or any other iterable, such as an open file or a
+    generator, which is read one line at a time as input is requested. Once a
+    list is used up, reading raises IndexError; once any other iterable is
+    used up, reading returns an empty string, as a file would at its end.
     """
 
     # If this is present in the list of lines, a KeyboardInterrupt will be raised
@@ -940,10 +1187,198 @@ class Script(object):
     def __init__(self, lines):
         self.lines = lines
 
+    @classmethod
+    def from_file(cls, filename):
+        """
+        Returns a script that reads its lines from the given file as they are
+        needed rather than loading it up front. The file is closed once it
+        has been read to the end.
+
+        :param filename: file holding one line of input per line
+        :type  filename: str
+
+        :rtype: Script
+
+        :raise IOError: if the file cannot be opened
+        """
+        return cls(_io.file_lines(filename))
+
+    @property
+    def lines(self):
+        """
+        Lines not yet read; a deque when the script was given a list or
+        tuple, otherwise an iterator over the remaining lines.
+        """
+        return self._lines
+
+    @lines.setter
+    def lines(self, lines):
+        if isinstance(lines, (list, tuple)):
+            import collections
+            self._lines = collections.deque(lines)
+            self._next_line = self._lines.popleft
+        else:
+            self._lines = iter(lines)
+            self._next_line = self._next_from_iterator
+
     def readline(self, size=None):
-        value = self.lines.pop(0)
+        value = self._next_line()
 
         if value is Script.INTERRUPT:
             raise KeyboardInterrupt()
 
         return value
+
+    def _next_from_iterator(self):
+        return next(self._lines, '')
+
+
+# -- output detection ---------------------------------------------------------
+
+def _detect_output_format(output, enable_color):
+    """
+    Resolves OUTPUT_AUTO for the given output stream.
+
+    :return: tuple of the output format and whether to enable color
+    :rtype:  (str, bool)
+    """
+    try:
+        interactive = output.isatty()
+    except (AttributeError, ValueError):
+        # No isatty, or the stream has been closed
+        interactive = False
+
+    if not interactive:
+        return OUTPUT_PLAIN, False
+
+    if os.environ.get('NO_COLOR'):
+        enable_color = False
+
+    return OUTPUT_TEXT, enable_color
+
+# -- terminal size ------------------------------------------------------------
+
+# Number of SIGWINCH signals received; None until the handler is installed
+_resizes = None
+
+# Handler installed to count the signals; None if it isn't installed
+_resize_handler = None
+
+# Set once installing the handler has been attempted
+_resize_handler_attempted = False
+
+
+def _resize_count():
+    """
+    Returns the number of times the terminal has been resized, installing the
+    SIGWINCH handler that counts them if needed.
+
+    :return: resize count; None if resizes can't be detected
+    :rtype:  int or None
+    """
+    global _resizes, _resize_handler, _resize_handler_attempted
+
+    if _resize_handler is not None:
+        import signal
+
+        if signal.getsignal(signal.SIGWINCH) is not _resize_handler:
+            # The application installed a handler of its own, so resizes are
+            # no longer counted; they aren't counted again even if the handler
+            # is later restored, since resizes in between were missed
+            _resize_handler = None
+            _resizes = None
+        return _resizes
+
+    if _resize_handler_attempted:
+        return None
+
+    import signal
+
+    if not hasattr(signal, 'SIGWINCH'):
+        _resize_handler_attempted = True
+        return None
+
+    previous_handler = signal.getsignal(signal.SIGWINCH)
+
+    def handle_resize(signum, frame):
+        global _resizes
+        if _resizes is not None:
+            _resizes += 1
+        if callable(previous_handler):
+            previous_handler(signum, frame)
+
+    try:
+        signal.signal(signal.SIGWINCH, handle_resize)
+    except ValueError:
+        # Handlers can only be installed from the main thread; this is tried
+        # again on the next call
+        return None
+
+    _resizes = 0
+    _resize_handler = handle_resize
+    _resize_handler_attempted = True
+
+    # Don't interrupt a read from the user when the terminal is resized
+    signal.siginterrupt(signal.SIGWINCH, False)
+
+    return _resizes
+
+
+def _read_terminal_size(output):
+    """
+    Reads the terminal size; see Prompt.terminal_size for where it is read from,
+    with the given output stream in place of standard output.
+
+    :rtype: (int, int)
+    """
+    fds = [0]
+    try:
+        fds.append(output.fileno())
+    except (AttributeError, ValueError, IOError, OSError):
+        # Not every output stream is backed by a file descriptor
+        pass
+
+    try:
+        import fcntl
+        import termios
+    except ImportError:
+        fds = []
+
+    for fd in fds:
+        try:
+            ioctl = fcntl.ioctl(fd, termios.TIOCGWINSZ, struct.pack('HHHH', 0, 0, 0, 0))
+        except (IOError, OSError):
+            continue
+
+        h, w, hp, wp = struct.unpack('HHHH', ioctl)
+        if w > 0:
+            return w, h
+
+    return (_int_from_environ('COLUMNS', DEFAULT_TERMINAL_WIDTH),
+            _int_from_environ('LINES', DEFAULT_TERMINAL_HEIGHT))
+
+
+def _int_from_environ(name, default):
+    try:
+        value = int(os.environ.get(name, ''))
+    except ValueError:
+        return default
+    if value <= 0:
+        return default
+    return value
+
+
+def __getattr__(name):
+    # The logger is created on first access so importing this module does not
+    # import logging
+    if name == 'LOG':
+        import logging
+        globals()['LOG'] = logging.getLogger(__name__)
+        return globals()['LOG']
+    raise AttributeError('module %r has no attribute %r' % (__name__, name))
+
+
+if sys.version_info < (3, 7):
+    # Modules cannot define __getattr__ before 3.7, so create it up front
+    import logging
+    LOG = logging.getLogger(__name__)
@@ -14,20 +14,13 @@
 # If not, see <http://www.gnu.org/licenses/>.
 from builtins import object
 
-import gettext
 import logging
 import os
 import sys
 
+from okaara._i18n import _
 from okaara.prompt import Prompt
 
-t = gettext.translation('okaara', fallback=True)
-if sys.version_info[0] < 3:
-    _ = t.ugettext
-else:
-    _ = t.gettext
-
-
 LOG = logging.getLogger(__name__)
 
 class Exit(Exception):
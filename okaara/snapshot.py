@@ -0,0 +1,320 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Saves the structure of an assembled CLI to a file and restores it later
+without re-running the code that assembled it (for instance, loading
+extensions). Commands in the restored CLI reference their methods by import
+path, so no command implementation is imported until a command is run.
+
+A typical use is through load_or_build, passing a fingerprint that changes
+when the CLI structure would change (see ExtensionsManager.fingerprint)::
+
+    manager = ExtensionsManager(init_arg_list=[...])
+    manager.add_loader(DirectoryExtensionsLoader(...))
+
+    def build():
+        cli = Cli()
+        manager.init_arg_list = [cli]
+        manager.load()
+        return cli
+
+    cli = snapshot.load_or_build(cache_filename, build, fingerprint=manager.fingerprint())
+
+If the fingerprint is None, as it is when a loader cannot calculate one,
+load_or_build always builds the CLI and no snapshot is used.
+
+Only CLIs built from the Section, Command, Option, Flag and OptionGroup
+classes themselves can be saved. Command methods, option validate/parse
+functions and command method loaders must be importable module-level
+functions (or already be import paths), and option defaults must be JSON
+serializable. Commands using a custom parser cannot be saved.
+"""
+
+from functools import partial
+import json
+import logging
+import sys
+
+from okaara import _io, _text
+from okaara.cli import Cli, Command, Flag, Option, OptionGroup, Section, import_callable
+
+# -- constants ----------------------------------------------------------------
+
+LOG = logging.getLogger(__name__)
+
+# Incremented whenever the file format changes; files of a different version
+# are treated as stale
+SNAPSHOT_VERSION = 1
+
+# -- exceptions ---------------------------------------------------------------
+
+class SnapshotError(Exception):
+    """
+    Raised when a CLI contains something that cannot be represented in a
+    snapshot.
+    """
+    pass
+
+# -- public -------------------------------------------------------------------
+
+def save(cli, filename, fingerprint=None):
+    """
+    Writes the structure of the given CLI to the given file. Any sections with
+    a builder are built first. The file is replaced atomically.
+
+    :param cli: fully assembled CLI to save
+    :type  cli: okaara.cli.Cli
+
+    :param filename: file to write the snapshot to
+    :type  filename: str
+
+    :param fingerprint: if specified, the snapshot will only be loaded if the
+           same value is given to load
+    :type  fingerprint: str
+
+    :raise SnapshotError: if the CLI contains something that cannot be saved
+    """
+    document = {
+        'version': SNAPSHOT_VERSION,
+        'fingerprint': fingerprint,
+        'root': _section_to_dict(cli.root_section),
+    }
+    data = json.dumps(document, separators=(',', ':'))
+    _io.write_atomically(filename, data, '.okaara-snapshot-')
+
+
+def load(filename, fingerprint=None, prompt=None):
+    """
+    Restores a CLI from a snapshot written by save. If the snapshot does not
+    exist, cannot be read, or was saved with a different fingerprint, None
+    is returned.
+
+    :param filename: file the snapshot was saved to
+    :type  filename: str
+
+    :param fingerprint: value that must match the one the snapshot was saved with
+    :type  fingerprint: str
+
+    :param prompt: prompt to pass to the restored CLI
+    :type  prompt: okaara.prompt.Prompt
+
+    :return: restored CLI; None if the snapshot is missing or stale
+    :rtype:  okaara.cli.Cli or None
+    """
+    try:
+        f = open(filename, 'r')
+        try:
+            document = json.load(f)
+        finally:
+            f.close()
+    except (IOError, OSError, ValueError):
+        return None
+
+    if document.get('version') != SNAPSHOT_VERSION or document.get('fingerprint') != fingerprint:
+        return None
+
+    cli = Cli(prompt=prompt)
+    _populate_section(cli.root_section, document['root'])
+    return cli
+
+
+def load_or_build(filename, build_func, fingerprint=None, prompt=None):
+    """
+    Restores the CLI from the given snapshot if it is present and current,
+    otherwise calls build_func to assemble the CLI and saves a new snapshot.
+    If the built CLI cannot be saved, the reason is logged and the built CLI
+    is still returned.
+
+    Without a fingerprint there is no way to tell whether a snapshot is
+    current, so if it is None the CLI is always built and the snapshot is
+    neither loaded nor saved.
+
+    :param filename: snapshot file
+    :type  filename: str
+
+    :param build_func: called with no arguments to assemble the CLI
+    :type  build_func: callable
+
+    :param fingerprint: see save; None if it could not be calculated
+    :type  fingerprint: str or None
+
+    :param prompt: prompt to pass to a restored CLI; build_func is responsible
+           for the prompt of a built CLI
+    :type  prompt: okaara.prompt.Prompt
+
+    :rtype: okaara.cli.Cli
+    """
+    if fingerprint is None:
+        LOG.debug('No fingerprint for CLI snapshot [%s]; building the CLI' % filename)
+        return build_func()
+
+    cli = load(filename, fingerprint=fingerprint, prompt=prompt)
+    if cli is not None:
+        return cli
+
+    cli = build_func()
+    try:
+        save(cli, filename, fingerprint=fingerprint)
+    except (SnapshotError, IOError, OSError):
+        LOG.exception('Could not save CLI snapshot to [%s]' % filename)
+
+    return cli
+
+# -- private ------------------------------------------------------------------
+
+def _import_path(func, description):
+    """
+    Returns the import path for the given function, verifying that importing
+    the path returns the same function.
+    """
+    if func is None or isinstance(func, _text.STRING_TYPES):
+        return func
+
+    module_name = getattr(func, '__module__', None)
+    qualified_name = getattr(func, '__qualname__', None) or getattr(func, '__name__', None)
+
+    if module_name is None or qualified_name is None or '<' in qualified_name:
+        raise SnapshotError('%s is not an importable function' % description)
+
+    path = '%s:%s' % (module_name, qualified_name)
+
+    # The module is already loaded since the function exists, so this check
+    # is only a lookup
+    found = sys.modules.get(module_name)
+    try:
+        for attribute in qualified_name.split('.'):
+            found = getattr(found, attribute)
+    except AttributeError:
+        found = None
+
+    if found is None or found != func:
+        raise SnapshotError('%s is not an importable function' % description)
+
+    return path
+
+
+def _check_type(instance, expected_types):
+    if type(instance) not in expected_types:
+        raise SnapshotError('%s is of unsupported type %s' % (instance, type(instance).__name__))
+
+
+def _section_to_dict(section):
+    _check_type(section, (Section,))
+    section.build()
+
+    return {
+        'name': section.name,
+        'description': section.description,
+        'sections': [_section_to_dict(s) for s in
+                     sorted(section.subsections.values(), key=lambda x: x.name)],
+        'commands': [_command_to_dict(c) for c in
+                     sorted(section.commands.values(), key=lambda x: x.name)],
+    }
+
+
+def _command_to_dict(command):
+    _check_type(command, (Command,))
+
+    if command.parser is not None:
+        raise SnapshotError('%s uses a custom parser' % command)
+
+    d = {
+        'name': command.name,
+        'description': command.description,
+        'usage_description': command.usage_description,
+        'cacheable': command.cacheable,
+        'options': [_option_to_dict(o) for o in command.options],
+        'option_groups': [],
+    }
+
+    if command.method_loader is not None:
+        d['method_loader'] = _import_path(command.method_loader, 'Loader for %s' % command)
+    else:
+        d['method'] = _import_path(command.method, 'Method for %s' % command)
+
+    for group in command.option_groups:
+        _check_type(group, (OptionGroup,))
+        d['option_groups'].append({
+            'name': group.name,
+            'description': group.description,
+            'options': [_option_to_dict(o) for o in group.options],
+        })
+
+    return d
+
+
+def _option_to_dict(option):
+    _check_type(option, (Option, Flag))
+
+    try:
+        json.dumps(option.default)
+    except (TypeError, ValueError):
+        raise SnapshotError('Default value for %s cannot be saved' % option)
+
+    return {
+        'flag': isinstance(option, Flag),
+        'name': option.name,
+        'description': option.description,
+        'aliases': option.aliases,
+        'required': option.required,
+        'allow_multiple': option.allow_multiple,
+        'default': option.default,
+        'validate_func': _import_path(option.validate_func, 'Validation function for %s' % option),
+        'parse_func': _import_path(option.parse_func, 'Parse function for %s' % option),
+        'choices': option.choices,
+        'stream_values': option.stream_values,
+    }
+
+
+def _call_loader(path):
+    return import_callable(path)()
+
+
+def _populate_section(section, d):
+    for sd in d['sections']:
+        subsection = section.create_subsection(sd['name'], sd['description'])
+        _populate_section(subsection, sd)
+
+    for cd in d['commands']:
+        method_loader = None
+        if 'method_loader' in cd:
+            method_loader = partial(_call_loader, cd['method_loader'])
+
+        command = section.create_command(cd['name'], cd['description'], cd.get('method'),
+                                         usage_description=cd['usage_description'],
+                                         method_loader=method_loader)
+        command.cacheable = cd.get('cacheable', False)
+
+        for od in cd['options']:
+            command.add_option(_dict_to_option(od))
+
+        for gd in cd['option_groups']:
+            group = OptionGroup(gd['name'], description=gd['description'])
+            for od in gd['options']:
+                group.add_option(_dict_to_option(od))
+            command.add_option_group(group)
+
+
+def _dict_to_option(d):
+    if d['flag']:
+        option = Flag(d['name'], d['description'], aliases=d['aliases'])
+    else:
+        option = Option(d['name'], d['description'], required=d['required'],
+                        allow_multiple=d['allow_multiple'], aliases=d['aliases'],
+                        default=d['default'], validate_func=d['validate_func'],
+                        parse_func=d['parse_func'], choices=d.get('choices'),
+                        stream_values=d.get('stream_values', False))
+    return option
@@ -19,6 +19,9 @@ from builtins import object
 from functools import reduce
 import copy
 
+from okaara import _text
+from okaara.prompt import OUTPUT_JSON, RECORD_HEADER, RECORD_ROW
+
 # -- constants ----------------------------------------------------------------
 
 # Causes values in a column to be truncated if they exceed the col width
@@ -119,6 +122,11 @@ class Table(object):
 
     def render(self, data, headers=None):
 
+        # Structured output has no layout; each row is a record of its values
+        if getattr(self.prompt, 'output_format', None) == OUTPUT_JSON:
+            self.render_records(data, headers=headers)
+            return
+
         # Recalculate and revalidate
         table_width, col_widths = self.calculate_widths()
         self.validate(table_width, col_widths)
@@ -142,6 +150,19 @@ class Table(object):
             self.render_row(line, col_widths, text_color, self.col_alignments)
             self.render_row_divider(table_width, row_num)
 
+    def render_records(self, data, headers=None):
+        """
+        Writes the table for the JSON output format: the headers, if given, as
+        a header record followed by a row record for each row, each holding
+        the list of the row's values. Values other than strings, numbers,
+        booleans and None are written as strings.
+        """
+        if headers is not None:
+            self.prompt.write_record(_record_values(headers), record_type=RECORD_HEADER)
+
+        for row in data:
+            self.prompt.write_record(_record_values(row), record_type=RECORD_ROW)
+
     # -- render pieces --------------------------------------------------------
 
     def render_headers(self, headers, col_widths, text_color):
@@ -176,14 +197,15 @@ class Table(object):
                     if col_alignments is not None:
                         alignment = col_alignments[i]
 
-                    padding = ' ' * (width - len(text))
+                    padding_count = width - _text.display_width(text)
+                    padding = ' ' * padding_count
                     if alignment == ALIGN_LEFT:
                         text += padding
                     elif alignment == ALIGN_RIGHT:
                         text = padding + text
                     else:
-                        left_padding_count = (width - len(text)) // 2
-                        right_padding_count = (width - len(text)) - left_padding_count
+                        left_padding_count = padding_count // 2
+                        right_padding_count = padding_count - left_padding_count
 
                         left_padding = ' ' * left_padding_count
                         right_padding = ' ' * right_padding_count
@@ -228,7 +250,7 @@ class Table(object):
         """
 
         # First step is an expected table width
-        table_width = self.table_width or self.prompt.terminal_size()[0]
+        table_width = self.table_width or self.prompt.current_terminal_size()[0]
 
         col_widths = self.col_widths
 
@@ -271,7 +293,7 @@ class Table(object):
                 # Apply the wrap policy to transform the text
 
                 if self.wrap_policy == WRAP_POLICY_TRUNCATE:
-                    text = text[0:col_width]
+                    text = _text.truncate(text, col_width)
                     cell.add_line(text)
 
                 elif self.wrap_policy == WRAP_POLICY_WRAP:
@@ -303,3 +325,18 @@ class CellData(object):
 
     def has_more_lines(self):
         return len(self.lines) > 0
+
+# -- private ------------------------------------------------------------------
+
+# Values written in table records as they are; anything else is converted to
+# a string, as it would be when rendered as text
+_RECORD_VALUE_TYPES = (str, int, float, bool, type(None))
+
+try:
+    _RECORD_VALUE_TYPES += (basestring, long)
+except NameError:
+    pass
+
+
+def _record_values(row):
+    return [v if isinstance(v, _RECORD_VALUE_TYPES) else str(v) for v in row]
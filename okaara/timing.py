@@ -0,0 +1,212 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Opt-in timing of the phases of Cli.run. Timing is enabled by giving the CLI
+a sink, which receives one entry per run::
+
+    sink = timing.MemorySink()
+    cli = Cli(timing_sink=sink)
+    cli.run(['repo', 'list'])
+    sink.entries[0]['phases']['method']
+
+Each entry is a dict with the following keys:
+
+* args - arguments passed to run
+* exit_code - exit code of the run; None if the command raised an exception
+* total - seconds spent in run
+* phases - dict of phase name (the PHASE_* constants) to seconds spent in that
+  phase; phases that were not reached are omitted
+
+Phases are measured back to back: each covers the time from the end of the
+previous phase until it ends.
+"""
+
+import threading
+import time
+
+from okaara import _local
+
+# -- constants ----------------------------------------------------------------
+
+# Resolving the arguments to a section or command
+PHASE_RESOLVE = 'resolve'
+
+# Building (or retrieving the cached) option parser for the command
+PHASE_PARSER = 'parser'
+
+# Running the parser over the command's arguments
+PHASE_PARSE = 'parse_args'
+
+# Applying choices, validate_func and parse_func and checking required options
+PHASE_VALIDATE = 'validate'
+
+# Calling the command's method
+PHASE_METHOD = 'method'
+
+# Rendering section or command usage
+PHASE_USAGE = 'usage'
+
+# Timer for the run in progress on each thread (or asyncio task)
+_TIMER = _local.context_local('okaara_timer')
+
+# -- timing -------------------------------------------------------------------
+
+class Timer(object):
+    """
+    Accumulates the time spent in each phase of a single run.
+    """
+
+    def __init__(self):
+        self.start_time = time.time()
+        self.last_mark = self.start_time
+        self.phases = {}
+
+    def mark(self, phase):
+        """
+        Ends the given phase, attributing the time since the previous mark
+        (or the start of the run) to it.
+        """
+        now = time.time()
+        self.phases[phase] = self.phases.get(phase, 0) + (now - self.last_mark)
+        self.last_mark = now
+
+    def entry(self, args, exit_code):
+        """
+        Returns the sink entry describing the run.
+
+        :rtype: dict
+        """
+        return {
+            'args': list(args),
+            'exit_code': exit_code,
+            'total': self.last_mark - self.start_time,
+            'phases': dict(self.phases),
+        }
+
+
+def start():
+    """
+    Starts timing a run on the current thread.
+
+    :return: the timer previously active on this thread, to be passed to stop
+    :rtype:  Timer or None
+    """
+    previous = _TIMER.get()
+    _TIMER.set(Timer())
+    return previous
+
+
+def stop(previous):
+    """
+    Stops timing the current run and restores the previously active timer.
+
+    :return: timer for the run that was stopped
+    :rtype:  Timer
+    """
+    timer = _TIMER.get()
+    timer.last_mark = time.time()
+    _TIMER.set(previous)
+    return timer
+
+
+def mark(phase):
+    """
+    Ends the given phase of the run being timed on this thread. This does
+    nothing if no run is being timed.
+    """
+    timer = _TIMER.get()
+    if timer is not None:
+        timer.mark(phase)
+
+# -- sinks --------------------------------------------------------------------
+
+class MemorySink(object):
+    """
+    Keeps every entry in memory; intended for tests.
+    """
+
+    def __init__(self):
+        self.entries = []
+
+    def record(self, entry):
+        self.entries.append(entry)
+
+
+class LoggingSink(object):
+    """
+    Writes each entry to a logger.
+    """
+
+    def __init__(self, logger=None, level=None):
+        """
+        :param logger: logger to write to; defaults to this module's logger
+        :type  logger: logging.Logger
+
+        :param level: level to log at; defaults to DEBUG
+        :type  level: int
+        """
+        import logging
+
+        self.logger = logger or logging.getLogger(__name__)
+        if level is None:
+            level = logging.DEBUG
+        self.level = level
+
+    def record(self, entry):
+        phases = ' '.join(['%s=%.6f' % (k, v) for k, v in sorted(entry['phases'].items())])
+        self.logger.log(self.level, 'run [%s] exit [%s] total [%.6f] %s' %
+                        (' '.join(entry['args']), entry['exit_code'], entry['total'], phases))
+
+
+class JsonLinesSink(object):
+    """
+    Appends each entry as a line of JSON to a file.
+    """
+
+    def __init__(self, filename=None, stream=None):
+        """
+        :param filename: file to append to; opened on the first entry
+        :type  filename: str
+
+        :param stream: already open stream to write to instead of a file
+        :type  stream: file
+        """
+        self.filename = filename
+        self.stream = stream
+        self._lock = threading.Lock()
+
+    def record(self, entry):
+        import json
+
+        line = json.dumps(entry, sort_keys=True) + '\n'
+
+        self._lock.acquire()
+        try:
+            if self.stream is None:
+                self.stream = open(self.filename, 'a')
+            self.stream.write(line)
+            if hasattr(self.stream, 'flush'):
+                self.stream.flush()
+        finally:
+            self._lock.release()
+
+    def close(self):
+        """
+        Closes the file opened by this sink, if any.
+        """
+        if self.filename is not None and self.stream is not None:
+            self.stream.close()
+            self.stream = None
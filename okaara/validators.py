@@ -17,7 +17,7 @@
 Contains methods suitable for passing to the validate_func parameter of the Option.
 """
 
-from gettext import gettext as _
+from okaara._i18n import _
 
 from okaara import parsers
 
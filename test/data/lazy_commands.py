@@ -0,0 +1,24 @@
+# Imported by the lazy command tests; the tests verify this module is not
+# imported until a command referencing it is run.
+
+CALLS = []
+
+
+def heroes(*args, **kwargs):
+    CALLS.append((args, kwargs))
+    return 0
+
+
+def load_heroes():
+    return heroes
+
+
+def validate_team(value):
+    if value == 'hydra':
+        raise ValueError('not a hero team')
+
+
+def report(team):
+    from okaara.cli import current_prompt
+    current_prompt().write('Team %s' % team)
+    return len(team)
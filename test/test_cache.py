@@ -0,0 +1,239 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+
+from okaara import cache, cli, prompt
+
+
+class ResultCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        super(ResultCacheTests, self).setUp()
+
+        self.calls = []
+        self.directory = tempfile.mkdtemp(prefix='okaara-cache-test-')
+
+        def status(repo, **kwargs):
+            self.calls.append((repo, kwargs))
+            cli.current_prompt().write('Repository %s is %s' % (repo, kwargs['detail']))
+            if repo == 'broken':
+                return os.EX_DATAERR
+
+        self.recorder = prompt.Recorder()
+        self.result_cache = cache.ResultCache(ttl=60, max_entries=2, directory=self.directory)
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=self.recorder, enable_color=False),
+                           result_cache=self.result_cache)
+        section = self.cli.create_section('repo', 'Repositories')
+        self.command = section.create_command('status', 'Repository status', status)
+        self.command.create_option('--detail', 'Detail level', required=False, default='1',
+                                   parse_func=int)
+        self.command.cacheable = True
+
+    def tearDown(self):
+        super(ResultCacheTests, self).tearDown()
+        shutil.rmtree(self.directory)
+
+    def output(self):
+        output = ''.join(self.recorder.lines)
+        self.recorder.lines = []
+        return output
+
+    def test_repeated_run(self):
+        # Test
+        first = self.cli.run(['repo', 'status', 'zoo', '--detail', '2'])
+        first_output = self.output()
+        second = self.cli.run(['repo', 'status', 'zoo', '--detail=02'])
+
+        # Verify
+        self.assertEqual(os.EX_OK, first)
+        self.assertEqual(os.EX_OK, second)
+        self.assertEqual('Repository zoo is 2\n', first_output)
+        self.assertEqual(first_output, self.output())
+        self.assertEqual(1, len(self.calls))
+
+    def test_different_arguments(self):
+        # Test
+        self.cli.run(['repo', 'status', 'zoo'])
+        self.cli.run(['repo', 'status', 'zoo', '--detail', '2'])
+        self.cli.run(['repo', 'status', 'pets'])
+
+        # Verify
+        self.assertEqual(3, len(self.calls))
+
+    def test_streamed_values_not_cached(self):
+        # Setup
+        self.command.create_option('--tag', 'Tags', required=False, allow_multiple=True,
+                                   stream_values=True)
+
+        # Test
+        self.cli.run(['repo', 'status', 'zoo', '--tag', 'a'])
+        self.cli.run(['repo', 'status', 'zoo', '--tag', 'a'])
+
+        # Verify
+        self.assertEqual(2, len(self.calls))
+
+    def test_failures_not_cached(self):
+        # Test
+        self.cli.run(['repo', 'status', 'broken'])
+        exit_code = self.cli.run(['repo', 'status', 'broken'])
+
+        # Verify
+        self.assertEqual(os.EX_DATAERR, exit_code)
+        self.assertEqual(2, len(self.calls))
+
+    def test_not_cacheable(self):
+        # Setup
+        self.command.cacheable = False
+
+        # Test
+        self.cli.run(['repo', 'status', 'zoo'])
+        self.cli.run(['repo', 'status', 'zoo'])
+
+        # Verify
+        self.assertEqual(2, len(self.calls))
+
+    def test_expired(self):
+        # Setup
+        self.cli.run(['repo', 'status', 'zoo'])
+        self.result_cache.ttl = 0
+        time.sleep(0.01)
+
+        # Test
+        self.cli.run(['repo', 'status', 'zoo'])
+
+        # Verify
+        self.assertEqual(2, len(self.calls))
+
+    def test_lru_eviction(self):
+        # Setup
+        self.result_cache.directory = None
+
+        # Test
+        for repo in ('a', 'b', 'a', 'c', 'a', 'b'):
+            self.cli.run(['repo', 'status', repo])
+
+        # Verify
+        self.assertEqual(['a', 'b', 'c', 'b'], [c[0] for c in self.calls])
+
+    def test_shared_directory(self):
+        # Setup
+        self.cli.run(['repo', 'status', 'zoo'])
+        expected = self.output()
+
+        # Test
+        self.cli.result_cache = cache.ResultCache(directory=self.directory)
+        self.cli.run(['repo', 'status', 'zoo'])
+
+        # Verify
+        self.assertEqual(1, len(self.calls))
+        self.assertEqual(expected, self.output())
+
+    def test_wrap_width(self):
+        # Setup
+        self.cli.prompt.wrap_width = 20
+        self.cli.run(['repo', 'status', 'zoo'])
+
+        # Test
+        self.cli.prompt.wrap_width = 80
+        self.cli.run(['repo', 'status', 'zoo'])
+        self.cli.run(['repo', 'status', 'zoo'])
+
+        # Verify
+        self.assertEqual(2, len(self.calls))
+
+    def test_hit_does_not_load_method(self):
+        # Setup
+        loaded = []
+
+        def loader():
+            loaded.append(True)
+            return lambda: None
+
+        section = self.cli.find_section('repo')
+        command = section.create_command('lazy', 'Lazily loaded', None, method_loader=loader)
+        command.cacheable = True
+        self.cli.run(['repo', 'lazy'])
+
+        # Test
+        command.method_loader = loader
+        exit_code = self.cli.run(['repo', 'lazy'])
+
+        # Verify
+        self.assertEqual(os.EX_OK, exit_code)
+        self.assertEqual(1, len(loaded))
+
+    def test_concurrent_runs(self):
+        # Setup
+        self.result_cache.directory = None
+        second_written = threading.Event()
+
+        def list_repos(name):
+            # Written through the shared prompt rather than the run's copy
+            self.cli.prompt.write('Listing %s' % name)
+            if name == 'first':
+                # The second run writes while this one is still capturing
+                second_written.wait(5)
+            else:
+                second_written.set()
+
+        command = self.cli.find_section('repo').create_command('list', 'Lists repositories', list_repos)
+        command.create_option('--name', 'Name')
+        command.cacheable = True
+
+        # Test
+        first = threading.Thread(target=self.cli.run, args=(['repo', 'list', '--name', 'first'],))
+        first.start()
+        self.cli.run(['repo', 'list', '--name', 'second'])
+        first.join()
+
+        # Verify
+        outputs = sorted([r.output for r in self.result_cache._entries.values()])
+        self.assertEqual(['Listing first\n', 'Listing second\n'], outputs)
+        self.assertTrue(self.cli.prompt.output is self.recorder)
+
+    def test_held_prompt_captured(self):
+        # Setup
+        def summary():
+            self.cli.prompt.write('Summary ok')
+
+        command = self.cli.find_section('repo').create_command('summary', 'Summary', summary)
+        command.cacheable = True
+
+        # Test
+        self.cli.run(['repo', 'summary'])
+        first_output = self.output()
+        self.cli.run(['repo', 'summary'])
+
+        # Verify
+        self.assertEqual('Summary ok\n', first_output)
+        self.assertEqual(first_output, self.output())
+        self.assertTrue(self.cli.prompt.output is self.recorder)
+
+    def test_prune(self):
+        # Setup
+        self.cli.run(['repo', 'status', 'zoo'])
+        self.result_cache.ttl = -1
+
+        # Test
+        self.result_cache.prune()
+
+        # Verify
+        self.assertEqual([], os.listdir(self.directory))
@@ -13,9 +13,19 @@
 # You should have received a copy of the GNU General Public License along with Okaara.
 # If not, see <http://www.gnu.org/licenses/>.
 
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
 import unittest
 
-from okaara import prompt, cli
+from okaara import prompt, cli, _text
+
+
+DATA_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data')
 
 
 class FindClosestMatchTests(unittest.TestCase):
@@ -56,6 +66,25 @@ class FindClosestMatchTests(unittest.TestCase):
         self.hal = self.lanterns.create_command('hal', 'Hal Jordan', noop)
         self.kyle = self.lanterns.create_command('kyle', 'Kyle Rayner', noop)
 
+    def test_children_added_to_dictionaries(self):
+        # Setup
+        ironman = cli.Command('ironman', 'Tony Stark', lambda: None)
+        secret = cli.Section('secret', 'Secret Avengers')
+        self.avengers.commands['ironman'] = ironman
+        self.avengers.subsections['secret'] = secret
+
+        # Test
+        found_command, command_args = self.cli._find_closest_match(
+            self.cli.root_section, 'marvel avengers ironman arg1'.split())
+        found_section, section_args = self.cli._find_closest_match(
+            self.cli.root_section, 'marvel avengers secret'.split())
+
+        # Verify
+        self.assertTrue(found_command is ironman)
+        self.assertEqual(['arg1'], command_args)
+        self.assertTrue(found_section is secret)
+        self.assertEqual([], section_args)
+
     def test_successful_find_command(self):
         # Test
         args = 'marvel avengers movie hulk arg1 arg2'.split()
@@ -91,3 +120,1033 @@ class FindClosestMatchTests(unittest.TestCase):
         # Verify
         self.assertEqual(found, self.cli.root_section)
         self.assertEqual(args, remaining)
+
+    def test_section_followed_by_option(self):
+        # Test
+        args = 'marvel avengers --help'.split()
+        found, remaining = self.cli._find_closest_match(self.cli.root_section, args)
+
+        # Verify
+        self.assertEqual(found, self.avengers)
+        self.assertEqual(['--help'], remaining)
+
+    def test_removed_command_not_found(self):
+        # Setup
+        self.jla.remove_command('batman')
+
+        # Test
+        args = 'dc jla batman'.split()
+        found, remaining = self.cli._find_closest_match(self.cli.root_section, args)
+
+        # Verify
+        self.assertEqual(found, self.jla)
+        self.assertEqual(['batman'], remaining)
+
+    def test_removed_name_reusable(self):
+        # Setup
+        self.dc_section.remove_subsection('lanterns')
+
+        # Test
+        lanterns = self.dc_section.create_command('lanterns', 'Green Lantern Corps', None)
+        args = 'dc lanterns hal'.split()
+        found, remaining = self.cli._find_closest_match(self.cli.root_section, args)
+
+        # Verify
+        self.assertEqual(found, lanterns)
+        self.assertEqual(['hal'], remaining)
+
+    def test_duplicate_name(self):
+        self.assertRaises(cli.InvalidStructure, self.jla.create_subsection, 'batman', 'Batman comics')
+
+
+class CliMapTests(unittest.TestCase):
+
+    def test_colored_names_aligned(self):
+        # Setup
+        recorder = prompt.Recorder()
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=recorder, enable_color=True))
+        section = self.cli.create_section('marvel', 'Marvel characters')
+        section.create_command('heroes', 'List heroes', lambda: None)
+        section.create_command('x', 'List X-Men', lambda: None)
+
+        # Test
+        self.cli.print_cli_map(command_color=prompt.COLOR_GREEN)
+
+        # Verify
+        lines = [re.sub(_text._ESCAPE_PATTERN, '', l) for l in ''.join(recorder.lines).split('\n')]
+        self.assertTrue('  heroes: List heroes' in lines)
+        self.assertTrue('  x:      List X-Men' in lines)
+
+
+class CompiledParserTests(unittest.TestCase):
+
+    def setUp(self):
+        super(CompiledParserTests, self).setUp()
+
+        self.calls = []
+
+        def record(**kwargs):
+            self.calls.append(kwargs)
+
+        self.prompt = prompt.Prompt(output=prompt.Recorder(), enable_color=False)
+        self.command = cli.Command('hero', 'Hero details', record)
+        self.command.create_option('--name', 'Hero name')
+
+    def test_parser_reused(self):
+        # Test
+        self.command.execute(self.prompt, ['--name', 'thor'])
+        first = self.command.compiled_parser()
+        self.command.execute(self.prompt, ['--name', 'hulk'])
+
+        # Verify
+        self.assertTrue(first is self.command.compiled_parser())
+        self.assertEqual([{'name': 'thor'}, {'name': 'hulk'}], self.calls)
+
+    def test_add_option_invalidates(self):
+        # Setup
+        first = self.command.compiled_parser()
+
+        # Test
+        self.command.create_flag('--villain', 'Is a villain')
+        self.command.execute(self.prompt, ['--name', 'loki', '--villain'])
+
+        # Verify
+        self.assertTrue(first is not self.command.compiled_parser())
+        self.assertEqual([{'name': 'loki', 'villain': True}], self.calls)
+
+    def test_group_option_added_later(self):
+        # Setup
+        group = cli.OptionGroup('Team')
+        self.command.add_option_group(group)
+        self.command.execute(self.prompt, ['--name', 'thor'])
+
+        # Test
+        group.add_option(cli.Option('--team', 'Team name', required=False))
+        self.command.execute(self.prompt, ['--name', 'thor', '--team', 'avengers'])
+
+        # Verify
+        self.assertEqual({'name': 'thor', 'team': 'avengers'}, self.calls[1])
+
+    def test_default_changed_after_compile(self):
+        # Setup
+        option = self.command.create_option('--team', 'Team name', required=False, default='avengers')
+        self.command.execute(self.prompt, ['--name', 'thor'])
+
+        # Test
+        option.default = 'defenders'
+        self.command.execute(self.prompt, ['--name', 'hulk'])
+
+        # Verify
+        self.assertEqual('avengers', self.calls[0]['team'])
+        self.assertEqual('defenders', self.calls[1]['team'])
+
+    def test_choices(self):
+        # Setup
+        self.command.create_option('--team', 'Team name', required=False, allow_multiple=True,
+                                   choices=['avengers', 'defenders'])
+
+        # Test
+        valid = self.command.execute(self.prompt, ['--name', 'thor', '--team', 'avengers', '--team', 'defenders'])
+        invalid = self.command.execute(self.prompt, ['--name', 'loki', '--team', 'hydra'])
+
+        # Verify
+        self.assertEqual(None, valid)
+        self.assertEqual(os.EX_DATAERR, invalid)
+        self.assertEqual([{'name': 'thor', 'team': ['avengers', 'defenders']}], self.calls)
+
+
+class StreamedValuesTests(unittest.TestCase):
+
+    def setUp(self):
+        super(StreamedValuesTests, self).setUp()
+
+        self.received = []
+
+        def record(**kwargs):
+            ids = kwargs['id']
+            self.received.append(ids)
+            for i in ids:
+                self.received.append(i)
+
+        self.script = prompt.Script([])
+        self.recorder = prompt.Recorder()
+        self.prompt = prompt.Prompt(input=self.script, output=self.recorder, enable_color=False)
+        self.command = cli.Command('hero', 'Hero details', record)
+        self.option = self.command.create_option('--id', 'Hero ID', allow_multiple=True,
+                                                 stream_values=True)
+
+        fd, self.filename = tempfile.mkstemp()
+        os.close(fd)
+
+    def tearDown(self):
+        super(StreamedValuesTests, self).tearDown()
+        os.remove(self.filename)
+
+    def _write_file(self, text):
+        f = open(self.filename, 'w')
+        f.write(text)
+        f.close()
+
+    def test_file(self):
+        # Setup
+        self._write_file('thor\n\n  hulk  \n')
+
+        # Test
+        exit_code = self.command.execute(self.prompt, ['--id', '@' + self.filename])
+
+        # Verify
+        self.assertEqual(None, exit_code)
+        self.assertFalse(isinstance(self.received[0], list))
+        self.assertEqual(['thor', 'hulk'], self.received[1:])
+
+    def test_stdin(self):
+        # Setup
+        self.script.lines = ['thor\n', 'hulk\n', '']
+
+        # Test
+        self.command.execute(self.prompt, ['--id', '-'])
+
+        # Verify
+        self.assertEqual(['thor', 'hulk'], self.received[1:])
+
+    def test_mixed(self):
+        # Setup
+        self._write_file('hulk\n')
+        self.script.lines = ['loki\n', '']
+
+        # Test
+        self.command.execute(self.prompt, ['--id', 'thor', '--id', '@' + self.filename, '--id', '-'])
+
+        # Verify
+        self.assertEqual(['thor', 'hulk', 'loki'], self.received[1:])
+
+    def test_parse_func_per_value(self):
+        # Setup
+        self.option.parse_func = int
+        self._write_file('1\n2\n')
+
+        # Test
+        self.command.execute(self.prompt, ['--id', '@' + self.filename])
+
+        # Verify
+        self.assertEqual([1, 2], self.received[1:])
+
+    def test_validation_is_lazy(self):
+        # Setup
+        self.option.choices = ['thor', 'hulk']
+        self._write_file('thor\nloki\nhulk\n')
+
+        # Test
+        exit_code = self.command.execute(self.prompt, ['--id', '@' + self.filename])
+
+        # Verify
+        self.assertEqual(os.EX_DATAERR, exit_code)
+        self.assertEqual(['thor'], self.received[1:])
+        self.assertTrue('value must be one of' in ''.join(self.recorder.lines))
+
+    def test_missing_file(self):
+        # Test
+        exit_code = self.command.execute(self.prompt, ['--id', '@' + self.filename + '.missing'])
+
+        # Verify
+        self.assertEqual(os.EX_DATAERR, exit_code)
+
+    def test_not_streamed(self):
+        # Setup
+        self.option.stream_values = False
+
+        # Test
+        self.command.execute(self.prompt, ['--id', '@' + self.filename])
+
+        # Verify
+        self.assertEqual(['@' + self.filename], self.received[0])
+
+
+class CommandParserTests(unittest.TestCase):
+
+    def setUp(self):
+        super(CommandParserTests, self).setUp()
+
+        self.options = [
+            cli.Option('--name', 'Hero name', aliases=['-n']),
+            cli.Option('--team', 'Team names', allow_multiple=True, aliases=['-t'], default=['avengers']),
+            cli.Option('--title', 'Hero title', required=False),
+            cli.Flag('--villain', 'Is a villain', aliases=['-v']),
+            cli.Flag('-x', 'Mutant'),
+        ]
+        self.parser = cli.CommandParser(self.options)
+
+        # Reference optparse configuration matching Command's previous default
+        self.reference = cli.NoCatchErrorParser()
+        for o in self.options:
+            if isinstance(o, cli.Flag):
+                action = 'store_true'
+            elif o.allow_multiple:
+                action = 'append'
+            else:
+                action = 'store'
+            self.reference.add_option(dest=o.name, action=action, *([o.name] + (o.aliases or [])))
+
+    def _parse(self, parser, args):
+        try:
+            defaults = dict([(o.name, o.default) for o in self.options])
+            if parser is self.reference:
+                # optparse appends to the default list itself, so give it a copy
+                defaults['--team'] = list(defaults['--team'])
+                options, remaining = parser.parse_args(list(args), values=cli.Values(defaults))
+                return remaining, options.__dict__
+            return parser.parse_args(list(args), values=defaults)
+        except cli.CommandUsage as e:
+            return 'usage', e.unexpected_options
+
+    def test_matches_optparse(self):
+        cases = [
+            [],
+            ['--name', 'thor'],
+            ['--name=thor', 'extra', '--title', 'god of thunder'],
+            ['-n', 'thor', '-t', 'avengers', '-t', 'defenders'],
+            ['-nthor', '-tX-Men'],
+            ['-vx', '-n', 'loki'],
+            ['-vxn', 'loki'],
+            ['-vxnloki'],
+            ['--vil', '--nam', 'hulk'],
+            ['--t', 'x'],
+            ['--name', '--villain'],
+            ['--name='],
+            ['-', '--name', 'thor'],
+            ['--name', 'thor', '--', '--villain', '-x'],
+            ['--unknown', 'value'],
+            ['--unknown=value'],
+            ['-vz'],
+            ['--villain=yes'],
+            ['--name'],
+            ['-n'],
+            ['--help'],
+            ['-h'],
+            ['--he'],
+        ]
+
+        for args in cases:
+            self.assertEqual(self._parse(self.reference, args), self._parse(self.parser, args), args)
+
+    def test_default_list_not_modified(self):
+        # Test
+        remaining, values = self.parser.parse_args(['--team', 'defenders'])
+
+        # Verify
+        self.assertEqual(['avengers', 'defenders'], values['--team'])
+        self.assertEqual(['avengers'], self.options[1].default)
+
+    def test_command_help_option(self):
+        # Setup
+        option = cli.Option('--help', 'Help topic')
+        parser = cli.CommandParser([option])
+
+        # Test
+        remaining, values = parser.parse_args(['--help', 'parsing'])
+
+        # Verify
+        self.assertEqual({'--help': 'parsing'}, values)
+
+
+class UnknownArgsParserTests(unittest.TestCase):
+
+    def setUp(self):
+        super(UnknownArgsParserTests, self).setUp()
+
+        self.recorder = prompt.Recorder()
+        self.prompt = prompt.Prompt(output=self.recorder, enable_color=False)
+        self.parser = cli.UnknownArgsParser(self.prompt, 'repo create',
+                                            required_options=[('--id', 'Repository ID')],
+                                            exit_on_abort=False)
+
+    def test_parse(self):
+        # Test
+        options, remaining = self.parser.parse_args(
+            ['--id', 'repo-1', '--verbose', '-k', 'a', '--feed=http://x?a=b', '-k', 'b', '-k=c', '--last'])
+
+        # Verify
+        self.assertEqual([], remaining)
+        self.assertEqual({'id': 'repo-1', 'verbose': True, 'k': ['a', 'b', 'c'],
+                          'feed': 'http://x?a=b', 'last': True}, options.__dict__)
+
+    def test_required_with_equals(self):
+        # Test
+        options, remaining = self.parser.parse_args(['--id=repo-1'])
+
+        # Verify
+        self.assertEqual({'id': 'repo-1'}, options.__dict__)
+
+    def test_iterator(self):
+        # Setup
+        def generate():
+            yield '--id'
+            yield 'repo-1'
+            for i in range(0, 5000):
+                yield '--key-%d' % (i % 100)
+                yield str(i)
+
+        # Test
+        options, remaining = self.parser.parse_args(generate())
+
+        # Verify
+        self.assertEqual(101, len(options.__dict__))
+        self.assertEqual([str(i) for i in range(7, 5000, 100)], options.__dict__['key-7'])
+
+    def test_missing_required(self):
+        # Test
+        self.assertRaises(cli.UnknownArgsParser.MissingRequired, self.parser.parse_args, ['--name', 'repo-1'])
+
+        # Verify
+        self.assertTrue('--id' in ''.join(self.recorder.lines))
+
+    def test_unparsable(self):
+        self.assertRaises(cli.UnknownArgsParser.Unparsable, self.parser.parse_args, ['--id', 'a', 'b'])
+        self.assertRaises(cli.UnknownArgsParser.Unparsable, self.parser.parse_args, ['--help'])
+
+
+class JsonOutputTests(unittest.TestCase):
+
+    def setUp(self):
+        super(JsonOutputTests, self).setUp()
+
+        def hero(name, **kwargs):
+            cli.current_prompt().write_record({'name': name, 'team': kwargs['team']})
+
+        def validate_team(team):
+            if team == 'hydra':
+                raise ValueError('not a hero team')
+
+        self.recorder = prompt.Recorder()
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=self.recorder, output_format=prompt.OUTPUT_JSON))
+        marvel = self.cli.create_section('marvel', 'Marvel characters')
+        command = marvel.create_command('hero', 'Hero details', hero)
+        command.create_option('--team', 'Team name', required=False, validate_func=validate_team)
+        command.create_flag('--villain', 'Is a villain')
+
+    def records(self):
+        return [json.loads(l) for l in self.recorder.lines]
+
+    def test_command_records(self):
+        # Test
+        exit_code = self.cli.run(['marvel', 'hero', 'thor', '--team', 'avengers'])
+
+        # Verify
+        self.assertEqual(os.EX_OK, exit_code)
+        self.assertEqual([{'type': 'data', 'data': {'name': 'thor', 'team': 'avengers'}}], self.records())
+
+    def test_section_record(self):
+        # Test
+        self.cli.run(['marvel'])
+
+        # Verify
+        self.assertEqual([{'type': 'section', 'data': {
+            'section': 'marvel', 'description': 'Marvel characters', 'sections': [],
+            'commands': [{'name': 'hero', 'description': 'Hero details'}]}}], self.records())
+
+    def test_usage_record(self):
+        # Test
+        exit_code = self.cli.run(['marvel', 'hero', '--bogus'])
+
+        # Verify
+        self.assertEqual(os.EX_USAGE, exit_code)
+        records = self.records()
+        self.assertEqual(1, len(records))
+        self.assertEqual('usage', records[0]['type'])
+        self.assertEqual(['--bogus'], records[0]['data']['unexpected'])
+        self.assertEqual(['--team', '--villain'], [o['name'] for o in records[0]['data']['options']])
+        self.assertEqual([False, True], [o['flag'] for o in records[0]['data']['options']])
+
+    def test_validation_record(self):
+        # Test
+        exit_code = self.cli.run(['marvel', 'hero', 'red-skull', '--team', 'hydra'])
+
+        # Verify
+        self.assertEqual(os.EX_DATAERR, exit_code)
+        self.assertEqual([{'type': 'error', 'data': {'option': '--team', 'message': 'not a hero team'}}],
+                         self.records())
+
+
+class LazyCommandTests(unittest.TestCase):
+
+    def setUp(self):
+        super(LazyCommandTests, self).setUp()
+
+        if DATA_DIR not in sys.path:
+            sys.path.append(DATA_DIR)
+        sys.modules.pop('lazy_commands', None)
+
+        self.recorder = prompt.Recorder()
+        self.prompt = prompt.Prompt(output=self.recorder, enable_color=False)
+        self.cli = cli.Cli(prompt=self.prompt)
+
+    def test_import_path_not_loaded_until_run(self):
+        # Setup
+        section = self.cli.create_section('marvel', 'Marvel characters')
+        command = section.create_command('heroes', 'List heroes', 'lazy_commands:heroes')
+        command.create_option('--team', 'Team name')
+
+        # Test
+        self.cli.print_cli_map(show_options=True)
+        section.print_section(self.prompt)
+        command.print_command_usage(self.prompt)
+        self.assertTrue('lazy_commands' not in sys.modules)
+
+        exit_code = self.cli.run(['marvel', 'heroes', '--team', 'avengers'])
+
+        # Verify
+        import lazy_commands
+        self.assertEqual(0, exit_code)
+        self.assertEqual([((), {'team': 'avengers'})], lazy_commands.CALLS)
+        self.assertTrue(command.method is lazy_commands.heroes)
+
+    def test_dotted_import_path(self):
+        # Setup
+        self.cli.create_command('heroes', 'List heroes', 'lazy_commands.heroes')
+
+        # Test
+        exit_code = self.cli.run(['heroes', 'thor'])
+
+        # Verify
+        import lazy_commands
+        self.assertEqual(0, exit_code)
+        self.assertEqual([(('thor',), {})], lazy_commands.CALLS)
+
+    def test_method_loader_called_once(self):
+        # Setup
+        loads = []
+
+        def loader():
+            loads.append(1)
+            return lambda: 5
+
+        self.cli.create_command('villains', 'List villains', None, method_loader=loader)
+
+        # Test
+        self.cli.print_cli_map()
+        self.assertEqual(0, len(loads))
+
+        first = self.cli.run(['villains'])
+        second = self.cli.run(['villains'])
+
+        # Verify
+        self.assertEqual(5, first)
+        self.assertEqual(5, second)
+        self.assertEqual(1, len(loads))
+
+    def test_missing_attribute(self):
+        # Setup
+        self.cli.create_command('heroes', 'List heroes', 'lazy_commands:missing')
+
+        # Test
+        self.assertRaises(ImportError, self.cli.run, ['heroes'])
+
+
+class DeferredSectionTests(unittest.TestCase):
+
+    def setUp(self):
+        super(DeferredSectionTests, self).setUp()
+
+        self.recorder = prompt.Recorder()
+        self.prompt = prompt.Prompt(output=self.recorder, enable_color=False)
+        self.cli = cli.Cli(prompt=self.prompt)
+
+        self.built = []
+
+        def build_marvel(section):
+            self.built.append(section.name)
+            section.create_command('thor', 'God of Thunder', lambda: 3)
+            section.create_subsection('xmen', 'X-Men members', builder=build_xmen)
+
+        def build_xmen(section):
+            self.built.append(section.name)
+            section.create_command('wolverine', 'Logan', lambda: 4)
+
+        def build_dc(section):
+            self.built.append(section.name)
+            section.create_command('batman', 'Bruce Wayne', lambda: 5)
+
+        self.marvel = self.cli.create_section('marvel', 'Marvel characters', builder=build_marvel)
+        self.dc = self.cli.create_section('dc', 'DC characters', builder=build_dc)
+
+    def test_only_taken_path_built(self):
+        # Test
+        exit_code = self.cli.run(['marvel', 'thor'])
+
+        # Verify
+        self.assertEqual(3, exit_code)
+        self.assertEqual(['marvel'], self.built)
+
+    def test_nested_deferred_section(self):
+        # Test
+        exit_code = self.cli.run(['marvel', 'xmen', 'wolverine'])
+
+        # Verify
+        self.assertEqual(4, exit_code)
+        self.assertEqual(['marvel', 'xmen'], self.built)
+
+    def test_builder_runs_once(self):
+        # Test
+        self.cli.run(['dc', 'batman'])
+        self.cli.run(['dc', 'batman'])
+        self.dc.print_section(self.prompt)
+
+        # Verify
+        self.assertEqual(['dc'], self.built)
+
+    def test_print_section_builds(self):
+        # Test
+        self.cli.run(['dc'])
+
+        # Verify
+        self.assertEqual(['dc'], self.built)
+        self.assertTrue('batman' in ''.join(self.recorder.lines))
+
+    def test_print_cli_map_builds_all(self):
+        # Test
+        self.cli.print_cli_map()
+
+        # Verify
+        self.assertEqual(['dc', 'marvel', 'xmen'], self.built)
+        output = ''.join(self.recorder.lines)
+        self.assertTrue('wolverine' in output)
+        self.assertTrue('batman' in output)
+
+    def test_remove_builds(self):
+        # Test
+        removed = self.dc.remove_command('batman')
+        exit_code = self.cli.run(['dc', 'batman'])
+
+        # Verify
+        self.assertEqual('batman', removed.name)
+        self.assertEqual(os.EX_USAGE, exit_code)
+        self.assertEqual(['dc'], self.built)
+
+    def test_add_duplicate_builds(self):
+        # Test
+        self.assertRaises(cli.InvalidStructure, self.dc.create_command, 'batman', 'Impostor', lambda: 6)
+
+        # Verify
+        self.assertEqual(['dc'], self.built)
+        self.assertEqual(5, self.cli.run(['dc', 'batman']))
+
+    def test_failed_builder_retried(self):
+        # Setup
+        attempts = []
+
+        def build_image(section):
+            attempts.append(section.name)
+            section.create_command('spawn', 'Al Simmons', lambda: 7)
+            if len(attempts) == 1:
+                raise ValueError()
+
+        self.cli.create_section('image', 'Image characters', builder=build_image)
+
+        # Test
+        self.assertRaises(ValueError, self.cli.run, ['image', 'spawn'])
+        exit_code = self.cli.run(['image', 'spawn'])
+
+        # Verify
+        self.assertEqual(7, exit_code)
+        self.assertEqual(2, len(attempts))
+
+
+class RunBatchTests(unittest.TestCase):
+
+    def setUp(self):
+        super(RunBatchTests, self).setUp()
+
+        self.calls = []
+
+        def hero(name, **kwargs):
+            self.calls.append((name, kwargs))
+            if name == 'loki':
+                return os.EX_DATAERR
+            if name == 'ultron':
+                return 1 // 0
+            if name == 'thanos':
+                sys.exit(3)
+
+        self.recorder = prompt.Recorder()
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=self.recorder, enable_color=False))
+        marvel = self.cli.create_section('marvel', 'Marvel characters')
+        command = marvel.create_command('hero', 'Hero details', hero)
+        command.create_option('--team', 'Team name', required=False)
+
+    def test_run_batch(self):
+        # Setup
+        lines = [
+            'marvel hero thor --team avengers\n',
+            '\n',
+            '# comment line\n',
+            'marvel hero "peter parker"\n',
+            'marvel hero loki\n',
+            'marvel\n',
+        ]
+
+        # Test
+        results = self.cli.run_batch(lines)
+
+        # Verify
+        self.assertEqual([(1, os.EX_OK), (4, os.EX_OK), (5, os.EX_DATAERR), (6, os.EX_USAGE)], results)
+        self.assertEqual([('thor', {'team': 'avengers'}), ('peter parker', {'team': None}),
+                          ('loki', {'team': None})], self.calls)
+
+    def test_unparsable_line(self):
+        # Test
+        results = self.cli.run_batch(['marvel hero "thor\n', 'marvel hero hulk\n'])
+
+        # Verify
+        self.assertEqual([(1, os.EX_USAGE), (2, os.EX_OK)], results)
+        self.assertEqual([('hulk', {'team': None})], self.calls)
+
+    def test_failing_lines(self):
+        # Test
+        results = self.cli.run_batch(['marvel hero ultron', 'marvel hero thanos', 'marvel hero thor'])
+
+        # Verify
+        self.assertEqual([(1, os.EX_SOFTWARE), (2, 3), (3, os.EX_OK)], results)
+        self.assertEqual(['ultron', 'thanos', 'thor'], [c[0] for c in self.calls])
+        self.assertTrue('Line 1 failed' in ''.join(self.recorder.lines))
+
+    def test_failing_line_stop_on_error(self):
+        # Test
+        results = self.cli.run_batch(['marvel hero ultron', 'marvel hero thor'], stop_on_error=True)
+
+        # Verify
+        self.assertEqual([(1, os.EX_SOFTWARE)], results)
+        self.assertEqual(1, len(self.calls))
+
+    def test_stop_on_error(self):
+        # Test
+        results = self.cli.run_batch(['marvel hero loki', 'marvel hero thor'], stop_on_error=True)
+
+        # Verify
+        self.assertEqual([(1, os.EX_DATAERR)], results)
+        self.assertEqual(1, len(self.calls))
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'asyncio support requires Python 3.7')
+class AsyncExecutionTests(unittest.TestCase):
+
+    def setUp(self):
+        super(AsyncExecutionTests, self).setUp()
+
+        import asyncio
+        self.asyncio = asyncio
+
+        self.recorder = prompt.Recorder()
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=self.recorder, enable_color=False))
+        self.section = self.cli.create_section('marvel', 'Marvel characters')
+
+        async def fetch(team, delay=0):
+            await asyncio.sleep(0)
+            return len(team)
+
+        self.fetch = fetch
+
+        command = self.section.create_command('fetch', 'Async command', self.fetch)
+        command.create_option('--team', 'Team name')
+        self.section.create_command('sync', 'Sync command', lambda: 7)
+
+    def test_run_async(self):
+        # Test
+        exit_code = self.asyncio.run(self.cli.run_async(['marvel', 'fetch', '--team', 'xmen']))
+
+        # Verify
+        self.assertEqual(4, exit_code)
+
+    def test_run_async_sync_method(self):
+        # Test
+        exit_code = self.asyncio.run(self.cli.run_async(['marvel', 'sync']))
+
+        # Verify
+        self.assertEqual(7, exit_code)
+
+    def test_run_async_usage(self):
+        # Test
+        missing = self.asyncio.run(self.cli.run_async(['marvel', 'fetch']))
+        section = self.asyncio.run(self.cli.run_async(['marvel']))
+
+        # Verify
+        self.assertEqual(os.EX_USAGE, missing)
+        self.assertEqual(os.EX_USAGE, section)
+        self.assertTrue('--team' in ''.join(self.recorder.lines))
+
+    def test_sync_run_of_coroutine(self):
+        # Test
+        exit_code = self.cli.run(['marvel', 'fetch', '--team', 'avengers'])
+
+        # Verify
+        self.assertEqual(8, exit_code)
+
+    def test_concurrent_commands(self):
+        # Setup
+        async def run_all():
+            return await self.asyncio.gather(
+                self.cli.run_async(['marvel', 'fetch', '--team', 'a']),
+                self.cli.run_async(['marvel', 'fetch', '--team', 'bb']))
+
+        # Test
+        results = self.asyncio.run(run_all())
+
+        # Verify
+        self.assertEqual([1, 2], results)
+
+    def test_run_async_context(self):
+        # Setup
+        async def report():
+            context = cli.current_context()
+            cli.current_prompt().write('Report for %s' % context.environ['REGION'])
+
+        self.section.create_command('report', 'Reports', report)
+        recorder = prompt.Recorder()
+        context = cli.RunContext(prompt=prompt.Prompt(output=recorder, enable_color=False),
+                                 environ={'REGION': 'earth'})
+
+        # Test
+        exit_code = self.asyncio.run(self.cli.run_async(['marvel', 'report'], context=context))
+
+        # Verify
+        self.assertEqual(os.EX_OK, exit_code)
+        self.assertEqual(['Report for earth\n'], recorder.lines)
+        self.assertEqual([], self.recorder.lines)
+
+    def test_run_async_timing_and_cache(self):
+        # Setup
+        from okaara import cache, timing
+
+        calls = []
+
+        async def status(repo):
+            calls.append(repo)
+            cli.current_prompt().write('Repository %s' % repo)
+
+        command = self.section.create_command('status', 'Status', status)
+        command.create_option('--repo', 'Repository')
+        command.cacheable = True
+
+        self.cli.timing_sink = timing.MemorySink()
+        self.cli.result_cache = cache.ResultCache()
+
+        # Test
+        first = self.asyncio.run(self.cli.run_async(['marvel', 'status', '--repo', 'zoo']))
+        second = self.asyncio.run(self.cli.run_async(['marvel', 'status', '--repo', 'zoo']))
+
+        # Verify
+        self.assertEqual((os.EX_OK, os.EX_OK), (first, second))
+        self.assertEqual(['zoo'], calls)
+        self.assertEqual(['Repository zoo\n', 'Repository zoo\n'], self.recorder.lines)
+        self.assertEqual(2, len(self.cli.timing_sink.entries))
+        self.assertTrue(timing.PHASE_METHOD in self.cli.timing_sink.entries[0]['phases'])
+
+    def test_sync_run_in_running_loop(self):
+        # Setup
+        async def run_sync():
+            return self.cli.run(['marvel', 'fetch', '--team', 'avengers'])
+
+        # Test
+        self.assertRaises(RuntimeError, self.asyncio.run, run_sync())
+
+    def test_current_prompt_per_task(self):
+        # Setup
+        asyncio = self.asyncio
+
+        async def report(team):
+            await asyncio.sleep(0)
+            cli.current_prompt().write('Team %s' % team)
+
+        command = self.section.create_command('report', 'Reports on a team', report)
+        command.create_option('--team', 'Team name')
+
+        recorders = [prompt.Recorder(), prompt.Recorder()]
+        prompts = [prompt.Prompt(output=r, enable_color=False) for r in recorders]
+
+        async def run_all():
+            return await asyncio.gather(
+                command.execute_async(prompts[0], ['--team', 'avengers']),
+                command.execute_async(prompts[1], ['--team', 'x-men']))
+
+        # Test
+        asyncio.run(run_all())
+
+        # Verify
+        self.assertEqual(['Team avengers\n'], recorders[0].lines)
+        self.assertEqual(['Team x-men\n'], recorders[1].lines)
+        self.assertTrue(cli.current_prompt() is None)
+
+
+class RunContextTests(unittest.TestCase):
+
+    def setUp(self):
+        super(RunContextTests, self).setUp()
+
+        def report(team):
+            context = cli.current_context()
+            cli.current_prompt().write('Team %s from %s' % (team, context.environ.get('REGION')))
+
+        self.default_recorder = prompt.Recorder()
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=self.default_recorder, enable_color=False))
+        self.section = self.cli.create_section('marvel', 'Marvel characters')
+        self.section.create_command('report', 'Reports on a team', report).create_option('--team', 'Team name')
+
+    def _context(self, **kwargs):
+        recorder = prompt.Recorder()
+        context = cli.RunContext(prompt=prompt.Prompt(output=recorder, enable_color=False), **kwargs)
+        return context, recorder
+
+    def test_prompt_and_environ(self):
+        # Setup
+        context, recorder = self._context(environ={'REGION': 'earth'})
+
+        # Test
+        exit_code = self.cli.run(['marvel', 'report', '--team', 'avengers'], context=context)
+
+        # Verify
+        self.assertEqual(os.EX_OK, exit_code)
+        self.assertEqual(['Team avengers from earth\n'], recorder.lines)
+        self.assertEqual([], self.default_recorder.lines)
+        self.assertTrue(cli.current_context() is None)
+
+    def test_program_name(self):
+        # Setup
+        context, recorder = self._context(program_name='/usr/bin/marvel-admin')
+
+        # Test
+        self.cli.run(['marvel'], context=context)
+
+        # Verify
+        self.assertTrue('Usage: marvel-admin [SUB_SECTION, ..] COMMAND' in ''.join(recorder.lines))
+
+    def test_buffered_prompt_flushed(self):
+        # Setup
+        recorder = prompt.Recorder()
+        buffered = prompt.Prompt(output=recorder, enable_color=False,
+                                 flush_policy=prompt.FLUSH_EXPLICIT)
+
+        # Test
+        self.cli.run(['marvel', 'report', '--team', 'avengers'], context=cli.RunContext(prompt=buffered, environ={}))
+
+        # Verify
+        self.assertEqual(['Team avengers from None\n'], recorder.lines)
+
+    def test_cli_map(self):
+        # Setup
+        self.cli.add_command(cli.Command('map', 'Shows the CLI map', self.cli.print_cli_map))
+        context, recorder = self._context()
+
+        # Test
+        self.cli.run(['map'], context=context)
+
+        # Verify
+        self.assertTrue('marvel: Marvel characters\n' in recorder.lines)
+        self.assertEqual([], self.default_recorder.lines)
+
+    def test_concurrent_runs(self):
+        # Setup
+        built = []
+
+        def build(section):
+            built.append(section.name)
+            time.sleep(0.01)
+            section.create_command('report', 'Reports on a team', 'lazy_commands:report') \
+                .create_option('--team', 'Team name')
+
+        if DATA_DIR not in sys.path:
+            sys.path.append(DATA_DIR)
+        self.cli.create_section('dc', 'DC characters', builder=build)
+
+        contexts = [self._context() for i in range(8)]
+        exit_codes = []
+
+        def run(i):
+            exit_codes.append(self.cli.run(['dc', 'report', '--team', 'team%s' % i], context=contexts[i][0]))
+
+        # Test
+        threads = [threading.Thread(target=run, args=(i,)) for i in range(len(contexts))]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+
+        # Verify
+        self.assertEqual(['dc'], built)
+        self.assertEqual([5] * len(contexts), exit_codes)
+        self.assertEqual([['Team team%s\n' % i] for i in range(len(contexts))],
+                         [c[1].lines for c in contexts])
+
+
+class ExecuteManyTests(unittest.TestCase):
+
+    def setUp(self):
+        super(ExecuteManyTests, self).setUp()
+
+        if DATA_DIR not in sys.path:
+            sys.path.append(DATA_DIR)
+
+        def report(team, fail=False):
+            if fail:
+                raise RuntimeError('boom')
+            cli.current_prompt().write('Team %s' % team)
+            return len(team)
+
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=prompt.Recorder(), enable_color=False))
+        section = self.cli.create_section('marvel', 'Marvel characters')
+        self.command = section.create_command('report', 'Reports on a team', report)
+        self.command.create_option('--team', 'Team name')
+        self.command.create_flag('--fail', 'Raises an error')
+
+    def test_run_many(self):
+        # Setup
+        vectors = (['--team', 't' * i] for i in range(1, 21))
+
+        # Test
+        results = self.cli.run_many(['marvel', 'report'], vectors, max_workers=3)
+
+        # Verify
+        self.assertEqual(list(range(1, 21)), [r.exit_code for r in results])
+        self.assertEqual(['Team %s\n' % ('t' * i) for i in range(1, 21)], [r.output for r in results])
+
+    def test_usage_and_exceptions(self):
+        # Test
+        results = self.cli.run_many(['marvel', 'report'], [[], ['--team', 'x', '--fail'], ['--team', 'ab']])
+
+        # Verify
+        self.assertEqual([os.EX_USAGE, os.EX_SOFTWARE, 2], [r.exit_code for r in results])
+        self.assertTrue('--team' in results[0].output)
+        self.assertTrue(isinstance(results[1].exception, RuntimeError))
+
+    def test_buffered_prompt(self):
+        # Setup
+        prompt_kwargs = {'enable_color': False, 'flush_policy': prompt.FLUSH_EXPLICIT}
+
+        # Test
+        results = list(self.command.execute_many([[], ['--team', 'ab']], prompt_kwargs=prompt_kwargs))
+
+        # Verify
+        self.assertEqual([os.EX_USAGE, 2], [r.exit_code for r in results])
+        self.assertTrue('--team' in results[0].output)
+        self.assertEqual('Team ab\n', results[1].output)
+
+    def test_invalid_path(self):
+        self.assertRaises(ValueError, self.cli.run_many, ['marvel'], [[]])
+
+    def test_current_prompt_restored(self):
+        # Test
+        self.cli.run(['marvel', 'report', '--team', 'x'])
+
+        # Verify
+        self.assertTrue(cli.current_prompt() is None)
+
+    def test_process_pool(self):
+        # Setup
+        command = cli.Command('report', 'Reports on a team', 'lazy_commands:report')
+        command.create_option('--team', 'Team name')
+
+        # Test
+        results = list(command.execute_many([['--team', 'abc'], ['--team', 'de']], max_workers=2,
+                                            use_processes=True, prompt_kwargs={'enable_color': False}))
+
+        # Verify
+        self.assertEqual([3, 2], [r.exit_code for r in results])
+        self.assertEqual(['Team abc\n', 'Team de\n'], [r.output for r in results])
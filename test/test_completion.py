@@ -0,0 +1,110 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+from okaara import cli, completion, prompt
+
+
+PACKAGE_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), '..')
+
+# Each case is (words, expected candidates); run against both the live CLI
+# and the saved index
+CASES = [
+    ([''], ['dc', 'marvel']),
+    (['m'], ['marvel']),
+    (['marvel', ''], ['heroes', 'villains', 'xmen']),
+    (['marvel', 'x'], ['xmen']),
+    (['marvel', 'xmen', ''], ['wolverine']),
+    (['image', ''], []),
+    (['marvel', 'heroes', ''], ['--movie', '--sort', '--team', '-t']),
+    (['marvel', 'heroes', '--t'], ['--team']),
+    (['marvel', 'heroes', '--team', ''], ['avengers', 'defenders']),
+    (['marvel', 'heroes', '-t', 'a'], ['avengers']),
+    (['marvel', 'heroes', '--team=d'], ['--team=defenders']),
+    (['marvel', 'heroes', '--team', 'avengers', '--'], ['--movie', '--sort']),
+    (['marvel', 'heroes', '--sort', 'name', '--'], ['--movie', '--sort', '--team']),
+    (['marvel', 'heroes', '--sort', ''], []),
+    (['marvel', 'heroes', 'thor'], []),
+]
+
+
+class CompletionTests(unittest.TestCase):
+
+    def setUp(self):
+        super(CompletionTests, self).setUp()
+
+        self.loaded = []
+
+        def loader():
+            self.loaded.append(1)
+            return lambda **kwargs: 0
+
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=prompt.Recorder(), enable_color=False))
+        self.cli.create_section('dc', 'DC characters')
+        marvel = self.cli.create_section('marvel', 'Marvel characters')
+
+        heroes = marvel.create_command('heroes', 'List heroes', None, method_loader=loader)
+        heroes.create_option('--team', 'Team name', aliases=['-t'], choices=['avengers', 'defenders'])
+        heroes.create_option('--sort', 'Sort field', required=False, allow_multiple=True)
+        heroes.create_flag('--movie', 'Only movie characters')
+
+        marvel.create_command('villains', 'List villains', None, method_loader=loader)
+        marvel.create_subsection('xmen', 'X-Men', builder=lambda s: s.create_command('wolverine', 'Logan', None))
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='okaara-test-')
+        self.index_filename = os.path.join(self.tmp_dir, 'completion.idx')
+
+    def tearDown(self):
+        super(CompletionTests, self).tearDown()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_live_completion(self):
+        for words, expected in CASES:
+            self.assertEqual(expected, self.cli.complete(words), words)
+
+        self.assertEqual(0, len(self.loaded))
+
+    def test_index_completion(self):
+        # Setup
+        completion.save_index(self.cli, self.index_filename)
+        index = completion.load_index(self.index_filename)
+
+        # Test & Verify
+        for words, expected in CASES:
+            self.assertEqual(expected, completion.complete(index, words), words)
+
+    def test_main(self):
+        # Setup
+        completion.save_index(self.cli, self.index_filename)
+
+        # Test
+        output = subprocess.check_output([sys.executable, '-m', 'okaara.completion',
+                                          self.index_filename, 'marvel', ''], cwd=PACKAGE_DIR)
+
+        # Verify
+        self.assertEqual(['heroes', 'villains', 'xmen'], output.decode('utf-8').split())
+
+    def test_choices_enforced(self):
+        # Test
+        exit_code = self.cli.run(['marvel', 'heroes', '--team', 'hydra'])
+
+        # Verify
+        self.assertEqual(os.EX_DATAERR, exit_code)
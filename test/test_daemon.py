@@ -0,0 +1,232 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from io import StringIO
+
+from okaara import cli, daemon, prompt
+
+
+class DaemonTests(unittest.TestCase):
+
+    def setUp(self):
+        super(DaemonTests, self).setUp()
+
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=prompt.Recorder(), enable_color=False))
+
+        def greet(name):
+            cli.current_prompt().write('Hello %s' % name)
+            return 3
+
+        def ask():
+            answer = cli.current_prompt().prompt('Team? ')
+            cli.current_prompt().write('Joined %s' % answer)
+
+        def held():
+            answer = self.cli.prompt.prompt('Name? ')
+            self.cli.prompt.write('Held %s' % answer)
+
+        def origin(names):
+            context = cli.current_context()
+            cli.current_prompt().write('%s %s %s' % (context.program_name, context.environ.get('TEAM'),
+                                                     ','.join(names or [])))
+
+        def login():
+            password = cli.current_prompt().prompt_password('Password: ')
+            cli.current_prompt().write('Length %s' % len(password))
+
+        def crash():
+            raise RuntimeError('boom')
+
+        section = self.cli.create_section('marvel', 'Marvel characters')
+        section.create_command('greet', 'Greets a hero', greet)
+        section.create_command('ask', 'Asks a question', ask)
+        section.create_command('crash', 'Fails', crash)
+        section.create_command('login', 'Asks for a password', login)
+        section.create_command('held', 'Writes through the CLI prompt', held)
+        section.create_command('origin', 'Describes the caller', origin).create_option(
+            '--names', 'Names', required=False, allow_multiple=True, stream_values=True)
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='okaara-test-')
+        self.socket_path = os.path.join(self.tmp_dir, 'cli.sock')
+
+        self.server = daemon.CliServer(self.cli, self.socket_path, prompt_kwargs={'enable_color': False})
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.daemon = True
+        self.thread.start()
+
+    def tearDown(self):
+        super(DaemonTests, self).tearDown()
+        self.server.shutdown()
+        self.thread.join()
+        self.server.close()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_output_and_exit_code(self):
+        # Setup
+        output = StringIO()
+
+        # Test
+        exit_code = daemon.run_client(self.socket_path, ['marvel', 'greet', 'thor'], output=output)
+
+        # Verify
+        self.assertEqual(3, exit_code)
+        self.assertEqual('Hello thor\n', output.getvalue())
+
+    def test_input_forwarded(self):
+        # Setup
+        input = StringIO(u'avengers\n')
+        output = StringIO()
+
+        # Test
+        exit_code = daemon.run_client(self.socket_path, ['marvel', 'ask'], input=input, output=output)
+
+        # Verify
+        self.assertEqual(os.EX_OK, exit_code)
+        self.assertEqual('Team? Joined avengers\n', output.getvalue())
+
+    def test_usage(self):
+        # Setup
+        output = StringIO()
+
+        # Test
+        exit_code = daemon.run_client(self.socket_path, ['marvel'], output=output)
+
+        # Verify
+        self.assertEqual(os.EX_USAGE, exit_code)
+        self.assertTrue('greet' in output.getvalue())
+
+    def test_exception(self):
+        # Test
+        exit_code = daemon.run_client(self.socket_path, ['marvel', 'crash'], output=StringIO())
+
+        # Verify
+        self.assertEqual(os.EX_SOFTWARE, exit_code)
+
+    def test_cli_prompt_forwarded(self):
+        # Setup
+        input = StringIO(u'vision\n')
+        output = StringIO()
+
+        # Test
+        exit_code = daemon.run_client(self.socket_path, ['marvel', 'held'], input=input, output=output)
+
+        # Verify
+        self.assertEqual(os.EX_OK, exit_code)
+        self.assertEqual('Name? Held vision\n', output.getvalue())
+        self.assertEqual([], self.cli.prompt.output.lines)
+
+    def test_program_name(self):
+        # Setup
+        output = StringIO()
+
+        # Test
+        daemon.run_client(self.socket_path, ['marvel', 'origin'], output=output,
+                          program_name='/usr/bin/heroes')
+
+        # Verify
+        self.assertTrue(output.getvalue().startswith('/usr/bin/heroes '))
+
+    def test_client_environment(self):
+        # Setup
+        client_dir = os.path.join(self.tmp_dir, 'client')
+        os.mkdir(client_dir)
+        f = open(os.path.join(client_dir, 'names'), 'w')
+        f.write('wanda\npietro\n')
+        f.close()
+
+        request = {
+            'args': ['marvel', 'origin', '--names', '@names'],
+            'program_name': 'heroes',
+            'environ': {'TEAM': 'avengers'},
+            'cwd': client_dir,
+        }
+        server_sock, client_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        client = daemon._Connection(client_sock)
+        client.write_frame(daemon.FRAME_ARGS, json.dumps(request))
+
+        # Test
+        try:
+            self.server.handle_connection(server_sock)
+            frames = [client.read_frame(), client.read_frame()]
+        finally:
+            server_sock.close()
+            client_sock.close()
+
+        # Verify
+        self.assertEqual([(daemon.FRAME_OUTPUT, 'heroes avengers wanda,pietro\n'),
+                          (daemon.FRAME_EXIT, str(os.EX_OK))], frames)
+
+    def test_password_forwarded(self):
+        # Setup
+        input = StringIO(u'asgard\n')
+        output = StringIO()
+
+        # Test
+        exit_code = daemon.run_client(self.socket_path, ['marvel', 'login'], input=input, output=output)
+
+        # Verify
+        self.assertEqual(os.EX_OK, exit_code)
+        self.assertEqual('Password: Length 6\n', output.getvalue())
+
+    def test_server_prompt_unchanged(self):
+        # Setup
+        original = self.cli.prompt
+
+        # Test
+        daemon.run_client(self.socket_path, ['marvel', 'greet', 'hulk'], output=StringIO())
+
+        # Verify
+        self.assertTrue(self.cli.prompt is original)
+        self.assertEqual([], original.output.lines)
+
+    def test_client_gone_before_exit(self):
+        # Setup
+        server_sock, client_sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        daemon._Connection(client_sock).write_frame(daemon.FRAME_ARGS, '["marvel", "greet", "loki"]')
+        client_sock.close()
+
+        # Test
+        try:
+            self.server.handle_connection(server_sock)
+        finally:
+            server_sock.close()
+
+        # Verify - the failed writes are not raised out of the handler
+
+    def test_stale_socket_replaced(self):
+        # Setup
+        self.server.shutdown()
+        self.thread.join()
+        self.server._server.server_close()
+        self.assertTrue(os.path.exists(self.socket_path))
+
+        # Test
+        self.server = daemon.CliServer(self.cli, self.socket_path)
+        self.thread = threading.Thread(target=self.server.serve_forever, args=(0.01,))
+        self.thread.daemon = True
+        self.thread.start()
+
+        # Verify
+        output = StringIO()
+        daemon.run_client(self.socket_path, ['marvel', 'greet', 'thor'], output=output)
+        self.assertTrue('Hello thor' in output.getvalue())
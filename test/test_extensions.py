@@ -138,3 +138,51 @@ class EntryPointLoaderTests(unittest.TestCase):
         self.assertEqual(descriptors[1].name, 'ep-2')
         self.assertEqual(descriptors[1].init_method.__name__, 'initialize')
         self.assertEqual(descriptors[1].priority, 1)
+
+
+class FingerprintTests(unittest.TestCase):
+
+    def test_directory_fingerprint_changes(self):
+        # Setup
+        extensions_dir = os.path.join(DATA_DIR, 'valid_extensions')
+        loader = extensions.DirectoryExtensionsLoader(extensions_dir, 'hook', 'initialize')
+        manager = extensions.ExtensionsManager()
+        manager.add_loader(loader)
+
+        hook_filename = os.path.join(extensions_dir, 'ext_1', 'hook.py')
+        original_stat = os.stat(hook_filename)
+
+        # Test
+        first = manager.fingerprint()
+        os.utime(hook_filename, (original_stat.st_atime, original_stat.st_mtime + 10))
+        try:
+            second = manager.fingerprint()
+        finally:
+            os.utime(hook_filename, (original_stat.st_atime, original_stat.st_mtime))
+
+        # Verify
+        self.assertTrue(first is not None)
+        self.assertNotEqual(first, second)
+        self.assertEqual(first, manager.fingerprint())
+
+    def test_unsupported_loader(self):
+        # Setup
+        manager = extensions.ExtensionsManager()
+        manager.add_loader(extensions.BaseExtensionsLoader())
+
+        # Test
+        self.assertTrue(manager.fingerprint() is None)
+
+    @mock.patch('pkg_resources.iter_entry_points')
+    def test_entry_point_fingerprint(self, mock_iter):
+        # Setup
+        ep = pkg_resources.EntryPoint('ep-1', 'ext_1.hook', attrs=('initialize',))
+        mock_iter.return_value = iter([ep])
+        loader = extensions.EntryPointLoader('mocked')
+
+        # Test
+        fingerprint = loader.fingerprint()
+
+        # Verify
+        self.assertTrue('ep-1' in fingerprint)
+        self.assertTrue('ext_1.hook' in fingerprint)
@@ -0,0 +1,161 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import operator
+import os
+import pickle
+import unittest
+
+from okaara import cli, frozen, prompt
+
+
+class FreezeTests(unittest.TestCase):
+
+    def setUp(self):
+        super(FreezeTests, self).setUp()
+
+        self.calls = []
+
+        def hero(name, **kwargs):
+            self.calls.append((name, kwargs))
+
+        def list_villains():
+            self.calls.append(('list', {}))
+
+        def build_villains(section):
+            section.create_command('list', 'Lists villains', list_villains)
+
+        self.recorder = prompt.Recorder()
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=self.recorder, enable_color=False))
+        marvel = self.cli.create_section('marvel', 'Marvel characters')
+        self.cli.create_section('dc', 'DC characters')
+        marvel.create_subsection('villains', 'Villains', builder=build_villains)
+
+        command = marvel.create_command('hero', 'Hero details', hero)
+        command.create_option('--team', 'Team name', required=False, aliases=['-t'], choices=['avengers', 'x-men'])
+        command.create_flag('--villain', 'Is a villain')
+        group = cli.OptionGroup('Powers')
+        group.add_option(cli.Option('--power', 'Power', required=False, allow_multiple=True))
+        command.add_option_group(group)
+
+    def output(self):
+        output = ''.join(self.recorder.lines)
+        self.recorder.lines = []
+        return output
+
+    def test_behavior_unchanged(self):
+        # Setup
+        runs = [['marvel'], ['marvel', 'hero', 'thor', '-t', 'avengers', '--power', 'a', '--power', 'b'],
+                ['marvel', 'hero', '--team', 'hydra'], ['marvel', 'hero', '--bogus'], ['marvel', 'villains', 'list']]
+
+        expected = []
+        for args in runs:
+            expected.append((self.cli.run(args), self.output()))
+        self.cli.print_cli_map(show_options=True)
+        expected_map = self.output()
+        expected_calls = list(self.calls)
+        self.calls[:] = []
+
+        # Test
+        self.cli.freeze()
+
+        # Verify
+        for args, (exit_code, output) in zip(runs, expected):
+            self.assertEqual(exit_code, self.cli.run(args))
+            self.assertEqual(output, self.output())
+        self.cli.print_cli_map(show_options=True)
+        self.assertEqual(expected_map, self.output())
+        self.assertEqual(expected_calls, self.calls)
+
+    def test_frozen_nodes(self):
+        # Test
+        self.cli.freeze()
+
+        # Verify
+        section = self.cli.find_section('marvel')
+        command = section.find_command('hero')
+        self.assertTrue(isinstance(section, frozen.FrozenSection))
+        self.assertTrue(isinstance(command, frozen.FrozenCommand))
+        self.assertEqual(('dc', 'marvel'), tuple([s.name for s in self.cli.root_section.sorted_subsections()]))
+
+        nodes = [section, command, command.option_groups[0]] + command.all_options()
+        for node in nodes:
+            self.assertFalse(hasattr(node, '__dict__'), node)
+            self.assertRaises(AttributeError, setattr, node, 'name', 'loki')
+            self.assertRaises(AttributeError, setattr, node, 'extra', 1)
+        self.assertRaises(TypeError, operator.setitem, section.commands, 'loki', command)
+        self.assertRaises(TypeError, operator.setitem, section.subsections, 'loki', section)
+
+        self.assertTrue(isinstance(section, cli.Section))
+        self.assertTrue(isinstance(command, cli.Command))
+        self.assertTrue(isinstance(command.options[0], cli.Option))
+        self.assertTrue(isinstance(command.options[1], cli.Flag))
+        self.assertEqual(('avengers', 'x-men'), command.options[0].choices)
+
+    def test_attributes_before_freezing(self):
+        # Setup
+        section = self.cli.find_section('marvel')
+        command = section.find_command('hero')
+
+        # Test
+        section.extra = 'section'
+        command.custom = 1
+        command.options[0].metadata = {'source': 'test'}
+
+        # Verify
+        self.assertEqual('section', section.extra)
+        self.assertEqual(1, command.custom)
+        self.assertEqual({'source': 'test'}, command.options[0].metadata)
+
+    def test_changes_rejected(self):
+        # Setup
+        self.cli.freeze()
+        section = self.cli.find_section('marvel')
+        command = section.find_command('hero')
+
+        # Verify
+        self.assertRaises(cli.InvalidStructure, self.cli.create_section, 'image', 'Image characters')
+        self.assertRaises(cli.InvalidStructure, self.cli.remove_section, 'dc')
+        self.assertRaises(cli.InvalidStructure, section.create_command, 'x', 'x', None)
+        self.assertRaises(cli.InvalidStructure, command.create_option, '--x', 'x')
+        self.assertRaises(cli.InvalidStructure, command.option_groups[0].add_option, cli.Flag('--x', 'x'))
+
+    def test_subclasses_kept(self):
+        # Setup
+        class CustomCommand(cli.Command):
+            pass
+
+        custom = CustomCommand('custom', 'Custom', lambda: None)
+        custom.extra = 'kept'
+        self.cli.add_command(custom)
+
+        # Test
+        self.cli.freeze()
+
+        # Verify
+        self.assertTrue(self.cli.find_command('custom') is custom)
+
+    def test_pickle(self):
+        # Setup
+        self.cli.freeze()
+        command = self.cli.find_section('marvel').find_command('hero')
+        command.method = os.getcwd
+
+        # Test
+        copy = pickle.loads(pickle.dumps(command, 2))
+
+        # Verify
+        self.assertEqual(['--team', '--villain', '--power'], [o.name for o in copy.all_options()])
+        self.assertEqual(('-t',), copy.options[0].aliases)
@@ -0,0 +1,65 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import subprocess
+import sys
+import unittest
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules only needed by some calls, which importing okaara.cli should not load
+DEFERRED_MODULES = ['optparse', 'gettext', 'locale', 'logging', 'json', 'getpass', 'termios',
+                    'shlex', 'importlib', 'concurrent']
+
+
+def imported_modules(statement):
+    """
+    Runs the statement in a new interpreter with -X importtime and returns the
+    cumulative import time in microseconds of each module it imported.
+    """
+    output = subprocess.check_output([sys.executable, '-X', 'importtime', '-W', 'ignore', '-c', statement],
+                                     stderr=subprocess.STDOUT, cwd=ROOT_DIR)
+
+    modules = {}
+    for line in output.decode('utf-8').splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+@unittest.skipIf(sys.version_info < (3, 7), 'Deferred imports require Python 3.7')
+class ImportTimeTests(unittest.TestCase):
+
+    def test_cli_import(self):
+        # Test
+        modules = imported_modules('import okaara.cli')
+
+        # Verify
+        self.assertTrue('okaara.cli' in modules)
+        loaded = [m for m in DEFERRED_MODULES if m in modules]
+        self.assertEqual([], loaded)
+
+    def test_deferred_names(self):
+        # Test
+        modules = imported_modules('import okaara.cli, okaara.prompt; '
+                                   'okaara.cli.NoCatchErrorParser; okaara.prompt.LOG')
+
+        # Verify
+        self.assertTrue('optparse' in modules)
+        self.assertTrue('logging' in modules)
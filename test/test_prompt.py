@@ -13,11 +13,19 @@
 # You should have received a copy of the GNU General Public License along with Okaara.
 # If not, see <http://www.gnu.org/licenses/>.
 
+import json
+import os
+import random
+import signal
+import struct
+import sys
+import tempfile
 import unittest
 
 import mock
 
 import okaara.prompt
+from okaara import _text
 from okaara.prompt import Prompt, Recorder, Script, ABORT
 
 
@@ -96,6 +104,434 @@ class GeneralTests(unittest.TestCase):
         self.assertEqual('', written_lines[2])
 
 
+class JsonOutputTests(unittest.TestCase):
+
+    def setUp(self):
+        super(JsonOutputTests, self).setUp()
+
+        self.recorder = Recorder()
+        self.prompt = Prompt(output=self.recorder, wrap_width=5, output_format=okaara.prompt.OUTPUT_JSON)
+
+    def records(self):
+        return [json.loads(l) for l in self.recorder.lines]
+
+    def test_write_record(self):
+        # Test
+        self.prompt.write_record({'name': 'Hulk', 'team': 'Avengers'})
+        self.prompt.write_record(['thor', 'loki'])
+
+        # Verify
+        self.assertEqual([{'type': 'data', 'data': {'name': 'Hulk', 'team': 'Avengers'}},
+                          {'type': 'data', 'data': ['thor', 'loki']}], self.records())
+
+    def test_write_skips_formatting(self):
+        # Test
+        self.prompt.write('Incredible Hulk', center=True, color=okaara.prompt.COLOR_GREEN)
+        self.prompt.write('')
+        self.prompt.move(okaara.prompt.MOVE_UP % 2)
+        self.prompt.clear()
+
+        # Verify
+        self.assertEqual([{'type': 'message', 'data': 'Incredible Hulk'}], self.records())
+
+    def test_write_record_text(self):
+        # Setup
+        prompt = Prompt(output=self.recorder, enable_color=False)
+
+        # Test
+        prompt.write_record({'name': 'Hulk'})
+        prompt.write_record(['thor', 'loki'])
+
+        # Verify
+        self.assertEqual(['name: Hulk\n', 'thor\n', 'loki\n'], self.recorder.lines)
+
+
+class TerminalRecorder(Recorder):
+    """
+    Recorder that reports being a terminal.
+    """
+
+    def isatty(self):
+        return True
+
+
+class PlainOutputTests(unittest.TestCase):
+
+    def test_auto_not_terminal(self):
+        # Setup
+        recorder = Recorder()
+        prompt = Prompt(output=recorder, wrap_width=5, output_format=okaara.prompt.OUTPUT_AUTO)
+
+        # Test
+        prompt.write('Incredible Hulk', center=True, color=okaara.prompt.COLOR_GREEN)
+        prompt.write('smash', new_line=False)
+        prompt.move(okaara.prompt.MOVE_UP % 2)
+        prompt.clear()
+
+        # Verify
+        self.assertEqual(okaara.prompt.OUTPUT_PLAIN, prompt.output_format)
+        self.assertFalse(prompt.enable_color)
+        self.assertEqual(['Incredible Hulk\n', 'smash'], recorder.lines)
+        self.assertEqual('Incredible Hulk', prompt.wrap('Incredible Hulk'))
+        self.assertEqual('Incredible\nHulk', prompt.wrap('Incredible Hulk', wrap_width=10))
+
+    @mock.patch.dict(os.environ, {'NO_COLOR': ''})
+    def test_auto_terminal(self):
+        # Setup
+        recorder = TerminalRecorder()
+
+        # Test
+        prompt = Prompt(output=recorder, output_format=okaara.prompt.OUTPUT_AUTO)
+        prompt.write('Hulk', color=okaara.prompt.COLOR_GREEN)
+
+        # Verify
+        self.assertEqual(okaara.prompt.OUTPUT_TEXT, prompt.output_format)
+        self.assertEqual([okaara.prompt.COLOR_WHITE, prompt.color('Hulk', okaara.prompt.COLOR_GREEN) + '\n'],
+                         recorder.lines)
+
+    @mock.patch.dict(os.environ, {'NO_COLOR': '1'})
+    def test_auto_no_color(self):
+        # Setup
+        recorder = TerminalRecorder()
+
+        # Test
+        prompt = Prompt(output=recorder, wrap_width=10, output_format=okaara.prompt.OUTPUT_AUTO)
+        prompt.write('Incredible Hulk', color=okaara.prompt.COLOR_GREEN)
+
+        # Verify
+        self.assertEqual(okaara.prompt.OUTPUT_TEXT, prompt.output_format)
+        self.assertFalse(prompt.enable_color)
+        self.assertEqual(['Incredible\nHulk\n'], recorder.lines)
+
+    def test_plain_tags_recorded(self):
+        # Setup
+        prompt = Prompt(output=Recorder(), record_tags=True, output_format=okaara.prompt.OUTPUT_PLAIN)
+
+        # Test
+        prompt.write('Hulk', tag='hero')
+
+        # Verify
+        self.assertEqual([(okaara.prompt.TAG_WRITE, 'hero')], prompt.tags)
+
+
+class RecorderTests(unittest.TestCase):
+
+    def test_default(self):
+        # Setup
+        recorder = Recorder()
+        prompt = Prompt(output=recorder, output_format=okaara.prompt.OUTPUT_PLAIN)
+
+        # Test
+        prompt.write('Incredible', new_line=False)
+        prompt.write(' Hulk')
+
+        # Verify
+        self.assertEqual(['Incredible', ' Hulk\n'], recorder.lines)
+        self.assertEqual('Incredible Hulk\n', recorder.getvalue())
+        self.assertFalse(recorder.spilled)
+
+    def test_join_lines(self):
+        # Setup
+        recorder = Recorder(join_lines=True)
+
+        # Test
+        recorder.write('Incredible')
+        recorder.write(' Hulk\nThor\n\nLo')
+        recorder.write('ki')
+
+        # Verify
+        self.assertEqual(['Incredible Hulk\n', 'Thor\n', '\n'], recorder.lines)
+        self.assertEqual('Incredible Hulk\nThor\n\nLoki', recorder.getvalue())
+
+    def test_max_lines(self):
+        # Setup
+        recorder = Recorder(max_lines=2, join_lines=True)
+
+        # Test
+        for i in range(10):
+            recorder.write('line %d\n' % i)
+
+        # Verify
+        self.assertEqual(['line 8\n', 'line 9\n'], list(recorder.lines))
+        self.assertEqual('line 8\nline 9\n', recorder.getvalue())
+
+    def test_spill(self):
+        # Setup
+        recorder = Recorder(spill_size=10, join_lines=True)
+
+        # Test
+        recorder.write('Hulk\n')
+        recorder.write('Thor')
+        self.assertFalse(recorder.spilled)
+        recorder.write(' and Loki\n')
+        recorder.write('Widow')
+
+        # Verify
+        try:
+            self.assertTrue(recorder.spilled)
+            self.assertEqual([], recorder.lines)
+            self.assertEqual('Hulk\nThor and Loki\nWidow', recorder.getvalue())
+
+            # Reading the file back does not disturb later writes
+            recorder.write('\n')
+            self.assertEqual('Hulk\nThor and Loki\nWidow\n', recorder.getvalue())
+        finally:
+            recorder.close()
+
+    def test_max_lines_and_spill(self):
+        self.assertRaises(ValueError, Recorder, max_lines=10, spill_size=10)
+
+
+class ScriptTests(unittest.TestCase):
+
+    def test_list(self):
+        # Setup
+        script = Script(['thor\n', 'hulk\n'])
+
+        # Test
+        values = [script.readline(), script.readline()]
+
+        # Verify
+        self.assertEqual(['thor\n', 'hulk\n'], values)
+        self.assertEqual(0, len(script.lines))
+        self.assertRaises(IndexError, script.readline)
+
+    def test_assign_lines(self):
+        # Setup
+        script = Script([])
+
+        # Test
+        script.lines = ['loki\n']
+        script.lines.append('widow\n')
+
+        # Verify
+        self.assertEqual('loki\n', script.readline())
+        self.assertEqual('widow\n', script.readline())
+
+    def test_iterator(self):
+        # Setup
+        script = Script(iter(['thor\n', Script.INTERRUPT]))
+        prompt = Prompt(input=script)
+
+        # Test
+        entered = prompt.read('Question')
+
+        # Verify
+        self.assertEqual('thor', entered)
+        self.assertRaises(KeyboardInterrupt, script.readline)
+        self.assertEqual('', script.readline())
+
+    def test_from_file(self):
+        # Setup
+        fd, filename = tempfile.mkstemp()
+        f = os.fdopen(fd, 'w')
+        f.write('thor\nhulk\n')
+        f.close()
+
+        try:
+            script = Script.from_file(filename)
+            prompt = Prompt(input=script)
+
+            # Test
+            entered = [prompt.read('Question'), prompt.read('Question')]
+
+            # Verify
+            self.assertEqual(['thor', 'hulk'], entered)
+            self.assertEqual('', script.readline())
+        finally:
+            os.remove(filename)
+
+
+class BufferedOutputTests(unittest.TestCase):
+
+    def setUp(self):
+        super(BufferedOutputTests, self).setUp()
+        self.recorder = Recorder()
+
+    def _prompt(self, flush_policy, **kwargs):
+        return Prompt(output=self.recorder, enable_color=False, flush_policy=flush_policy, **kwargs)
+
+    def test_flush_newline(self):
+        # Setup
+        prompt = self._prompt(okaara.prompt.FLUSH_NEWLINE)
+
+        # Test
+        prompt.write('thor', new_line=False)
+        prompt.write(' | ', new_line=False)
+        before_newline = list(self.recorder.lines)
+        prompt.write('loki')
+
+        # Verify
+        self.assertEqual([], before_newline)
+        self.assertEqual(['thor | loki\n'], self.recorder.lines)
+
+    def test_flush_size(self):
+        # Setup
+        prompt = self._prompt(okaara.prompt.FLUSH_SIZE, buffer_size=12)
+
+        # Test
+        prompt.write('thor')
+        prompt.write('loki')
+        before_threshold = list(self.recorder.lines)
+        prompt.write('hulk')
+
+        # Verify
+        self.assertEqual([], before_threshold)
+        self.assertEqual(['thor\nloki\nhulk\n'], self.recorder.lines)
+
+    def test_flush_explicit(self):
+        # Setup
+        prompt = self._prompt(okaara.prompt.FLUSH_EXPLICIT, buffer_size=1)
+
+        # Test
+        for i in range(100):
+            prompt.write('line %s' % i)
+        before_flush = list(self.recorder.lines)
+        prompt.flush()
+
+        # Verify
+        self.assertEqual([], before_flush)
+        self.assertEqual(1, len(self.recorder.lines))
+        self.assertEqual(100, self.recorder.lines[0].count('\n'))
+
+    def test_flush_before_read(self):
+        # Setup
+        prompt = Prompt(input=Script(['thor']), output=self.recorder, enable_color=False,
+                        flush_policy=okaara.prompt.FLUSH_EXPLICIT)
+        prompt.write('Heroes')
+
+        # Test
+        answer = prompt.prompt('Name? ')
+
+        # Verify
+        self.assertEqual('thor', answer)
+        self.assertEqual(['Heroes\nName? '], self.recorder.lines)
+
+    def test_json_records_buffered(self):
+        # Setup
+        prompt = self._prompt(okaara.prompt.FLUSH_EXPLICIT, output_format=okaara.prompt.OUTPUT_JSON)
+
+        # Test
+        prompt.write_record({'name': 'thor'})
+        prompt.write('done')
+        prompt.flush()
+
+        # Verify
+        records = [json.loads(l) for l in self.recorder.lines[0].splitlines()]
+        self.assertEqual(['data', 'message'], [r['type'] for r in records])
+
+
+class TerminalSizeTests(unittest.TestCase):
+
+    def setUp(self):
+        super(TerminalSizeTests, self).setUp()
+        self.prompt = Prompt(output=Recorder(), enable_color=False)
+
+    @mock.patch('okaara.prompt._read_terminal_size')
+    def test_cached_until_resize(self, mock_read):
+        # Setup
+        mock_read.return_value = (100, 40)
+        if okaara.prompt._resize_count() is None:
+            self.skipTest('terminal resizes cannot be detected')
+
+        # Test
+        first = self.prompt.current_terminal_size()
+        self.prompt.wrap('Hulk smash', wrap_width=okaara.prompt.WIDTH_TERMINAL)
+        self.prompt.center('Hulk')
+        cached_reads = mock_read.call_count
+
+        mock_read.return_value = (60, 20)
+        os.kill(os.getpid(), signal.SIGWINCH)
+        resized = self.prompt.current_terminal_size()
+
+        # Verify
+        self.assertEqual((100, 40), first)
+        self.assertEqual(1, cached_reads)
+        self.assertEqual((60, 20), resized)
+        self.assertEqual(2, mock_read.call_count)
+
+    @mock.patch('okaara.prompt._read_terminal_size')
+    def test_handler_replaced(self, mock_read):
+        # Setup
+        mock_read.return_value = (100, 40)
+        if okaara.prompt._resize_count() is None:
+            self.skipTest('terminal resizes cannot be detected')
+
+        saved = (okaara.prompt._resizes, okaara.prompt._resize_handler)
+        handler = signal.signal(signal.SIGWINCH, signal.SIG_DFL)
+
+        try:
+            # Test
+            self.prompt.current_terminal_size()
+            self.prompt.current_terminal_size()
+            signal.signal(signal.SIGWINCH, handler)
+            self.prompt.current_terminal_size()
+
+            # Verify
+            self.assertEqual(3, mock_read.call_count)
+        finally:
+            okaara.prompt._resizes, okaara.prompt._resize_handler = saved
+            signal.signal(signal.SIGWINCH, handler)
+
+    @mock.patch('okaara.prompt._read_terminal_size')
+    def test_terminal_size_classmethod(self, mock_read):
+        # Setup
+        mock_read.return_value = (100, 40)
+
+        # Test
+        size = Prompt.terminal_size()
+        Prompt.terminal_size()
+
+        # Verify
+        self.assertEqual((100, 40), size)
+        self.assertEqual(2, mock_read.call_count)
+        mock_read.assert_called_with(sys.stdout)
+
+    @mock.patch.dict(os.environ, {'COLUMNS': '132', 'LINES': '50'})
+    @mock.patch('fcntl.ioctl')
+    def test_environ_fallback(self, mock_ioctl):
+        # Setup
+        mock_ioctl.side_effect = IOError('not a terminal')
+
+        # Test
+        size = okaara.prompt._read_terminal_size(self.prompt.output)
+
+        # Verify
+        self.assertEqual((132, 50), size)
+
+    @mock.patch.dict(os.environ, {'COLUMNS': 'wide'})
+    @mock.patch('fcntl.ioctl')
+    def test_default_fallback(self, mock_ioctl):
+        # Setup
+        mock_ioctl.side_effect = IOError('not a terminal')
+        os.environ.pop('LINES', None)
+
+        # Test
+        size = okaara.prompt._read_terminal_size(self.prompt.output)
+
+        # Verify
+        self.assertEqual((okaara.prompt.DEFAULT_TERMINAL_WIDTH, okaara.prompt.DEFAULT_TERMINAL_HEIGHT), size)
+
+    @mock.patch('fcntl.ioctl')
+    def test_output_fd_fallback(self, mock_ioctl):
+        # Setup
+        output = mock.Mock()
+        output.fileno.return_value = 7
+
+        def ioctl(fd, request, arg):
+            if fd != 7:
+                raise IOError('not a terminal')
+            return struct.pack('HHHH', 30, 90, 0, 0)
+
+        mock_ioctl.side_effect = ioctl
+
+        # Test
+        size = okaara.prompt._read_terminal_size(output)
+
+        # Verify
+        self.assertEqual((90, 30), size)
+
+
 class WrapTests(unittest.TestCase):
 
     def test_wrap_short_wrap(self):
@@ -162,6 +598,98 @@ class WrapTests(unittest.TestCase):
         expected = 'abc\ndef\nghikl\nmno\npqrs'
         self.assertEqual(expected, wrapped)
 
+    def test_wrap_indent(self):
+        # Setup
+        text = 'Avengers assemble   to defend the earth'
+        prompt = Prompt()
+
+        # Test
+        wrapped = prompt.wrap(text, 12, remaining_line_indent=2)
+
+        # Verify
+        self.assertEqual('Avengers\n  assemble  \n  to defend\n  the earth', wrapped)
+
+    def test_wrap_hard_break(self):
+        # Setup
+        prompt = Prompt()
+
+        # Test
+        wrapped = prompt.wrap('a supercalifragilistic word', 8, remaining_line_indent=1)
+
+        # Verify
+        self.assertEqual('a superc\n alifrag\n ilistic\n word', wrapped)
+
+    def test_wrap_matches_reference(self):
+        """
+        Compares against the wrapping algorithm used before the linear one
+        over generated texts.
+        """
+
+        # Setup
+        random.seed(7)
+        pieces = ['a', 'bc', ' ', '  ', '\n', '\t', 'Spiderman', 'Electro Goblin']
+
+        for i in range(2000):
+            text = ''.join([random.choice(pieces) for j in range(random.randint(0, 12))])
+            width = random.randint(1, 16)
+            indent = random.randint(0, width - 1)
+
+            # Test
+            wrapped = _text.wrap(text, width, indent)
+
+            # Verify
+            self.assertEqual(reference_wrap(text, width, indent), wrapped)
+
+    def test_wrap_cached(self):
+        # Setup
+        _text.clear_wrap_cache()
+        text = 'Green Goblin ' * 10
+
+        # Test
+        first = _text.wrap(text, 20, 4)
+        second = _text.wrap(text, 20, 4)
+
+        # Verify
+        self.assertTrue(first is second)
+        self.assertNotEqual(first, _text.wrap(text, 20, 2))
+
+
+def reference_wrap(content, wrap_width, remaining_line_indent):
+    """
+    Wrapping algorithm used by Prompt.wrap before it was replaced with the
+    linear one in okaara._text.
+    """
+    lines = []
+    first_pass = True
+
+    while len(content) > 0:
+        if not first_pass:
+            content = (' ' * remaining_line_indent) + content.lstrip()
+        else:
+            first_pass = False
+
+        end_index = wrap_width
+        chunk = content[:end_index]
+
+        if end_index >= len(content):
+            lines.append(chunk)
+            break
+
+        if content[end_index] == ' ':
+            lines.append(chunk)
+            content = content[end_index:]
+            continue
+
+        last_space_index = chunk.rfind(' ')
+        if last_space_index != -1 and last_space_index > remaining_line_indent:
+            end_index = last_space_index
+            chunk = content[:end_index]
+
+        lines.append(chunk)
+        content = content[end_index:]
+
+    return '\n'.join(lines)
+
 
 class PromptTest(unittest.TestCase):
     @mock.patch('getpass.getpass')
@@ -292,3 +820,19 @@ class TestGetPassword(unittest.TestCase):
 
         self.assertEqual(password, 'letmein')
 
+
+    @mock.patch('getpass.getpass')
+    def test_input_reads_password(self, mock_getpass):
+        # Setup
+        class PasswordInput(object):
+            def read_password(self, question):
+                return 'from %s' % question
+
+        prompt = Prompt(input=PasswordInput())
+
+        # Test
+        password = prompt._get_password('Password: ')
+
+        # Verify
+        self.assertEqual(password, 'from Password: ')
+        self.assertFalse(mock_getpass.called)
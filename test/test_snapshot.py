@@ -0,0 +1,176 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from okaara import cli, parsers, prompt, snapshot
+from okaara.extensions import BaseExtensionsLoader, ExtensionsManager
+
+
+DATA_DIR = os.path.join(os.path.abspath(os.path.dirname(__file__)), 'data')
+
+
+class SnapshotTests(unittest.TestCase):
+
+    def setUp(self):
+        super(SnapshotTests, self).setUp()
+
+        if DATA_DIR not in sys.path:
+            sys.path.append(DATA_DIR)
+        import lazy_commands
+        del lazy_commands.CALLS[:]
+
+        self.tmp_dir = tempfile.mkdtemp(prefix='okaara-test-')
+        self.filename = os.path.join(self.tmp_dir, 'cli.snapshot')
+
+        self.recorder = prompt.Recorder()
+        self.prompt = prompt.Prompt(output=self.recorder, enable_color=False)
+
+    def tearDown(self):
+        super(SnapshotTests, self).tearDown()
+        shutil.rmtree(self.tmp_dir)
+
+    def _build(self):
+        import lazy_commands
+
+        built = cli.Cli(prompt=self.prompt)
+        marvel = built.create_section('marvel', 'Marvel characters')
+
+        heroes = marvel.create_command('heroes', 'List heroes', lazy_commands.heroes,
+                                       usage_description='Lists heroes by team')
+        heroes.create_option('--team', 'Team name', aliases=['-t'],
+                             validate_func=lazy_commands.validate_team)
+        heroes.create_option('--count', 'Max count', required=False, default=10,
+                             parse_func=parsers.parse_positive_int)
+        heroes.create_flag('--movie', 'Only movie characters')
+
+        group = cli.OptionGroup('Display', 'Display options')
+        group.add_option(cli.Option('--sort', 'Sort field', required=False, allow_multiple=True))
+        heroes.add_option_group(group)
+
+        marvel.create_command('villains', 'List villains', None,
+                              method_loader=lazy_commands.load_heroes)
+        marvel.create_subsection('xmen', 'X-Men members', builder=self._build_xmen)
+        return built
+
+    def _build_xmen(self, section):
+        section.create_command('wolverine', 'Logan', 'lazy_commands:heroes')
+
+    def test_round_trip(self):
+        # Setup
+        snapshot.save(self._build(), self.filename, fingerprint='abc')
+        sys.modules.pop('lazy_commands', None)
+
+        # Test
+        restored = snapshot.load(self.filename, fingerprint='abc', prompt=self.prompt)
+
+        # Verify
+        self.assertTrue(restored is not None)
+        self.assertTrue('lazy_commands' not in sys.modules)
+
+        heroes = restored.find_section('marvel').find_command('heroes')
+        self.assertEqual('Lists heroes by team', heroes.usage_description)
+        self.assertEqual(['--team', '--count', '--movie'], [o.name for o in heroes.options])
+        self.assertEqual(['-t'], heroes.options[0].aliases)
+        self.assertEqual(10, heroes.options[1].default)
+        self.assertTrue(isinstance(heroes.options[2], cli.Flag))
+        self.assertEqual('--sort', heroes.option_groups[0].options[0].name)
+        self.assertTrue(heroes.option_groups[0].options[0].allow_multiple)
+
+        wolverine = restored.find_section('marvel').find_subsection('xmen').find_command('wolverine')
+        self.assertEqual('Logan', wolverine.description)
+
+    def test_restored_cli_runs(self):
+        # Setup
+        snapshot.save(self._build(), self.filename)
+        restored = snapshot.load(self.filename, prompt=self.prompt)
+
+        # Test
+        exit_code = restored.run(['marvel', 'heroes', '-t', 'avengers', '--count', '3'])
+        invalid_code = restored.run(['marvel', 'heroes', '-t', 'hydra'])
+        loader_code = restored.run(['marvel', 'villains'])
+
+        # Verify
+        import lazy_commands
+        self.assertEqual(0, exit_code)
+        self.assertEqual(os.EX_DATAERR, invalid_code)
+        self.assertEqual(0, loader_code)
+        expected_kwargs = {'team': 'avengers', 'count': 3, 'movie': False, 'sort': None}
+        self.assertEqual([((), expected_kwargs), ((), {})], lazy_commands.CALLS)
+
+    def test_stale_fingerprint(self):
+        # Setup
+        snapshot.save(self._build(), self.filename, fingerprint='abc')
+
+        # Test
+        restored = snapshot.load(self.filename, fingerprint='def')
+
+        # Verify
+        self.assertTrue(restored is None)
+
+    def test_missing_file(self):
+        self.assertTrue(snapshot.load(self.filename) is None)
+
+    def test_lambda_not_saved(self):
+        # Setup
+        built = cli.Cli(prompt=self.prompt)
+        built.create_command('thor', 'God of Thunder', lambda: 0)
+
+        # Test
+        self.assertRaises(snapshot.SnapshotError, snapshot.save, built, self.filename)
+
+        # Verify
+        self.assertFalse(os.path.exists(self.filename))
+
+    def test_load_or_build(self):
+        # Setup
+        builds = []
+
+        def build():
+            builds.append(1)
+            return self._build()
+
+        # Test
+        snapshot.load_or_build(self.filename, build, fingerprint='abc')
+        second = snapshot.load_or_build(self.filename, build, fingerprint='abc')
+        snapshot.load_or_build(self.filename, build, fingerprint='def')
+
+        # Verify
+        self.assertEqual(2, len(builds))
+        self.assertTrue(second.find_section('marvel') is not None)
+
+    def test_load_or_build_no_fingerprint(self):
+        # Setup
+        builds = []
+
+        def build():
+            builds.append(1)
+            return self._build()
+
+        manager = ExtensionsManager()
+        manager.add_loader(BaseExtensionsLoader())
+
+        # Test
+        snapshot.load_or_build(self.filename, build, fingerprint=manager.fingerprint())
+        snapshot.save(self._build(), self.filename)
+        snapshot.load_or_build(self.filename, build, fingerprint=manager.fingerprint())
+
+        # Verify
+        self.assertTrue(manager.fingerprint() is None)
+        self.assertEqual(2, len(builds))
@@ -13,6 +13,7 @@
 # You should have received a copy of the GNU General Public License along with Okaara.
 # If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import unittest
 
 from okaara import prompt, table
@@ -91,3 +92,35 @@ class TableTests(unittest.TestCase):
 
         expected_table_width = sum(expected_col_widths) + ((len(expected_col_widths) - 1) * len(separator))
         self.assertEqual(expected_table_width, tw)
+
+    def test_render_display_width(self):
+        # Setup
+        recorder = prompt.Recorder()
+        p = prompt.Prompt(output=recorder, enable_color=False)
+        t = table.Table(p, 2, col_widths=[6, 4], table_width=11, col_separator='|',
+                        col_alignments=[table.ALIGN_RIGHT, table.ALIGN_LEFT])
+
+        # Test
+        t.render([[u'\u8718\u86db', prompt.COLOR_RED + 'ab' + prompt.COLOR_WHITE],
+                  [u'\u8718\u86db\u4fa0\u4fa0', 'abcdef']])
+
+        # Verify
+        lines = ''.join(recorder.lines).split('\n')
+        self.assertEqual(u'  \u8718\u86db|' + prompt.COLOR_RED + 'ab' + prompt.COLOR_WHITE + '  ', lines[0])
+        self.assertEqual(u'\u8718\u86db\u4fa0|abcd', lines[1])
+
+    def test_render_json(self):
+        # Setup
+        recorder = prompt.Recorder()
+        p = prompt.Prompt(output=recorder, output_format=prompt.OUTPUT_JSON)
+        t = table.Table(p, 3, col_widths=[2, 2, 2], table_width=8)
+
+        # Test
+        t.render([['thor', 'avengers', 1], ['wolverine', 'x-men', ('a', 'b')]],
+                 headers=['name', 'team', 'count'])
+
+        # Verify
+        records = [json.loads(l) for l in ''.join(recorder.lines).splitlines()]
+        self.assertEqual([{'type': 'header', 'data': ['name', 'team', 'count']},
+                          {'type': 'row', 'data': ['thor', 'avengers', 1]},
+                          {'type': 'row', 'data': ['wolverine', 'x-men', "('a', 'b')"]}], records)
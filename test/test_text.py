@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import random
+import unittest
+
+from okaara import _text
+from okaara.prompt import COLOR_RED, COLOR_WHITE
+
+
+class DisplayWidthTests(unittest.TestCase):
+
+    def test_plain(self):
+        self.assertEqual(0, _text.display_width(''))
+        self.assertEqual(9, _text.display_width('Spiderman'))
+
+    def test_escape_sequences(self):
+        # Setup
+        text = COLOR_RED + 'Spiderman' + COLOR_WHITE + '\033]0;title\007' + '\033[2K'
+
+        # Verify
+        self.assertEqual(9, _text.display_width(text))
+
+    def test_wide_characters(self):
+        self.assertEqual(6, _text.display_width(u'蜘蛛侠'))
+        self.assertEqual(4, _text.display_width(u'ＡＢ'))
+
+    def test_zero_width_characters(self):
+        # Combining acute accent, zero width space and zero width joiner
+        self.assertEqual(1, _text.display_width(u'e\u0301'))
+        self.assertEqual(2, _text.display_width(u'a\u200bb'))
+        self.assertEqual(2, _text.display_width(u'a\u200db'))
+
+    def test_cached(self):
+        # Setup
+        text = COLOR_RED + u'蜘蛛侠'
+
+        # Test
+        _text.display_width(text)
+
+        # Verify
+        self.assertEqual(6, _text._width_cache[text])
+
+
+class TruncateTests(unittest.TestCase):
+
+    def test_plain(self):
+        self.assertEqual('Spider', _text.truncate('Spiderman', 6))
+
+    def test_wide_characters(self):
+        # A wide character that would straddle the limit is dropped
+        self.assertEqual(u'蜘蛛', _text.truncate(u'蜘蛛侠', 5))
+
+    def test_escape_sequences_kept(self):
+        # Setup
+        text = COLOR_RED + 'Spiderman' + COLOR_WHITE
+
+        # Verify
+        self.assertEqual(COLOR_RED + 'Spi' + COLOR_WHITE, _text.truncate(text, 3))
+
+
+class WrapTests(unittest.TestCase):
+
+    def test_colored(self):
+        # Setup
+        text = 'Peter ' + COLOR_RED + 'Parker' + COLOR_WHITE + ' is Spiderman'
+
+        # Test
+        wrapped = _text.wrap(text, 12)
+
+        # Verify
+        self.assertEqual('Peter ' + COLOR_RED + 'Parker' + COLOR_WHITE + '\nis Spiderman', wrapped)
+
+    def test_wide_characters(self):
+        # Test
+        wrapped = _text.wrap(u'蜘蛛侠 和 钢铁侠', 7, 2)
+
+        # Verify
+        self.assertEqual(u'蜘蛛侠\n  和\n  钢铁\n  侠', wrapped)
+        for line in wrapped.split('\n'):
+            self.assertTrue(_text.display_width(line) <= 7)
+
+    def test_wider_than_line(self):
+        self.assertEqual(u'蜘\n蛛', _text.wrap(u'蜘蛛', 1))
+
+    def test_ascii_paths_agree(self):
+        # Setup
+        random.seed(11)
+        pieces = ['a', 'bc', ' ', '  ', '\n', 'Spiderman']
+
+        for i in range(1000):
+            text = ''.join([random.choice(pieces) for j in range(random.randint(0, 12))])
+            width = random.randint(1, 12)
+            indent = random.randint(0, width - 1)
+
+            # Verify
+            self.assertEqual(_text._wrap(text, width, indent), _text._wrap_units(text, width, indent))
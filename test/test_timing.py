@@ -0,0 +1,125 @@
+# Copyright (c) 2011-2013 Jason Dobies
+#
+# This file is part of Okaara.
+#
+# Okaara is free software: you can redistribute it and/or modify it under the terms of the
+# GNU General Public License as published by the Free Software Foundation, either version 3
+# of the License, or (at your option) any later version.
+#
+# Okaara is distributed in the hope that it will be useful, but WITHOUT ANY WARRANTY; without
+# even the implied warranty of MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with Okaara.
+# If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import logging
+import os
+import unittest
+
+from okaara import cli, prompt, timing
+
+
+class TimingTests(unittest.TestCase):
+
+    def setUp(self):
+        super(TimingTests, self).setUp()
+
+        def hero(name, **kwargs):
+            if name == 'loki':
+                raise RuntimeError('mischief')
+
+        self.sink = timing.MemorySink()
+        self.recorder = prompt.Recorder()
+        self.cli = cli.Cli(prompt=prompt.Prompt(output=self.recorder, enable_color=False),
+                           timing_sink=self.sink)
+        marvel = self.cli.create_section('marvel', 'Marvel characters')
+        command = marvel.create_command('hero', 'Hero details', hero)
+        command.create_option('--team', 'Team name', required=False, validate_func=str)
+        command.create_option('--name', 'Hero name')
+
+    def test_command_phases(self):
+        # Test
+        exit_code = self.cli.run(['marvel', 'hero', '--name', 'thor', '--team', 'avengers'])
+
+        # Verify
+        self.assertEqual(os.EX_OK, exit_code)
+        self.assertEqual(1, len(self.sink.entries))
+
+        entry = self.sink.entries[0]
+        self.assertEqual(['marvel', 'hero', '--name', 'thor', '--team', 'avengers'], entry['args'])
+        self.assertEqual(os.EX_OK, entry['exit_code'])
+
+        expected = [timing.PHASE_RESOLVE, timing.PHASE_PARSER, timing.PHASE_PARSE,
+                    timing.PHASE_VALIDATE, timing.PHASE_METHOD]
+        self.assertEqual(sorted(expected), sorted(entry['phases']))
+        self.assertTrue(sum(entry['phases'].values()) <= entry['total'])
+
+    def test_usage_phases(self):
+        # Test
+        self.cli.run(['marvel'])
+        self.cli.run(['marvel', 'hero'])
+
+        # Verify
+        section_entry, command_entry = self.sink.entries
+        self.assertEqual(os.EX_USAGE, section_entry['exit_code'])
+        self.assertEqual(sorted([timing.PHASE_RESOLVE, timing.PHASE_USAGE]), sorted(section_entry['phases']))
+        self.assertTrue(timing.PHASE_USAGE in command_entry['phases'])
+        self.assertTrue(timing.PHASE_METHOD not in command_entry['phases'])
+
+    def test_exception_recorded(self):
+        # Test
+        self.assertRaises(RuntimeError, self.cli.run, ['marvel', 'hero', '--name', 'loki'])
+
+        # Verify
+        self.assertEqual(1, len(self.sink.entries))
+        self.assertEqual(None, self.sink.entries[0]['exit_code'])
+        self.assertTrue(timing.PHASE_METHOD in self.sink.entries[0]['phases'])
+
+    def test_disabled(self):
+        # Setup
+        self.cli.timing_sink = None
+
+        # Test
+        self.cli.run(['marvel', 'hero', '--name', 'thor'])
+        timing.mark(timing.PHASE_METHOD)
+
+        # Verify
+        self.assertEqual(0, len(self.sink.entries))
+
+    def test_json_lines_sink(self):
+        # Setup
+        output = prompt.Recorder()
+        self.cli.timing_sink = timing.JsonLinesSink(stream=output)
+
+        # Test
+        self.cli.run(['marvel', 'hero', '--name', 'thor'])
+        self.cli.run(['marvel'])
+
+        # Verify
+        self.assertEqual(2, len(output.lines))
+        entries = [json.loads(l) for l in output.lines]
+        self.assertEqual(['marvel', 'hero', '--name', 'thor'], entries[0]['args'])
+        self.assertEqual(os.EX_USAGE, entries[1]['exit_code'])
+
+    def test_logging_sink(self):
+        # Setup
+        messages = []
+
+        class Handler(logging.Handler):
+            def emit(self, record):
+                messages.append(record.getMessage())
+
+        logger = logging.getLogger('okaara.test.timing')
+        logger.addHandler(Handler())
+        logger.setLevel(logging.DEBUG)
+        self.cli.timing_sink = timing.LoggingSink(logger=logger)
+
+        # Test
+        self.cli.run(['marvel', 'hero', '--name', 'thor'])
+
+        # Verify
+        self.assertEqual(1, len(messages))
+        self.assertTrue(messages[0].startswith('run [marvel hero --name thor] exit [0]'))
+        self.assertTrue('method=' in messages[0])